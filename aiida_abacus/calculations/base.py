@@ -1,12 +1,24 @@
 __version__ = "0.1.0a0"
 
 import os
+import re
+import shlex
+import shutil
 from aiida.common.extendeddicts import AttributeDict
 from aiida.engine import CalcJob
 from aiida import orm
 from aiida.common import datastructures, exceptions
 from aiida.plugins import DataFactory
-from ase.atoms import default
+from aiida_abacus.calculations import hashing, retrieve
+from aiida_abacus.calculations.stru import (
+    format_atomic_positions,
+    format_lattice,
+    get_site_arrays,
+    validate_fixed_coords,
+)
+from aiida_abacus.parsers import parse_raw
+from aiida_abacus.utils import pseudo_cache, timing
+from aiida_abacus.utils.parallelization import get_layout
 
 LegacyUpfData = DataFactory("upf")
 UpfData = DataFactory("pseudo.upf")
@@ -17,15 +29,42 @@ class BaseCalculation(CalcJob):
     A basic calculation.
     """
 
+    # The hash of the node follows the canonical policy of `hashing`
+    _node_class = hashing.AbacusCalcJobNode
+
     _DEFAULT_INPUT_FILE = "INPUT"
     _DEFAULT_OUTPUT_FILE = "aiida.out"
     _PSEUDO_SUBFOLDER = "pseudo"
+    _OUTPUT_SUBFOLDER = "OUT.aiida"
+    # Read by ABACUS after every ionic step: with `stop_ion true` it stops and writes the outputs of the completed steps
+    _EXIT_FILE = "EXIT"
+    # Written by the job script when it asked ABACUS to stop before the walltime of the job
+    _STOPPED_FILE = "aiida.stopped"
+    # Written by the job script when a pseudo linked from the cache of the computer is missing or corrupted
+    _PSEUDO_CACHE_MISSING_FILE = "aiida.pseudo_cache_missing"
+    # Written by the job script when output files are excluded or compressed, a `.gz` suffix is added if compressed
+    _RETRIEVE_ARCHIVE = "aiida.retrieve.tar"
+    # Copy of `parse_raw` run by the job script to reduce the logs on the remote, and the files it writes
+    _REDUCE_SCRIPT = "aiida_reduce.py"
+    _REDUCED_SUMMARY = "aiida_reduced.json"
+    _REDUCED_ARRAYS = "aiida_reduced.npz"
+    # Raw output files that are replaced by the reduced ones in the retrieved files
+    _REDUCED_PATTERNS = ("running_*.log", "MD_dump")
+    # Always retrieved, the output files of ABACUS are added according to the retrieve profile
     _DEFAULT_RETRIEVE_LIST = [
-        "OUT.aiida",
         _DEFAULT_INPUT_FILE,
         _DEFAULT_OUTPUT_FILE,
     ]
     _DEFAULT_SETTINGS = {}
+    # Files of the parent calculation that are read at start-up, by the init key that reads them and the output key
+    # that writes them
+    _RESTART_FILES = {
+        "init_chg": ("out_chg", "SPIN*_CHG"),
+        "init_wfc": ("out_wfc_pw", "WAVEFUNC*"),
+    }
+    # Files of the parent calculation that molecular dynamics with `md_restart` continue from: the step to restart
+    # from and the structures with the velocities of the steps, always copied since they are written again
+    _MD_RESTART_FILES = ("Restart_md.dat", "STRU*")
 
     @classmethod
     def define(cls, spec):
@@ -43,6 +82,11 @@ class BaseCalculation(CalcJob):
         spec.input(
             "metadata.options.withmpi", valid_type=bool, default=True
         )  # Override default withmpi=False
+        spec.input(
+            "metadata.options.parser_name",
+            valid_type=str,
+            default="abacus.base",
+        )
 
         spec.input(
             "structure",
@@ -78,18 +122,113 @@ class BaseCalculation(CalcJob):
             required=False,
             help="An optional working directory of a previously completed calculation to restart from.",
         )
+        spec.output(
+            "output_parameters",
+            valid_type=orm.Dict,
+            help="The parsed energies, Fermi level, SCF step counts and wall times.",
+        )
+        spec.output(
+            "output_structure",
+            valid_type=orm.StructureData,
+            required=False,
+            help="The relaxed structure, for `relax`, `cell-relax` and `md` calculations.",
+        )
+        spec.output(
+            "output_trajectory",
+            valid_type=orm.TrajectoryData,
+            required=False,
+            help="The positions, cells, forces, stress and energies of all ionic steps.",
+        )
+        spec.output(
+            "output_timing",
+            valid_type=orm.Dict,
+            required=False,
+            help="The time and number of calls of the routines of ABACUS, by class and routine name.",
+        )
+        spec.default_output_node = "output_parameters"
 
+        spec.exit_code(
+            302,
+            "ERROR_OUTPUT_STDOUT_MISSING",
+            message="The retrieved folder did not contain the required stdout output file.",
+        )
+        spec.exit_code(
+            303,
+            "ERROR_OUTPUT_LOG_MISSING",
+            message="The retrieved folder did not contain the `running_*.log` output file.",
+        )
+        spec.exit_code(
+            304,
+            "ERROR_PSEUDO_CACHE_MISSING",
+            message="A pseudopotential file in the cache of the computer was missing or corrupted, ABACUS did not run.",
+            invalidates_cache=True,
+        )
+        spec.exit_code(
+            312,
+            "ERROR_OUTPUT_STDOUT_INCOMPLETE",
+            message="The output files were incomplete probably because the calculation got interrupted.",
+        )
+        spec.exit_code(
+            351,
+            "ERROR_OUT_OF_MEMORY",
+            message="The calculation was stopped because it ran out of memory.",
+        )
+        spec.exit_code(
+            410,
+            "ERROR_ELECTRONIC_CONVERGENCE_NOT_REACHED",
+            message="The electronic minimization cycle did not reach self-consistency.",
+        )
+        spec.exit_code(
+            501,
+            "ERROR_IONIC_CONVERGENCE_NOT_REACHED",
+            message="The ionic minimization cycle did not converge for the given thresholds.",
+        )
+
+    @timing.timed("prepare_for_submission")
     def prepare_for_submission(self, tempfolder):
         # write INPUT, STRU, KPT, potentials
         local_copy_list = []
+        remote_copy_list = []
+        remote_symlink_list = []
         STRU = tempfolder.get_abs_path("STRU")
         KPT = tempfolder.get_abs_path("KPT")
         INPUT = tempfolder.get_abs_path("INPUT")
-        local_copy_list_extend = self.write_STRU(STRU)
+        local_copy_list_extend, remote_list_extend = self.write_STRU(STRU)
         self.write_KPT(KPT)
         self.write_INPUT(INPUT)
+        # The layout the calculation runs with, whether it was planned by the work chains or given explicitly
+        self.node.set_extra(
+            "abacus_parallelization",
+            get_layout(
+                self.inputs.metadata.options, self.inputs.parameters.get_dict()
+            ),
+        )
 
         local_copy_list.extend(local_copy_list_extend)
+        remote_symlink_list.extend(remote_list_extend)
+        prepend_text = []
+        if remote_list_extend:
+            # The pseudo subfolder is not created by a local copy when all pseudos come from the cache
+            tempfolder.get_subfolder(self._PSEUDO_SUBFOLDER, create=True)
+            # The links are not checked by the engine, the job script does it before ABACUS reads them
+            prepend_text.append(
+                pseudo_cache.get_check_script(
+                    [
+                        (os.path.basename(source), target)
+                        for _, source, target in remote_list_extend
+                    ],
+                    self._PSEUDO_CACHE_MISSING_FILE,
+                    copy=self.inputs.settings.get_dict().get("PSEUDO_CACHE")
+                    == "copy",
+                )
+            )
+
+        restart_copy_list, restart_symlink_list = self.get_restart_lists()
+        if restart_copy_list or restart_symlink_list:
+            # The parent files are copied or linked into the output folder, from which ABACUS reads them
+            tempfolder.get_subfolder(self._OUTPUT_SUBFOLDER, create=True)
+            remote_copy_list.extend(restart_copy_list)
+            remote_symlink_list.extend(restart_symlink_list)
 
         codeinfo = datastructures.CodeInfo()
         codeinfo.code_uuid = self.inputs.code.uuid
@@ -100,10 +239,194 @@ class BaseCalculation(CalcJob):
         calcinfo = datastructures.CalcInfo()
         calcinfo.codes_info = [codeinfo]
         calcinfo.local_copy_list = local_copy_list
-        calcinfo.retrieve_list = self._DEFAULT_RETRIEVE_LIST
+        calcinfo.remote_copy_list = remote_copy_list
+        calcinfo.remote_symlink_list = remote_symlink_list
+        (
+            calcinfo.retrieve_list,
+            calcinfo.retrieve_temporary_list,
+            archive_script,
+        ) = self.get_retrieve_lists()
+        if remote_list_extend:
+            calcinfo.retrieve_list.append(self._PSEUDO_CACHE_MISSING_FILE)
+        append_text = []
+        reduce_command = self.get_reduce_command()
+        if reduce_command:
+            shutil.copyfile(
+                parse_raw.__file__,
+                tempfolder.get_abs_path(self._REDUCE_SCRIPT),
+            )
+
+        stop_after = self.get_graceful_stop_seconds()
+        if stop_after is not None:
+            # Ask ABACUS to stop after its current ionic step, in time for the job to end by itself
+            prepend_text.append(
+                f"( sleep {stop_after} && touch '{self._STOPPED_FILE}' && echo 'stop_ion true' > '{self._EXIT_FILE}' ) &\n"
+                "ABACUS_WATCHDOG_PID=$!"
+            )
+            append_text.append("kill $ABACUS_WATCHDOG_PID 2> /dev/null")
+            calcinfo.retrieve_list.append(self._STOPPED_FILE)
+        if prepend_text:
+            calcinfo.prepend_text = "\n".join(prepend_text)
+        if reduce_command:
+            append_text.append(reduce_command)
+        if archive_script:
+            append_text.append(archive_script)
+        if append_text:
+            calcinfo.append_text = "\n".join(append_text)
 
         return calcinfo
 
+    def get_retrieve_lists(self):
+        """Return the retrieve list, the temporary retrieve list and the job script lines that write the archive.
+
+        The output files of ABACUS that are retrieved are set by the following settings, all patterns are globs
+        relative to the working directory:
+
+        * `RETRIEVE_PROFILE`: `minimal` (the log files), `analysis` (also structures, bands, DOS and the MD dump) or
+          `full` (the whole output folder, the default)
+        * `RETRIEVE_INCLUDE`: patterns added to the profile
+        * `RETRIEVE_EXCLUDE`: patterns of files that are not retrieved
+        * `RETRIEVE_TEMPORARY`: patterns of files that are retrieved for the parser, but not stored, e.g. large logs
+        * `RETRIEVE_COMPRESS`: if True, the files are compressed on the remote before the transfer
+
+        With the `REMOTE_REDUCE` setting, the log files and the MD dump are replaced by their reduced summary, see
+        `get_reduce_command`.
+
+        Excluded and compressed files go through an archive that the job script writes after ABACUS ended. Unless the
+        files are compressed, the files of the `minimal` profile are still retrieved directly, so that a job killed
+        before the end of its script can be parsed, as long as none of them may be excluded.
+
+        :returns: tuple of the retrieve list, the temporary retrieve list and the archive script, or None
+        :raises InputValidationError: if the profile or a pattern is invalid
+        """
+        settings = self.inputs.settings.get_dict()
+        try:
+            patterns = retrieve.get_profile_patterns(
+                settings.get(
+                    "RETRIEVE_PROFILE", retrieve.DEFAULT_RETRIEVE_PROFILE
+                ),
+                self._OUTPUT_SUBFOLDER,
+            )
+            patterns += retrieve.validate_patterns(
+                settings.get("RETRIEVE_INCLUDE", []), "RETRIEVE_INCLUDE"
+            )
+            exclude = retrieve.validate_patterns(
+                settings.get("RETRIEVE_EXCLUDE", []), "RETRIEVE_EXCLUDE"
+            )
+            temporary = retrieve.validate_patterns(
+                settings.get("RETRIEVE_TEMPORARY", []), "RETRIEVE_TEMPORARY"
+            )
+        except ValueError as exception:
+            raise exceptions.InputValidationError(str(exception))
+        compress = bool(settings.get("RETRIEVE_COMPRESS", False))
+
+        reduced = []
+        if self.get_reduce_command():
+            reduced = [self._REDUCED_SUMMARY, self._REDUCED_ARRAYS]
+            exclude += [
+                f"{self._OUTPUT_SUBFOLDER}/{pattern}"
+                for pattern in self._REDUCED_PATTERNS
+            ]
+
+        # Temporary files are not stored: drop the patterns they repeat and exclude them from the broader ones
+        exclude += [
+            pattern for pattern in temporary if pattern not in patterns
+        ]
+        patterns = [
+            pattern
+            for pattern in dict.fromkeys(patterns)
+            if pattern not in temporary
+            and not retrieve.is_excluded(pattern, exclude)
+        ]
+        retrieve_list = list(self._DEFAULT_RETRIEVE_LIST) + reduced
+        retrieve_temporary_list = [
+            retrieve.get_retrieve_item(pattern) for pattern in temporary
+        ]
+        if not exclude and not compress:
+            retrieve_list.extend(map(retrieve.get_retrieve_item, patterns))
+            return retrieve_list, retrieve_temporary_list, None
+
+        direct = []
+        if not compress:
+            direct = retrieve.get_profile_patterns(
+                "minimal", self._OUTPUT_SUBFOLDER
+            )
+            direct = [
+                pattern
+                for pattern in direct
+                if pattern in patterns
+                and not retrieve.may_be_excluded(pattern, exclude)
+            ]
+        archived = [pattern for pattern in patterns if pattern not in direct]
+        retrieve_list.extend(map(retrieve.get_retrieve_item, direct))
+        if not archived:
+            return retrieve_list, retrieve_temporary_list, None
+
+        archive = self._RETRIEVE_ARCHIVE + (".gz" if compress else "")
+        retrieve_list.append(archive)
+        script = retrieve.get_archive_script(
+            archived, exclude, archive, compress
+        )
+        return retrieve_list, retrieve_temporary_list, script
+
+    def get_reduce_command(self):
+        """Return the command of the job script that reduces the output files on the remote, or None.
+
+        With the `REMOTE_REDUCE` setting, the job script runs a copy of `aiida_abacus.parsers.parse_raw` after ABACUS
+        ended, which parses the `running_*.log` and `MD_dump` files into a JSON summary and compressed NumPy arrays.
+        These are retrieved instead of the raw files, which stay in the remote folder. The setting is True to use
+        `python3`, or the python executable of the remote, which must have numpy installed.
+
+        :raises InputValidationError: if the executable is not a plain path
+        """
+        executable = self.inputs.settings.get_dict().get(
+            "REMOTE_REDUCE", False
+        )
+        if not executable:
+            return None
+        if executable is True:
+            executable = "python3"
+        if not isinstance(executable, str) or not re.match(
+            r"^[\w./+-]+$", executable
+        ):
+            raise exceptions.InputValidationError(
+                f"Invalid python executable {executable!r} in `REMOTE_REDUCE`."
+            )
+        return " ".join(
+            [
+                executable,
+                self._REDUCE_SCRIPT,
+                self._OUTPUT_SUBFOLDER,
+                self._REDUCED_SUMMARY,
+                self._REDUCED_ARRAYS,
+                shlex.quote(
+                    str(
+                        self.inputs.parameters.get_dict().get(
+                            "calculation", "scf"
+                        )
+                    )
+                ),
+            ]
+        )
+
+    def get_graceful_stop_seconds(self):
+        """Return after how many seconds the job script should ask ABACUS to stop, or None to let it run.
+
+        The stop time is the `max_wallclock_seconds` of the job minus a safety margin, by default 5% of the walltime
+        and at least two minutes. ABACUS only stops after the ionic step it is running, so the margin has to cover one
+        ionic step and the writing of the outputs. It can be set in seconds with the `GRACEFUL_STOP_MARGIN` setting, and
+        the stop is disabled with `GRACEFUL_STOP: False`.
+        """
+        settings = self.inputs.settings.get_dict()
+        walltime = self.inputs.metadata.options.get("max_wallclock_seconds")
+        if not walltime or not settings.get("GRACEFUL_STOP", True):
+            return None
+        margin = settings.get("GRACEFUL_STOP_MARGIN", max(120, walltime // 20))
+        stop_after = int(walltime - margin)
+        if stop_after <= 0:
+            return None
+        return stop_after
+
     def write_KPT(self, dst):
         """refer to `aiida-quantumespresso/calculations/__init__.py:_generate_PWCPinputdata`"""
 
@@ -132,14 +455,25 @@ class BaseCalculation(CalcJob):
             target.write(kpoints_card)
 
     def write_STRU(self, dst):
-        """refer to `aiida-quantumespresso/calculations/__init__.py:_generate_PWCPinputdata`"""
+        """refer to `aiida-quantumespresso/calculations/__init__.py:_generate_PWCPinputdata`
+
+        :returns: tuple of the local copy list and the remote symlink list of the pseudopotential files
+        """
         from aiida.common.utils import get_unique_filename
 
         local_copy_list_to_append = []
+        remote_list_to_append = []
         settings = self.inputs.settings.get_dict()
         structure = self.inputs.structure
         pseudos = self.inputs.pseudos
 
+        # With the `PSEUDO_CACHE` setting, pseudos are linked (and copied by the job script, if the setting is "copy")
+        # from the content-addressed cache of the computer instead of being uploaded with every calculation. The files
+        # are staged in advance with `aiida-abacus pseudo-cache stage`, the job script checks that they are there.
+        cache = None
+        if settings.pop("PSEUDO_CACHE", False):
+            cache = pseudo_cache.get_cache(self.inputs.code.computer)
+
         # ------------- ATOMIC_SPECIES ------------
         atomic_species_card_list = []
 
@@ -166,13 +500,24 @@ class BaseCalculation(CalcJob):
                     pseudo.filename, list(pseudo_filenames.values())
                 )
                 pseudo_filenames[pseudo.pk] = filename
-                local_copy_list_to_append.append(
-                    (
-                        pseudo.uuid,
-                        pseudo.filename,
-                        os.path.join(self._PSEUDO_SUBFOLDER, filename),
+                if cache:
+                    remote_list_to_append.append(
+                        (
+                            self.inputs.code.computer.uuid,
+                            pseudo_cache.get_cached_path(
+                                cache, pseudo_cache.get_pseudo_md5(pseudo)
+                            ),
+                            os.path.join(self._PSEUDO_SUBFOLDER, filename),
+                        )
+                    )
+                else:
+                    local_copy_list_to_append.append(
+                        (
+                            pseudo.uuid,
+                            pseudo.filename,
+                            os.path.join(self._PSEUDO_SUBFOLDER, filename),
+                        )
                     )
-                )
 
             kind_names.append(kind.name)
             atomic_species_card_list.append(
@@ -200,15 +545,8 @@ class BaseCalculation(CalcJob):
         del sorted_atomic_species_card_list
         del atomic_species_card_list
 
-        # ------------ LATTICE_CONSTANT -----------
-        # TODO: The lattice constant of the system in unit of Bohr.
-        lattice_constant_card = f"LATTICE_CONSTANT\n{1}\n"
-        # ------------ LATTICE_VECTORS  -----------
-        lattice_vectors_strings = ["LATTICE_VECTORS\n"]
-        lattice_vectors_strings.extend(
-            ["{0} {1} {2}\n".format(*_) for _ in structure.cell]
-        )
-        lattice_vectors_card = "".join(lattice_vectors_strings)
+        # ------------ LATTICE_CONSTANT, LATTICE_VECTORS -----------
+        lattice_card = format_lattice(structure.cell)
 
         # ------------ ATOMIC_POSITIONS -----------
         # Check on validity of the initial magnetic moment
@@ -226,80 +564,103 @@ class BaseCalculation(CalcJob):
                 )
             initial_magnetic_strings = [f"{_:0.1f}" for _ in initial_magnetic]
         # Check on validity of FIXED_COORDS
-        fixed_coords_strings = []
-        fixed_coords = settings.pop("FIXED_COORDS", None)
-        if fixed_coords is None:
-            # No fixed_coords specified: a list of 0, The numbers \0 0 0" following the coordinates of the first atom means this atom are not allowed to move in all three directions
-            fixed_coords_strings = [
-                "  {:d} {:d} {:d}".format(*[0, 0, 0])
-            ] * len(structure.sites)
-        else:
-            if len(fixed_coords) != len(structure.sites):
-                raise exceptions.InputValidationError(
-                    "Input structure contains {:d} sites, but "
-                    "fixed_coords has length {:d}".format(
-                        len(structure.sites), len(fixed_coords)
-                    )
-                )
+        site_kind_names, positions = get_site_arrays(structure)
+        try:
+            fixed_coords = validate_fixed_coords(
+                settings.pop("FIXED_COORDS", None), len(site_kind_names)
+            )
+        except ValueError as exception:
+            raise exceptions.InputValidationError(str(exception))
 
-            for i, this_atom_fix in enumerate(fixed_coords):
-                if len(this_atom_fix) != 3:
-                    raise exceptions.InputValidationError(
-                        f"fixed_coords({i + 1:d}) has not length three"
-                    )
-                for fixed_c in this_atom_fix:
-                    if fixed_c not in [0, 1]:
-                        raise exceptions.InputValidationError(
-                            f"fixed_coords({i + 1:d}) has non-(0, 1) elements"
-                        )
+        atomic_positions_card = format_atomic_positions(
+            site_kind_names, positions, fixed_coords, initial_magnetic_strings
+        )
 
-                fixed_coords_strings.append(
-                    "  {:d} {:d} {:d}".format(*this_atom_fix)
-                )
+        with open(dst, "w", encoding="utf8") as target:
+            target.write(atomic_species_card)
+            target.write(lattice_card)
+            target.write(atomic_positions_card)
+        return local_copy_list_to_append, remote_list_to_append
 
-        abs_pos = [_.position for _ in structure.sites]
-        atomic_positions_card_list = ["ATOMIC_POSITIONS\n", "Direct\n"]
-        coordinates = abs_pos
+    @staticmethod
+    def is_output_enabled(parameters, key):
+        """Return whether an output parameter of ABACUS, e.g. `out_chg`, is switched on in the parameters."""
+        value = str(parameters.get(key, 0)).split()
+        return bool(value) and value[0].lower() in ("1", "true", ".true.", "t")
 
-        ap_dict = {}
-        for site, site_coords, fixed_coords_string in zip(
-            structure.sites, coordinates, fixed_coords_strings
-        ):
-            atom = site.kind_name
-            position = "{0:18.10f} {1:18.10f} {2:18.10f} {3}\n".format(
-                site_coords[0],
-                site_coords[1],
-                site_coords[2],
-                fixed_coords_string,
+    def get_restart_keys(self):
+        """Return the init keys for the files that can be read from the `parent_folder`.
+
+        The charge density is always used. The wavefunctions are used only if the parent calculation wrote them, which
+        is known from the `out_wfc_pw` parameter of the `BaseCalculation` that created the folder.
+
+        :returns: list of init keys, e.g. `["init_chg", "init_wfc"]`
+        """
+        if "parent_folder" not in self.inputs:
+            return []
+
+        try:
+            parent_parameters = (
+                self.inputs.parent_folder.creator.inputs.parameters.get_dict()
             )
-            if atom not in ap_dict:
-                ap_dict[atom] = {
-                    "count": 1,
-                    "positions": [position],
-                }
-            else:
-                ap_dict[atom]["count"] += 1
-                ap_dict[atom]["positions"].append(position)
-
-        for idx, (k, v) in enumerate(ap_dict.items()):
-            atomic_positions_card_list.append(
-                "{element}\n{magnetic}\n{natoms}\n{positions}".format(
-                    element=k,
-                    magnetic=initial_magnetic_strings[idx],
-                    natoms=v["count"],
-                    positions="".join(v["positions"]),
-                )
+        except (AttributeError, exceptions.NotExistent):
+            return ["init_chg"]
+
+        return [
+            init_key
+            for init_key, (out_key, _) in self._RESTART_FILES.items()
+            if init_key == "init_chg"
+            or self.is_output_enabled(parent_parameters, out_key)
+        ]
+
+    def get_restart_lists(self):
+        """Return the remote copy list and the remote symlink list of the restart files of the `parent_folder`.
+
+        ABACUS writes its output files in place, so a file that this calculation writes again, e.g. the charge density
+        with `out_chg`, is always copied: writing through a symlink would overwrite the file of the parent. The other
+        files are linked, unless the `PARENT_FOLDER_SYMLINK` setting is False. The MD restart files are copied if
+        `md_restart` is set.
+
+        :raises InputValidationError: if the parent folder is on another computer
+        """
+        keys = self.get_restart_keys()
+        if not keys:
+            return [], []
+
+        parent_folder = self.inputs.parent_folder
+        if parent_folder.computer.uuid != self.inputs.code.computer.uuid:
+            raise exceptions.InputValidationError(
+                "The `parent_folder` must be on the computer of the code to restart from it."
             )
+        parameters = self.inputs.parameters.get_dict()
+        symlink = self.inputs.settings.get_dict().get(
+            "PARENT_FOLDER_SYMLINK", True
+        )
 
-        atomic_positions_card = "".join(atomic_positions_card_list)
-        del atomic_positions_card_list
+        def get_entry(pattern):
+            return (
+                parent_folder.computer.uuid,
+                os.path.join(
+                    parent_folder.get_remote_path(),
+                    self._OUTPUT_SUBFOLDER,
+                    pattern,
+                ),
+                self._OUTPUT_SUBFOLDER,
+            )
 
-        with open(dst, "w", encoding="utf8") as target:
-            target.write(atomic_species_card)
-            target.write(lattice_constant_card)
-            target.write(lattice_vectors_card)
-            target.write(atomic_positions_card)
-        return local_copy_list_to_append
+        copy_list = []
+        symlink_list = []
+        for key in keys:
+            out_key, pattern = self._RESTART_FILES[key]
+            if symlink and not self.is_output_enabled(parameters, out_key):
+                symlink_list.append(get_entry(pattern))
+            else:
+                copy_list.append(get_entry(pattern))
+        if self.is_output_enabled(parameters, "md_restart"):
+            copy_list.extend(
+                get_entry(pattern) for pattern in self._MD_RESTART_FILES
+            )
+        return copy_list, symlink_list
 
     def validate_parameters(self):
         parameters = AttributeDict(self.inputs.parameters.get_dict())
@@ -307,6 +668,9 @@ class BaseCalculation(CalcJob):
         parameters.pseudo_dir = f"./{self._PSEUDO_SUBFOLDER}"
         if "ntype" not in parameters:
             parameters.ntype = len(self.inputs.structure.kinds)
+        # Read the files of the parent calculation, unless explicitly set otherwise
+        for key in self.get_restart_keys():
+            parameters.setdefault(key, "file")
         return parameters
 
     def write_INPUT(self, dst):
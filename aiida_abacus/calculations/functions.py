@@ -1,9 +1,13 @@
 # -*- coding: utf-8 -*-
+import collections
+
 from aiida.engine import calcfunction
 
 
 @calcfunction
-def create_kpoints_from_distance(structure, distance, force_parity, system_2d):
+def create_kpoints_from_distance(
+    structure, distance, force_parity, system_2d, vacuum_threshold=None
+):
     """[Refer to `aiida_quantumespresso/calculations/functions/create_kpoints_from_distance`, v.3.4.2] Calculation function to compute a k-point mesh for a structure with a guaranteed minimum k-point distance.
 
     Generate a uniformly spaced kpoint mesh for a given structure.
@@ -13,11 +17,15 @@ def create_kpoints_from_distance(structure, distance, force_parity, system_2d):
     :param structure: the StructureData to which the mesh should apply
     :param distance: a Float with the desired distance between kpoints in reciprocal space
     :param force_parity: a Bool to specify whether the generated mesh should maintain parity
+    :param vacuum_threshold: an optional Float with the widest gap in Ångström between atomic planes of a periodic
+        direction, if given a single k-point is used along the directions separated by more vacuum
     :returns: a KpointsData with the generated mesh
     """
     from numpy import linalg
     from aiida.orm import KpointsData
 
+    from aiida_abacus.calculations.kmesh import get_periodic_directions
+
     epsilon = 1e-5
 
     kpoints = KpointsData()
@@ -41,10 +49,301 @@ def create_kpoints_from_distance(structure, distance, force_parity, system_2d):
         nkpoints = max(lengths_kpoint)
         kpoints.set_kpoints_mesh([nkpoints, nkpoints, nkpoints])
 
-    # TODO: cope with 2d system structures
+    mesh, off = kpoints.get_kpoints_mesh()
+    if vacuum_threshold is not None:
+        # A single k-point along the directions that are separated by vacuum
+        periodic = get_periodic_directions(
+            structure.cell,
+            [site.position for site in structure.sites],
+            vacuum_threshold.value,
+        )
+        mesh = [
+            n if is_periodic else 1 for n, is_periodic in zip(mesh, periodic)
+        ]
     if system_2d.value is True:
-        mesh, off = kpoints.get_kpoints_mesh()
         mesh[2] = 1
-        kpoints.set_kpoints_mesh(mesh)
+    kpoints.set_kpoints_mesh(mesh)
 
     return kpoints
+
+
+_KPOINTS_MESH_EXTRA = "abacus_kpoints_mesh"
+
+# Process-local LRU cache of the shared mesh nodes: (profile name, mesh key) -> pk
+_KPOINTS_NODE_CACHE = collections.OrderedDict()
+_KPOINTS_NODE_CACHE_SIZE = 1024
+
+
+def _get_mesh_key(mesh, offset):
+    return (
+        " ".join(str(int(i)) for i in mesh)
+        + " "
+        + " ".join(str(float(i)) for i in offset)
+    )
+
+
+@calcfunction
+def create_kpoints_mesh(mesh, offset):
+    """Calculation function to create a `KpointsData` with a k-point mesh.
+
+    :param mesh: a List with the three integers of the mesh
+    :param offset: a List with the three floats of the offset
+    :returns: a KpointsData with the mesh
+    """
+    from aiida.orm import KpointsData
+
+    kpoints = KpointsData()
+    kpoints.set_kpoints_mesh(mesh.get_list(), offset=offset.get_list())
+    return kpoints
+
+
+def get_kpoints_nodes(mesh_list, offset=(0.0, 0.0, 0.0)):
+    """Return stored `KpointsData` nodes for the given meshes, reusing the nodes created for the same mesh before.
+
+    A mesh `KpointsData` only contains the mesh and the offset, so a single node can be shared by all calculations
+    with the same mesh. New meshes are created by the `create_kpoints_mesh` calculation function, which records their
+    provenance. Nodes are found through their `abacus_kpoints_mesh` extra with a single query for all meshes that are
+    not in the in-memory cache of the loaded profile yet.
+
+    :param mesh_list: list of meshes, each a sequence of three integers
+    :param offset: the offset shared by all meshes
+    :returns: list of stored `KpointsData` nodes, in the order of `mesh_list`
+    """
+    from aiida import orm
+    from aiida.common.exceptions import NotExistent
+    from aiida.manage.configuration import get_profile
+
+    profile = get_profile().name
+    keys = [_get_mesh_key(mesh, offset) for mesh in mesh_list]
+    nodes = {}
+    for key in set(keys):
+        pk = _KPOINTS_NODE_CACHE.get((profile, key))
+        if pk is None:
+            continue
+        try:
+            nodes[key] = orm.load_node(pk)
+        except NotExistent:
+            del _KPOINTS_NODE_CACHE[(profile, key)]
+        else:
+            _KPOINTS_NODE_CACHE.move_to_end((profile, key))
+
+    missing = set(keys) - set(nodes)
+    if missing:
+        qb = orm.QueryBuilder()
+        qb.append(
+            orm.KpointsData,
+            filters={f"extras.{_KPOINTS_MESH_EXTRA}": {"in": list(missing)}},
+            project=[f"extras.{_KPOINTS_MESH_EXTRA}", "*"],
+        )
+        for key, kpoints in qb.iterall():
+            nodes.setdefault(key, kpoints)
+
+    for key, mesh in zip(keys, mesh_list):
+        if key not in nodes:
+            kpoints = create_kpoints_mesh(
+                orm.List(list=[int(i) for i in mesh]),
+                orm.List(list=[float(i) for i in offset]),
+            )
+            kpoints.set_extra(_KPOINTS_MESH_EXTRA, key)
+            nodes[key] = kpoints
+        _KPOINTS_NODE_CACHE[(profile, key)] = nodes[key].pk
+        _KPOINTS_NODE_CACHE.move_to_end((profile, key))
+    while len(_KPOINTS_NODE_CACHE) > _KPOINTS_NODE_CACHE_SIZE:
+        _KPOINTS_NODE_CACHE.popitem(last=False)
+    return [nodes[key] for key in keys]
+
+
+def get_kpoints_from_distance(
+    structures,
+    distance,
+    force_parity=False,
+    system_2d=False,
+    vacuum_threshold=None,
+):
+    """Batched and memoized alternative to `create_kpoints_from_distance` for many structures.
+
+    The meshes of all structures are computed at once from their stacked cells, and structures with the same mesh
+    share a single stored `KpointsData` node, so a calcfunction node is only created per distinct mesh. A single
+    k-point is used along the directions that are not periodic or that are separated by vacuum, see
+    `get_periodic_directions`.
+
+    :param structures: list of `StructureData`
+    :param distance: the desired distance between kpoints in reciprocal space, in 1/Ångström
+    :param force_parity: whether the generated meshes should maintain parity
+    :param system_2d: whether to use a single k-point along the third direction
+    :param vacuum_threshold: the widest gap in Ångström between atomic planes of a periodic direction, e.g.
+        `VACUUM_THRESHOLD`, by default vacuum is not detected
+    :returns: list of stored `KpointsData`, one per structure
+    """
+    import numpy as np
+
+    from aiida_abacus.calculations.kmesh import (
+        get_kpoints_meshes,
+        get_periodic_directions,
+    )
+
+    if vacuum_threshold is None:
+        vacuum_threshold = 0.0
+    cells = np.array([structure.cell for structure in structures])
+    pbcs = np.array(
+        [
+            np.array(structure.pbc)
+            & get_periodic_directions(
+                structure.cell,
+                [site.position for site in structure.sites],
+                vacuum_threshold,
+            )
+            for structure in structures
+        ]
+    )
+    meshes = get_kpoints_meshes(cells, distance, force_parity, system_2d, pbcs)
+    return get_kpoints_nodes(meshes)
+
+
+@calcfunction
+def reduce_to_primitive(structure, symprec):
+    """Calculation function to reduce a structure to its Niggli-reduced primitive cell.
+
+    Sites of different kinds are never equivalent, so magnetic or otherwise distinguished sites are kept. See
+    `aiida_abacus.utils.primitive` for the transformation.
+
+    :param structure: the periodic StructureData to reduce
+    :param symprec: a Float with the tolerance of the symmetry search, in Angstrom
+    :returns: a dictionary with the `primitive_structure` and the `transformation`, an ArrayData with the arrays
+        `matrix`, `mapping` and `translations`, or an exit code if the structure could not be reduced
+    """
+    import numpy as np
+
+    from aiida import orm
+    from aiida.engine import ExitCode
+
+    from aiida_abacus.utils.primitive import get_primitive_transformation
+
+    kind_names = [kind.name for kind in structure.kinds]
+    try:
+        (
+            cell,
+            positions,
+            numbers,
+            matrix,
+            mapping,
+            translations,
+        ) = get_primitive_transformation(
+            structure.cell,
+            [site.position for site in structure.sites],
+            [kind_names.index(site.kind_name) for site in structure.sites],
+            symprec.value,
+        )
+    except ValueError as exception:
+        return ExitCode(300, str(exception))
+
+    primitive = orm.StructureData(cell=cell.tolist(), pbc=structure.pbc)
+    for kind in structure.kinds:
+        primitive.append_kind(kind)
+    for number, position in zip(numbers, positions):
+        primitive.append_site(
+            orm.Site(kind_name=kind_names[number], position=position.tolist())
+        )
+
+    transformation = orm.ArrayData()
+    transformation.set_array("matrix", matrix)
+    transformation.set_array("mapping", np.asarray(mapping))
+    transformation.set_array("translations", translations)
+    return {"primitive_structure": primitive, "transformation": transformation}
+
+
+@calcfunction
+def map_structure_to_original(structure, transformation, original):
+    """Calculation function to map a structure in the primitive setting of `reduce_to_primitive` back.
+
+    :param structure: the StructureData in the primitive setting, e.g. relaxed
+    :param transformation: the transformation returned by `reduce_to_primitive`
+    :param original: the StructureData that was reduced, which gives the kinds and the order of the sites
+    :returns: the StructureData in the original setting
+    """
+    from aiida_abacus.utils.primitive import map_to_original
+
+    cell, positions = map_to_original(
+        structure.cell,
+        [site.position for site in structure.sites],
+        transformation.get_array("matrix"),
+        transformation.get_array("mapping"),
+        transformation.get_array("translations"),
+    )
+    mapped = original.clone()
+    mapped.reset_cell(cell.tolist())
+    mapped.reset_sites_positions(positions.tolist())
+    return mapped
+
+
+@calcfunction
+def map_trajectory_to_original(trajectory, transformation, original):
+    """Calculation function to map a trajectory in the primitive setting of `reduce_to_primitive` back.
+
+    Positions and cells are repeated as in `map_structure_to_original`, the forces and velocities are those of the
+    equivalent primitive sites, the energies are multiplied by the number of primitive cells and the stress is
+    unchanged.
+
+    :param trajectory: the TrajectoryData in the primitive setting
+    :param transformation: the transformation returned by `reduce_to_primitive`
+    :param original: the StructureData that was reduced
+    :returns: the TrajectoryData in the original setting
+    """
+    import numpy as np
+
+    from aiida import orm
+
+    from aiida_abacus.calculations.stru import (
+        get_site_arrays,
+        get_site_symbols,
+    )
+
+    matrix = transformation.get_array("matrix")
+    mapping = transformation.get_array("mapping")
+    translations = transformation.get_array("translations")
+
+    cells = trajectory.get_array("cells")
+    positions = trajectory.get_array("positions")[:, mapping] + np.einsum(
+        "ij,sjk->sik", translations, cells
+    )
+    site_kind_names, _ = get_site_arrays(original)
+    mapped = orm.TrajectoryData()
+    mapped.set_trajectory(
+        symbols=get_site_symbols(original, site_kind_names).tolist(),
+        positions=positions,
+        cells=np.einsum("ij,sjk->sik", matrix, cells),
+        stepids=trajectory.get_stepids(),
+    )
+    for name in trajectory.get_arraynames():
+        if name in ("positions", "cells", "steps"):
+            continue
+        array = trajectory.get_array(name)
+        if name == "energies":
+            array = array * round(abs(np.linalg.det(matrix)))
+        elif name in ("forces", "velocities"):
+            array = array[:, mapping]
+        mapped.set_array(name, array)
+    mapped.set_attribute("kind_names", site_kind_names.tolist())
+    return mapped
+
+
+@calcfunction
+def get_dimensionality(structure, vacuum_threshold):
+    """Calculation function to detect the number of periodic directions of a structure, see `get_periodic_directions`.
+
+    :param structure: the StructureData
+    :param vacuum_threshold: a Float with the widest gap in Ångström between atomic planes of a periodic direction
+    :returns: an Int, 3 for a bulk, 2 for a slab, 1 for a wire and 0 for a molecule
+    """
+    import numpy as np
+
+    from aiida import orm
+
+    from aiida_abacus.calculations.kmesh import get_periodic_directions
+
+    periodic = get_periodic_directions(
+        structure.cell,
+        [site.position for site in structure.sites],
+        vacuum_threshold.value,
+    ) & np.array(structure.pbc)
+    return orm.Int(int(periodic.sum()))
@@ -0,0 +1,141 @@
+"""Canonical hashing policy of the `BaseCalculation` nodes, used by the caching of AiiDA.
+
+Two calculations get the same hash, and the second one can be taken from the cache, if they describe the same
+physics, even when their inputs were built differently:
+
+* the parameters are compared after normalization: keys are lower case, numbers are compared by value, whether they
+  are given as integers, floats or strings, and floats are rounded to `FLOAT_SIGNIFICANT_DIGITS` digits
+* the parameters and settings that only change the parallelization or the handling of the files are ignored, as are
+  the options that only affect the scheduler and the job script
+* pseudopotentials are compared by the MD5 checksum of their content, not by their node
+* a missing `settings` input is equivalent to an empty one
+
+Calculations that were stopped before the walltime finish successfully, but are not valid cache sources, since they
+did not run all of their ionic steps.
+
+The policy is implemented by `AbacusCalcJobNode`, the node class of `BaseCalculation`, which is registered as an
+`aiida.node` entry point so that stored nodes are loaded with it and `verdi rehash` follows the same policy.
+"""
+
+from aiida.common.lang import classproperty
+from aiida.orm import CalcJobNode
+
+from aiida_abacus.utils import pseudo_cache
+
+FLOAT_SIGNIFICANT_DIGITS = 10
+
+HASH_IGNORED_OPTIONS = (
+    "resources",
+    "withmpi",
+    "prepend_text",
+    "append_text",
+    "custom_scheduler_commands",
+    "mpirun_extra_params",
+    "import_sys_environment",
+    "environment_variables",
+    "submit_script_filename",
+    "scheduler_stdout",
+    "scheduler_stderr",
+)
+HASH_IGNORED_PARAMETERS = ("kpar", "bndpar")
+# The settings that select the retrieved files are kept, since they change the outputs, as are those that stop the
+# calculation before the walltime
+HASH_IGNORED_SETTINGS = (
+    "PSEUDO_CACHE",
+    "PARENT_FOLDER_SYMLINK",
+)
+
+
+def get_canonical_value(value):
+    """Return a value of the parameters or settings in canonical form, numbers given as strings are converted."""
+    if isinstance(value, (list, tuple)):
+        return [get_canonical_value(item) for item in value]
+    if isinstance(value, dict):
+        return {key: get_canonical_value(item) for key, item in value.items()}
+    if isinstance(value, str):
+        try:
+            value = float(value.strip())
+        except ValueError:
+            return value.strip()
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return value
+    value = float(f"{value:.{FLOAT_SIGNIFICANT_DIGITS}g}")
+    return int(value) if value.is_integer() else value
+
+
+def get_canonical_parameters(parameters):
+    """Return the parameters of ABACUS in canonical form, without those that do not change the results."""
+    canonical = {}
+    for key, value in parameters.items():
+        key = key.strip().lower()
+        if key not in HASH_IGNORED_PARAMETERS and value is not None:
+            canonical[key] = get_canonical_value(value)
+    return canonical
+
+
+def get_canonical_settings(settings):
+    """Return the settings in canonical form, without those that do not change the results."""
+    return {
+        key: get_canonical_value(value)
+        for key, value in settings.items()
+        if key not in HASH_IGNORED_SETTINGS
+    }
+
+
+def get_canonical_inputs(node):
+    """Return the mapping of the input link labels of a calculation node onto what is hashed for them."""
+    from aiida.common.links import LinkType
+
+    ignored = node._hash_ignored_inputs  # pylint: disable=protected-access
+    inputs = {"settings": {}}
+    for entry in node.get_incoming(link_type=LinkType.INPUT_CALC).all():
+        label = entry.link_label
+        if label in ignored:
+            continue
+        if label == "parameters":
+            inputs[label] = get_canonical_parameters(entry.node.get_dict())
+        elif label == "settings":
+            inputs[label] = get_canonical_settings(entry.node.get_dict())
+        elif label.startswith("pseudos__"):
+            inputs[label] = pseudo_cache.get_pseudo_md5(entry.node)
+        else:
+            inputs[label] = entry.node.get_hash()
+    return inputs
+
+
+class AbacusCalcJobNode(CalcJobNode):
+    """Node of a `BaseCalculation`, whose hash follows the canonical policy."""
+
+    @classproperty
+    def _hash_ignored_attributes(cls):  # pylint: disable=no-self-argument
+        return super()._hash_ignored_attributes + HASH_IGNORED_OPTIONS
+
+    def _get_objects_to_hash(self):
+        """Return the objects hashed for the node, those of `CalcJobNode` with the canonical inputs.
+
+        The list is built in the same order as by `CalcJobNode`, instead of replacing one of its elements by position.
+        """
+        from importlib import import_module
+
+        return [
+            import_module(self.__module__.split(".", 1)[0]).__version__,
+            {
+                key: value
+                for key, value in self.attributes_items()
+                if key not in self._hash_ignored_attributes
+                and key not in self._updatable_attributes
+            },
+            self.computer.uuid if self.computer is not None else None,
+            get_canonical_inputs(self),
+        ]
+
+    @property
+    def is_valid_cache(self):
+        """Return whether the node can be used as a cache source, which excludes calculations stopped before the end."""
+        if not super().is_valid_cache:
+            return False
+        if "output_parameters" not in self.outputs:
+            return True
+        return not self.outputs.output_parameters.get_dict().get(
+            "stopped_restartable", False
+        )
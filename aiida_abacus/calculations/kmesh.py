@@ -0,0 +1,131 @@
+"""Array-based generation of Monkhorst-Pack k-point meshes for many cells at once.
+
+The meshes follow `KpointsData.set_kpoints_mesh_from_density` and the symmetric-cell and 2D rules of
+`create_kpoints_from_distance`, but are computed from a stacked (N, 3, 3) array of cells in a few numpy calls. Results
+are memoized on the rounded cell, so screening many copies of the same lattice only computes each mesh once.
+
+Directions along which the atoms are separated by vacuum, as in slabs, wires and molecules, can be detected by
+`get_periodic_directions` and get a single k-point, like the non-periodic directions of the cell.
+"""
+
+import numpy as np
+
+_EPSILON = 1e-5
+_DECIMALS = 6
+# Suggested width in Ångström of the widest gap between atomic planes beyond which a direction is taken as vacuum,
+# wide enough for layered and open bulk cells. The detection is opt-in in the work chains.
+VACUUM_THRESHOLD = 10.0
+
+_MESH_CACHE = {}
+
+
+def reciprocal_cells(cells):
+    """Return the reciprocal cells, including the 2π factor, of a stack of cells.
+
+    :param cells: (N, 3, 3) array with the cell vectors as rows, in Ångström
+    :returns: (N, 3, 3) array with the reciprocal vectors as rows, in 1/Ångström
+    """
+    return 2 * np.pi * np.linalg.inv(cells).transpose(0, 2, 1)
+
+
+def get_periodic_directions(
+    cell, positions, vacuum_threshold=VACUUM_THRESHOLD
+):
+    """Return along which cell vectors a structure is periodic, i.e. its atoms are not separated by vacuum.
+
+    For all three directions at once, the fractional coordinates of the atoms are sorted and the widest gap between
+    consecutive ones, including the gap across the cell boundary, is converted into a distance with the spacing of
+    the lattice planes. The direction is not periodic if the gap is wider than `vacuum_threshold`.
+
+    :param cell: (3, 3) array with the cell vectors as rows, in Ångström
+    :param positions: (N, 3) array of cartesian positions, in Ångström
+    :param vacuum_threshold: the widest gap in Ångström of a periodic direction, 0 to take all directions as periodic
+    :returns: (3,) boolean array
+    """
+    cell = np.asarray(cell, dtype=np.float64)
+    positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+    if not len(positions) or vacuum_threshold <= 0:
+        return np.ones(3, dtype=bool)
+
+    inverse = np.linalg.inv(cell)
+    scaled = np.sort((positions @ inverse) % 1.0, axis=0)
+    gaps = np.diff(np.vstack([scaled, scaled[:1] + 1.0]), axis=0).max(axis=0)
+    spacings = 1.0 / np.linalg.norm(inverse, axis=0)
+    return gaps * spacings <= vacuum_threshold
+
+
+def compute_kpoints_meshes(
+    cells, distance, force_parity=False, system_2d=False, pbcs=None
+):
+    """Compute the k-point meshes of a stack of cells with a guaranteed maximum distance between k-points.
+
+    :param cells: (N, 3, 3) array of cells in Ångström
+    :param distance: the maximum distance between k-points in reciprocal space, in 1/Ångström
+    :param force_parity: whether the number of k-points along each direction should be even
+    :param system_2d: whether to use a single k-point along the third direction
+    :param pbcs: optional (N, 3) boolean array of periodic boundary conditions, a single k-point is used along
+        non-periodic directions
+    :returns: (N, 3) integer array of meshes
+    """
+    cells = np.asarray(cells, dtype=np.float64).reshape(-1, 3, 3)
+    lengths = np.linalg.norm(reciprocal_cells(cells), axis=2)
+    meshes = np.maximum(
+        np.ceil(np.round(lengths / distance, 5)).astype(int), 1
+    )
+    if force_parity:
+        meshes += meshes % 2
+
+    # If the vectors of the cell all have the same length, the kpoint mesh should be isotropic as well
+    cell_lengths = np.linalg.norm(cells, axis=2)
+    is_symmetric_cell = np.all(
+        np.abs(cell_lengths - cell_lengths[:, :1]) < _EPSILON, axis=1
+    )
+    is_symmetric_mesh = np.all(meshes == meshes[:, :1], axis=1)
+    isotropic = is_symmetric_cell & ~is_symmetric_mesh
+    meshes[isotropic] = meshes[isotropic].max(axis=1, keepdims=True)
+
+    # After the isotropy rule, so that the vacuum of a cubic box is not given the mesh of the periodic directions
+    if pbcs is not None:
+        meshes[~np.asarray(pbcs, dtype=bool).reshape(-1, 3)] = 1
+    if system_2d:
+        meshes[:, 2] = 1
+    return meshes
+
+
+def get_kpoints_meshes(
+    cells, distance, force_parity=False, system_2d=False, pbcs=None
+):
+    """Memoized version of `compute_kpoints_meshes`.
+
+    Cells are rounded to 1e-6 Ångström to build the cache key. Only the cells that miss the cache are computed, in a
+    single batch.
+
+    :returns: list of tuples of three integers, one per cell
+    """
+    cells = np.asarray(cells, dtype=np.float64).reshape(-1, 3, 3)
+    if pbcs is None:
+        pbcs = np.ones((len(cells), 3), dtype=bool)
+    pbcs = np.asarray(pbcs, dtype=bool).reshape(-1, 3)
+
+    parameters = (
+        round(float(distance), 8),
+        bool(force_parity),
+        bool(system_2d),
+    )
+    keys = [
+        (cell.tobytes(), pbc.tobytes()) + parameters
+        for cell, pbc in zip(np.round(cells, _DECIMALS) + 0.0, pbcs)
+    ]
+    missing = [i for i, key in enumerate(keys) if key not in _MESH_CACHE]
+    if missing:
+        meshes = compute_kpoints_meshes(
+            cells[missing], distance, force_parity, system_2d, pbcs[missing]
+        )
+        for i, mesh in zip(missing, meshes.tolist()):
+            _MESH_CACHE[keys[i]] = tuple(mesh)
+    return [_MESH_CACHE[key] for key in keys]
+
+
+def clear_cache():
+    """Empty the cache of k-point meshes."""
+    _MESH_CACHE.clear()
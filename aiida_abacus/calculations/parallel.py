@@ -0,0 +1,155 @@
+"""Estimate a parallelization layout for plane-wave ABACUS calculations from the size of the problem.
+
+The estimate only depends on plain numbers, so that it can be used both by the work chains and the command line
+interface before a calculation is created: the resources of a `CalcJob` cannot be changed once it exists.
+"""
+
+import math
+
+# Plane waves per MPI process below which the FFT parallelization stops paying off
+_PLANE_WAVES_PER_PROCESS = 1500
+# Plane waves x bands x k-points per MPI process below which more processes mostly add communication
+_WORK_PER_PROCESS = 200000
+# Bands per band group below which band parallelization stops paying off
+_BANDS_PER_GROUP = 16
+# Memory overhead factor on the wavefunctions, for the Davidson subspace, charge density and FFT buffers
+_MEMORY_OVERHEAD = 4.0
+
+
+def estimate_number_of_plane_waves(volume, ecutwfc):
+    """Return the number of plane waves of a cell.
+
+    :param volume: the cell volume in Å^3
+    :param ecutwfc: the wavefunction cutoff in Ry
+    """
+    volume_bohr = volume / 0.52917721067**3
+    return max(1, int(volume_bohr * ecutwfc**1.5 / (6 * math.pi**2)))
+
+
+def estimate_number_of_bands(number_of_electrons):
+    """Return the number of bands used by ABACUS for plane-wave calculations by default, including empty bands."""
+    return max(
+        1,
+        int(math.ceil(1.2 * number_of_electrons / 2)),
+        int(math.ceil(number_of_electrons / 2)) + 4,
+    )
+
+
+def _largest_divisor(number, maximum):
+    """Return the largest divisor of `number` not larger than `maximum`."""
+    for divisor in range(max(1, min(number, maximum)), 0, -1):
+        if number % divisor == 0:
+            return divisor
+    return 1
+
+
+def plan_parallelization(
+    volume,
+    ecutwfc,
+    number_of_electrons,
+    number_of_kpoints,
+    max_num_machines=1,
+    mpiprocs_per_machine=1,
+    max_threads_per_mpiproc=1,
+    max_memory_per_machine_mb=None,
+    number_of_spin_components=1,
+):
+    """Choose the MPI x OpenMP layout, the number of k-point pools (`kpar`) and band groups (`bndpar`).
+
+    The number of processes per k-point pool follows from the number of plane waves, and as many pools as there are
+    k-points are used within the limits and as long as every process gets enough work. A calculation that fits in
+    one machine only asks for the processes it uses, larger ones use full machines and the processes are split evenly
+    between the pools. Idle cores of a partially used machine are given to OpenMP threads, up to
+    `max_threads_per_mpiproc`.
+
+    :param volume: the cell volume in Å^3
+    :param ecutwfc: the wavefunction cutoff in Ry
+    :param number_of_electrons: the number of valence electrons
+    :param number_of_kpoints: the number of k-points, e.g. the size of the mesh
+    :param max_num_machines: the maximum number of machines
+    :param mpiprocs_per_machine: the number of cores of one machine
+    :param max_threads_per_mpiproc: the maximum number of OpenMP threads per MPI process
+    :param max_memory_per_machine_mb: if given, more processes per pool are used until the wavefunctions fit
+    :param number_of_spin_components: 2 for spin-polarized calculations
+    :returns: dictionary with `num_machines`, `num_mpiprocs_per_machine`, `num_threads_per_mpiproc`, `kpar`,
+        `bndpar` and the estimated `number_of_plane_waves` and `number_of_bands`
+    """
+    max_cores = max(1, max_num_machines * mpiprocs_per_machine)
+    number_of_plane_waves = estimate_number_of_plane_waves(volume, ecutwfc)
+    number_of_bands = estimate_number_of_bands(number_of_electrons)
+    number_of_kpoints = max(1, number_of_kpoints) * number_of_spin_components
+
+    procs_per_pool = int(
+        math.ceil(number_of_plane_waves / _PLANE_WAVES_PER_PROCESS)
+    )
+    if max_memory_per_machine_mb:
+        # Complex double wavefunctions of one k-point, distributed over the processes of a pool
+        memory_mb = (
+            16e-6 * number_of_plane_waves * number_of_bands * _MEMORY_OVERHEAD
+        )
+        memory_per_core_mb = max_memory_per_machine_mb / mpiprocs_per_machine
+        procs_per_pool = max(
+            procs_per_pool, int(math.ceil(memory_mb / memory_per_core_mb))
+        )
+    procs_per_pool = min(max(1, procs_per_pool), max_cores)
+    # Small cells with many k-points could fill every core with pools: cap the processes by the total work instead
+    max_processes = int(
+        math.ceil(
+            number_of_plane_waves
+            * number_of_bands
+            * number_of_kpoints
+            / _WORK_PER_PROCESS
+        )
+    )
+    kpar = max(
+        1,
+        min(
+            number_of_kpoints,
+            max_cores // procs_per_pool,
+            max_processes // procs_per_pool,
+        ),
+    )
+    total = kpar * procs_per_pool
+
+    if total <= mpiprocs_per_machine:
+        num_machines = 1
+        num_mpiprocs_per_machine = total
+    else:
+        num_machines = min(
+            max_num_machines, int(math.ceil(total / mpiprocs_per_machine))
+        )
+        num_mpiprocs_per_machine = mpiprocs_per_machine
+        total = num_machines * num_mpiprocs_per_machine
+        # The pools must split the processes evenly
+        kpar = _largest_divisor(total, kpar)
+        procs_per_pool = total // kpar
+
+    # Extra processes per pool beyond what the plane waves need go to band groups
+    ideal_procs_per_pool = max(
+        1, int(math.ceil(number_of_plane_waves / _PLANE_WAVES_PER_PROCESS))
+    )
+    bndpar = _largest_divisor(
+        procs_per_pool,
+        min(
+            procs_per_pool // ideal_procs_per_pool,
+            number_of_bands // _BANDS_PER_GROUP,
+        ),
+    )
+
+    num_threads_per_mpiproc = max(
+        1,
+        min(
+            max_threads_per_mpiproc,
+            mpiprocs_per_machine // num_mpiprocs_per_machine,
+        ),
+    )
+
+    return {
+        "num_machines": num_machines,
+        "num_mpiprocs_per_machine": num_mpiprocs_per_machine,
+        "num_threads_per_mpiproc": num_threads_per_mpiproc,
+        "kpar": kpar,
+        "bndpar": bndpar,
+        "number_of_plane_waves": number_of_plane_waves,
+        "number_of_bands": number_of_bands,
+    }
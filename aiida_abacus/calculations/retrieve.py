@@ -0,0 +1,154 @@
+"""Retrieve profiles: which output files of a `BaseCalculation` are brought back from the remote working directory.
+
+Patterns are shell globs relative to the working directory. They are passed to AiiDA as `retrieve_list` items that
+keep the relative path of the matched files, or, when files have to be excluded or compressed, packed into a single
+archive by the job script after ABACUS finished. This module only depends on the standard library.
+"""
+
+import fnmatch
+import functools
+import re
+
+# Patterns of every profile, relative to the output subfolder of ABACUS
+RETRIEVE_PROFILES = {
+    "minimal": ("running_*.log", "warning.log"),
+    "analysis": (
+        "running_*.log",
+        "warning.log",
+        "MD_dump",
+        "STRU*",
+        "*.cif",
+        "BANDS_*",
+        "DOS*",
+        "istate.info",
+        "kpoints",
+        "Mulliken.txt",
+    ),
+    "full": ("*",),
+}
+DEFAULT_RETRIEVE_PROFILE = "full"
+
+# Only glob characters and the characters of plain relative paths, the patterns end up unquoted in the job script
+_PATTERN_REGEX = re.compile(r"^[\w.*?\[\]!/+-]+$")
+_MAGIC_CHARACTERS = re.compile(r"[*?\[]")
+# A bracket expression, or a single character of a pattern
+_PATTERN_TOKEN = re.compile(r"\[!?\]?[^\]]*\]|.")
+
+
+def validate_patterns(patterns, name):
+    """Validate a list of glob patterns given in the settings.
+
+    :param patterns: list of patterns relative to the working directory
+    :param name: the name of the setting, for the error message
+    :returns: the patterns as a list
+    :raises ValueError: if a pattern is not a plain relative path with glob characters
+    """
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    for pattern in patterns:
+        if (
+            not isinstance(pattern, str)
+            or not _PATTERN_REGEX.match(pattern)
+            or pattern.startswith("/")
+            or ".." in pattern.split("/")
+        ):
+            raise ValueError(
+                f"Invalid pattern {pattern!r} in `{name}`: only relative paths with glob characters are allowed."
+            )
+    return list(patterns)
+
+
+def get_profile_patterns(profile, output_subfolder):
+    """Return the patterns of a retrieve profile, relative to the working directory.
+
+    :raises ValueError: if the profile does not exist
+    """
+    try:
+        patterns = RETRIEVE_PROFILES[profile]
+    except KeyError:
+        raise ValueError(
+            f"Unknown retrieve profile {profile!r}, choose from {', '.join(RETRIEVE_PROFILES)}."
+        )
+    return [f"{output_subfolder}/{pattern}" for pattern in patterns]
+
+
+def is_excluded(path, exclude):
+    """Return whether a path or pattern is matched by any of the exclude patterns."""
+    return any(fnmatch.fnmatchcase(path, pattern) for pattern in exclude)
+
+
+def may_be_excluded(pattern, exclude):
+    """Return whether any file matched by a pattern may be matched by any of the exclude patterns.
+
+    Bracket expressions are taken to match any character, so the answer errs on the side of True.
+    """
+    return any(_patterns_intersect(pattern, other) for other in exclude)
+
+
+def _patterns_intersect(first, second):
+    """Return whether some path is matched by both glob patterns, with `*` also matching `/` as in `fnmatch`."""
+    first = tuple(_PATTERN_TOKEN.findall(first))
+    second = tuple(_PATTERN_TOKEN.findall(second))
+
+    @functools.lru_cache(maxsize=None)
+    def intersect(i, j):
+        if i == len(first) and j == len(second):
+            return True
+        if i < len(first) and first[i] == "*":
+            return intersect(i + 1, j) or (
+                j < len(second) and intersect(i, j + 1)
+            )
+        if j < len(second) and second[j] == "*":
+            return intersect(i, j + 1) or (
+                i < len(first) and intersect(i + 1, j)
+            )
+        if i == len(first) or j == len(second):
+            return False
+        if (
+            first[i] == second[j]
+            or len(first[i]) > 1
+            or len(second[j]) > 1
+            or "?" in (first[i], second[j])
+        ):
+            return intersect(i + 1, j + 1)
+        return False
+
+    return intersect(0, 0)
+
+
+def get_retrieve_item(pattern):
+    """Return the `retrieve_list` item of a pattern, that keeps the path of the matched files relative to the
+    working directory."""
+    depth = pattern.count("/") + 1
+    if depth == 1 and not _MAGIC_CHARACTERS.search(pattern):
+        return pattern
+    return (pattern, ".", depth)
+
+
+def get_archive_script(patterns, exclude, archive, compress):
+    """Return the bash lines that pack the files matched by `patterns`, except the excluded ones, into an archive.
+
+    Exclude patterns are passed to `tar`, anchored at the working directory and with `*` also matching `/` as in
+    `is_excluded`, so they also apply to the files inside the matched folders. No archive is written if no file
+    matches.
+
+    :param patterns: list of validated patterns
+    :param exclude: list of validated exclude patterns
+    :param archive: the filename of the archive
+    :param compress: whether to compress the archive with gzip
+    """
+    options = "".join(f" --exclude='{pattern}'" for pattern in exclude)
+    if options:
+        options = " --anchored --wildcards-match-slash" + options
+    lines = [
+        "shopt -s nullglob",
+        "ABACUS_RETRIEVE=()",
+        f"for f in {' '.join(patterns)}; do",
+        '    [ -e "$f" ] || continue',
+        '    ABACUS_RETRIEVE+=("$f")',
+        "done",
+        "shopt -u nullglob",
+        f"[ ${{#ABACUS_RETRIEVE[@]}} -eq 0 ] || tar -c{'z' if compress else ''}f '{archive}'{options} "
+        '"${ABACUS_RETRIEVE[@]}"',
+    ]
+    return "\n".join(lines)
@@ -0,0 +1,148 @@
+"""Array-based helpers to build the lattice and ATOMIC_POSITIONS cards of the ABACUS STRU file.
+
+The helpers work on plain numpy arrays so that the cost of writing large supercells is dominated by a single bulk
+formatting call per species instead of one `str.format` per site.
+
+ABACUS reads the cell vectors and the positions in units of `LATTICE_CONSTANT`, which is given in Bohr. The STRU file
+uses a lattice constant of one Angstrom and Cartesian positions, so that the cell and the positions of the structure
+are written in Angstrom as they are, and the parser reads them back with the same convention.
+"""
+
+import numpy as np
+
+from aiida_abacus.parsers.parse_raw import BOHR_TO_ANGSTROM
+
+_POSITION_LINE = "%18.10f %18.10f %18.10f   %d %d %d\n"
+# One Angstrom in Bohr
+LATTICE_CONSTANT = 1 / BOHR_TO_ANGSTROM
+POSITIONS_TYPE = "Cartesian"
+
+
+def get_site_arrays(structure):
+    """Pull the kind names and positions of all sites of a `StructureData` in one go.
+
+    The raw `sites` attribute is read directly, which avoids constructing a `Site` object for every atom.
+
+    :param structure: the `StructureData` node
+    :returns: tuple of a numpy array of kind names and a (N, 3) float64 array of cartesian positions
+    """
+    sites = structure.get_attribute("sites")
+    site_kind_names = np.array([site["kind_name"] for site in sites])
+    positions = np.array(
+        [site["position"] for site in sites], dtype=np.float64
+    ).reshape(-1, 3)
+    return site_kind_names, positions
+
+
+def get_site_symbols(structure, site_kind_names):
+    """Return the chemical symbol of every site, e.g. `Fe` for the sites of the kinds `Fe1` and `Fe2`.
+
+    :param structure: the `StructureData` node
+    :param site_kind_names: array with the kind name of every site, see `get_site_arrays`
+    :returns: a numpy array of chemical symbols, the kind name is kept for alloys
+    """
+    symbols = {
+        kind["name"]: (
+            kind["symbols"][0] if len(kind["symbols"]) == 1 else kind["name"]
+        )
+        for kind in structure.get_attribute("kinds")
+    }
+    return np.array([symbols[name] for name in site_kind_names])
+
+
+def group_sites_by_kind(site_kind_names):
+    """Group sites by kind, keeping the kinds in order of first appearance.
+
+    :param site_kind_names: array with the kind name of every site
+    :returns: tuple of the ordered kind names, the number of sites per kind and the stable permutation that sorts
+        the sites by kind. The i-th atom written to the STRU file is the site ``order[i]`` of the structure.
+    """
+    unique_names, first_index, kind_index, counts = np.unique(
+        site_kind_names,
+        return_index=True,
+        return_inverse=True,
+        return_counts=True,
+    )
+    # `np.unique` sorts alphabetically: renumber the kinds by their first appearance in the structure
+    appearance = np.argsort(first_index, kind="stable")
+    rank = np.empty_like(appearance)
+    rank[appearance] = np.arange(len(appearance))
+    order = np.argsort(rank[kind_index.ravel()], kind="stable")
+    return (
+        unique_names[appearance].tolist(),
+        counts[appearance].tolist(),
+        order,
+    )
+
+
+def validate_fixed_coords(fixed_coords, num_sites):
+    """Convert the `FIXED_COORDS` setting to a (N, 3) integer mask and validate it.
+
+    :param fixed_coords: nested list with three 0/1 flags per site, or None to let all atoms move
+    :param num_sites: the number of sites of the structure
+    :returns: a (N, 3) integer array
+    :raises ValueError: if the setting does not have the right shape or contains values other than 0 and 1
+    """
+    if fixed_coords is None:
+        return np.zeros((num_sites, 3), dtype=int)
+
+    if len(fixed_coords) != num_sites:
+        raise ValueError(
+            "Input structure contains {:d} sites, but "
+            "fixed_coords has length {:d}".format(num_sites, len(fixed_coords))
+        )
+
+    for i, this_atom_fix in enumerate(fixed_coords):
+        if len(this_atom_fix) != 3:
+            raise ValueError(f"fixed_coords({i + 1:d}) has not length three")
+
+    mask = np.array(fixed_coords).reshape(num_sites, 3)
+    invalid = np.flatnonzero(~np.isin(mask, (0, 1)).all(axis=1))
+    if invalid.size:
+        raise ValueError(
+            f"fixed_coords({invalid[0] + 1:d}) has non-(0, 1) elements"
+        )
+    return mask.astype(int)
+
+
+def format_lattice(cell):
+    """Return the LATTICE_CONSTANT and LATTICE_VECTORS cards of a cell.
+
+    :param cell: the cell vectors as rows, in Angstrom
+    :returns: the cards as a string
+    """
+    vectors = "".join("{0} {1} {2}\n".format(*vector) for vector in cell)
+    return f"LATTICE_CONSTANT\n{LATTICE_CONSTANT}\nLATTICE_VECTORS\n{vectors}"
+
+
+def format_atomic_positions(
+    site_kind_names, positions, fixed_coords, initial_magnetic_strings
+):
+    """Return the ATOMIC_POSITIONS card, one block per kind.
+
+    :param site_kind_names: array with the kind name of every site
+    :param positions: (N, 3) array of cartesian positions, in Angstrom
+    :param fixed_coords: (N, 3) integer array of 0/1 flags
+    :param initial_magnetic_strings: the formatted starting magnetization of each block, in order of appearance
+    :returns: the card as a string
+    """
+    kind_names, counts, order = group_sites_by_kind(site_kind_names)
+
+    # One contiguous row per atom: x y z fx fy fz, already sorted by kind
+    rows = np.empty((len(order), 6), dtype=np.float64)
+    rows[:, :3] = positions[order]
+    rows[:, 3:] = fixed_coords[order]
+    values = rows.ravel().tolist()
+
+    blocks = [f"ATOMIC_POSITIONS\n{POSITIONS_TYPE}\n"]
+    start = 0
+    for idx, (kind_name, count) in enumerate(zip(kind_names, counts)):
+        stop = start + count
+        positions_block = (_POSITION_LINE * count) % tuple(
+            values[6 * start : 6 * stop]
+        )
+        blocks.append(
+            f"{kind_name}\n{initial_magnetic_strings[idx]}\n{count}\n{positions_block}"
+        )
+        start = stop
+    return "".join(blocks)
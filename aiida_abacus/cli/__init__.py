@@ -1,30 +1,142 @@
 # -*- coding: utf-8 -*-
-# pylint: disable=wrong-import-position,wildcard-import
-"""Module for the command line interface."""
+"""Module for the command line interface.
+
+Only `click` is imported here. The subcommand modules, and with them AiiDA, ASE and the database environment, are
+loaded when the subcommand that needs them is invoked, so that `aiida-abacus --help` and the shell completion stay
+fast.
+"""
+import importlib
+import os
+
 import click
-import click_completion
 
-from aiida.cmdline.params import options, types
 
-# Activate the completion of parameter types provided by the click_completion package
-click_completion.init()
+class LazyGroup(click.Group):
+    """Group that imports its subcommands only when they are invoked.
+
+    :param lazy_subcommands: mapping of a subcommand name to a tuple of the `module:attribute` string of the command
+        object and its short help, which is shown by `--help` without importing the module
+    """
+
+    def __init__(self, *args, lazy_subcommands=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_subcommands = lazy_subcommands or {}
+
+    def list_commands(self, ctx):
+        return sorted(
+            set(super().list_commands(ctx)) | set(self.lazy_subcommands)
+        )
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name in self.lazy_subcommands and cmd_name not in self.commands:
+            path, _ = self.lazy_subcommands[cmd_name]
+            module_name, attribute = path.split(":")
+            command = getattr(importlib.import_module(module_name), attribute)
+            self.add_command(command, cmd_name)
+        return super().get_command(ctx, cmd_name)
+
+    def format_commands(self, ctx, formatter):
+        rows = []
+        for cmd_name in self.list_commands(ctx):
+            if cmd_name in self.commands:
+                command = self.commands[cmd_name]
+                if command.hidden:
+                    continue
+                rows.append((cmd_name, command.get_short_help_str()))
+            else:
+                rows.append((cmd_name, self.lazy_subcommands[cmd_name][1]))
+        if rows:
+            with formatter.section("Commands"):
+                formatter.write_dl(rows)
+
+
+class ProfileNameParamType(click.ParamType):
+    """The name of a configured AiiDA profile, like a `click.Choice` whose choices are only read when it is given."""
+
+    name = "profile"
+
+    def convert(self, value, param, ctx):
+        from aiida.manage.configuration import get_config
+
+        profile_names = get_config().profile_names
+        if value not in profile_names:
+            self.fail(
+                f"{value!r} is not one of the configured profiles: {', '.join(sorted(profile_names))}.",
+                param,
+                ctx,
+            )
+        return value
+
+
+def _load_profile(ctx, param, value):  # pylint: disable=unused-argument
+    """Load the requested AiiDA profile, importing `aiida` only if a profile was given."""
+    if value is not None:
+        from aiida.manage.configuration import load_profile
+
+        load_profile(value)
+    return value
+
+
+# Activate the completion of parameter types provided by the click_completion package, only when completing
+if "_AIIDA_ABACUS_COMPLETE" in os.environ:
+    import click_completion
+
+    click_completion.init()
 
 
 @click.group(
     "aiida-abacus",
+    cls=LazyGroup,
+    lazy_subcommands={
+        "cache-report": (
+            "aiida_abacus.cli.caching:cmd_cache_report",
+            "Report the cache hit rate of the calculations of a group.",
+        ),
+        "pseudo-cache": (
+            "aiida_abacus.cli.pseudo_cache:cmd_pseudo_cache",
+            "Manage the pseudopotential cache on remote computers.",
+        ),
+        "profile": (
+            "aiida_abacus.cli.timing:cmd_profile",
+            "Aggregate the stage timings of a process tree or a group.",
+        ),
+    },
     context_settings={"help_option_names": ["-h", "--help"]},
 )
-@options.PROFILE(type=types.ProfileParamType(load_profile=True))
-def cmd_root(profile):  # pylint: disable=unused-argument
-    """CLI for the `aiida-shengbte` plugin."""
+@click.option(
+    "-p",
+    "--profile",
+    type=ProfileNameParamType(),
+    callback=_load_profile,
+    expose_value=False,
+    help="Execute the command for this profile instead of the default profile.",
+)
+def cmd_root():
+    """CLI for the `aiida-abacus` plugin."""
 
 
-@cmd_root.group("launch")
+@cmd_root.group(
+    "launch",
+    cls=LazyGroup,
+    lazy_subcommands={
+        "relax": (
+            "aiida_abacus.cli.workflows:launch_relax",
+            "Launch a relax workchain for a single structure.",
+        ),
+        "relax-batch": (
+            "aiida_abacus.cli.workflows:launch_relax_batch",
+            "Submit one relax workchain for every structure in SOURCE.",
+        ),
+    },
+)
 def cmd_launch():
     """Commands to launch and interact with jobs."""
 
 
-# from .calculations import cmd_calculation
-# from .workflows import cmd_workflow
-from .data import data_cli
-from .workflows import launch_relax
+def __getattr__(name):
+    """Keep `from aiida_abacus.cli import data_cli` working without importing the `verdi data` commands eagerly."""
+    if name == "data_cli":
+        from .data import data_cli
+
+        return data_cli
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""Command to report how often the calculations of a group were taken from the cache of AiiDA."""
+import click
+
+from aiida.cmdline.params import arguments
+from aiida.cmdline.utils import decorators, echo
+
+
+@click.command("cache-report")
+@arguments.GROUP()
+@decorators.with_dbenv()
+def cmd_cache_report(group):
+    """Report the cache hit rate of the calculations in GROUP and in the workflows of GROUP.
+
+    Caching must be enabled for the calculations, e.g. with `verdi config caching.enabled_for
+    aiida.calculations:abacus.base`. Calculations that ran although an identical one had run before are counted as
+    missed reuse.
+    """
+    from aiida import orm
+
+    from aiida_abacus.cli.utils.processes import get_process_tree_pks
+
+    pks = get_process_tree_pks(group.nodes)
+    if not pks:
+        echo.echo_critical(f"No processes found in group {group.label}.")
+
+    query = orm.QueryBuilder()
+    query.append(
+        orm.CalcJobNode,
+        filters={
+            "id": {"in": list(pks)},
+            "process_type": "aiida.calculations:abacus.base",
+        },
+        project=["extras._aiida_cached_from", "extras._aiida_hash"],
+    )
+    query.order_by({orm.CalcJobNode: "id"})
+    rows = query.all()
+    if not rows:
+        echo.echo_critical(f"No BaseCalculation found in group {group.label}.")
+
+    sources = [source for source, _ in rows if source]
+    seen = set()
+    missed = 0
+    for source, node_hash in rows:
+        if not source and node_hash in seen:
+            missed += 1
+        seen.add(node_hash)
+
+    # Node-hours of the calculations that the cache hits did not have to run again
+    saved = 0.0
+    if sources:
+        query = orm.QueryBuilder()
+        query.append(
+            orm.CalcJobNode,
+            filters={"uuid": {"in": sorted(set(sources))}},
+            project=["uuid", "attributes.resources"],
+            tag="calculation",
+        )
+        query.append(
+            orm.Dict,
+            with_incoming="calculation",
+            edge_filters={"label": "output_parameters"},
+            project=["attributes.wall_time_seconds"],
+        )
+        hours = {
+            uuid: (wall_time or 0.0)
+            * (resources or {}).get("num_machines", 1)
+            / 3600
+            for uuid, resources, wall_time in query.iterall()
+        }
+        saved = sum(hours.get(source, 0.0) for source in sources)
+
+    echo.echo(f"Calculations: {len(rows)}")
+    echo.echo(f"Cache hits: {len(sources)} ({len(sources) / len(rows):.1%})")
+    echo.echo(f"Missed reuse: {missed}")
+    echo.echo(f"Node-hours saved: {saved:.2f}")
@@ -5,6 +5,9 @@ Command line interface (cli) for aiida_abacus.
 Register new commands either via the "console_scripts" entry point or plug them
 directly into the 'verdi' command by using AiiDA-specific entry points like
 "aiida.cmdline.data" (both in the setup.json file).
+
+Only the modules of `verdi` itself are imported here: the data class is imported
+directly, instead of through the entry points, when a command runs.
 """
 
 import sys
@@ -13,9 +16,6 @@ import json
 from aiida.cmdline.utils import decorators
 from aiida.cmdline.commands.cmd_data import verdi_data
 from aiida.cmdline.params.types import DataParamType
-from aiida.orm import QueryBuilder
-from aiida.plugins import DataFactory
-from sqlalchemy.sql.functions import user
 
 
 # See aiida.cmdline.data entry point in setup.json
@@ -30,7 +30,9 @@ def list_():  # pylint: disable=redefined-builtin
     """
     Display all AbacusParameters nodes
     """
-    AbacusParameters = DataFactory("abacus")
+    from aiida.orm import QueryBuilder
+
+    from aiida_abacus.data.parameters import AbacusParameters
 
     qb = QueryBuilder()
     qb.append(AbacusParameters)
@@ -52,7 +54,9 @@ def show(identifier):  # pylint: disable=redefined-builtin
     """
     Display details of a AbacusParameters node with name or id
     """
-    AbacusParameters = DataFactory("abacus")
+    from aiida.orm import QueryBuilder
+
+    from aiida_abacus.data.parameters import AbacusParameters
     try:
         identifier = int(identifier)
     except Exception as err:
@@ -87,9 +91,10 @@ def add(json_file, name, username):  # pylint: disable=redefined-builtin
     """
     Add new parameters from a json file.
     """
+    from aiida_abacus.data.parameters import AbacusParameters
+
     with open(json_file, "r") as f:
         params = json.loads(f.read())
-    AbacusParameters = DataFactory("abacus")
     new_params = AbacusParameters(name=name, username=username, dict=params)
     new_params.store()
 
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""Commands to manage the content-addressed pseudopotential cache on remote computers."""
+import click
+
+from aiida.cmdline.params import arguments
+from aiida.cmdline.utils import decorators, echo
+
+
+@click.group("pseudo-cache")
+def cmd_pseudo_cache():
+    """Manage the pseudopotential cache on remote computers.
+
+    Calculations use the cache when their `settings` contain `PSEUDO_CACHE: True` (symlink the cached files) or
+    `PSEUDO_CACHE: "copy"` (copy them). Stage the pseudos before submitting: the job script checks the files it links
+    and stops before ABACUS runs if one is missing, after which the `BaseWorkChain` uploads them with the calculation.
+    """
+
+
+@cmd_pseudo_cache.command("setup")
+@arguments.COMPUTER()
+@click.argument("DIRECTORY", type=click.STRING)
+@decorators.with_dbenv()
+def setup_cache(computer, directory):
+    """Use the absolute remote DIRECTORY as the pseudo cache of COMPUTER."""
+    import os
+
+    from aiida_abacus.utils import pseudo_cache
+
+    if not os.path.isabs(directory):
+        echo.echo_critical("The cache directory must be an absolute path.")
+    pseudo_cache.set_cache(computer, directory)
+    echo.echo_success(
+        f"Pseudo cache of computer {computer.label} set to {directory}"
+    )
+
+
+@cmd_pseudo_cache.command("stage")
+@arguments.COMPUTER()
+@click.argument("FAMILY", type=click.STRING)
+@decorators.with_dbenv()
+def stage(computer, family):
+    """Upload the pseudos of the group FAMILY that are not in the cache of COMPUTER yet."""
+    from aiida import orm
+
+    from aiida_abacus.utils import pseudo_cache
+
+    try:
+        uploaded = pseudo_cache.stage_pseudos(
+            computer, orm.load_group(family).nodes
+        )
+    except ValueError as exception:
+        echo.echo_critical(str(exception))
+    echo.echo_success(
+        f"Uploaded {len(uploaded)} pseudos to the cache of computer {computer.label}"
+    )
+
+
+@cmd_pseudo_cache.command("status")
+@arguments.COMPUTER()
+@decorators.with_dbenv()
+def status(computer):
+    """Report the location, number of files and size of the cache of COMPUTER."""
+    from aiida_abacus.utils import pseudo_cache
+
+    cache = pseudo_cache.get_cache(computer)
+    if cache is None:
+        echo.echo_critical(
+            f"The pseudo cache is not set up for computer {computer.label}."
+        )
+    number_of_files, size = pseudo_cache.get_cache_size(computer)
+    echo.echo(f"Directory: {cache['directory']}")
+    echo.echo(f"Files: {number_of_files}")
+    echo.echo(f"Size: {size / 1024 ** 2:.2f} MB")
+
+
+@cmd_pseudo_cache.command("prune")
+@arguments.COMPUTER()
+@click.option(
+    "--all",
+    "prune_all",
+    is_flag=True,
+    default=False,
+    help="Remove all files, not only those of pseudos that are no longer in the database.",
+)
+@decorators.with_dbenv()
+def prune(computer, prune_all):
+    """Remove unused files from the cache of COMPUTER and report the freed space."""
+    from aiida_abacus.utils import pseudo_cache
+
+    try:
+        removed, freed = pseudo_cache.prune_cache(
+            computer, keep=() if prune_all else None
+        )
+    except ValueError as exception:
+        echo.echo_critical(str(exception))
+    echo.echo_success(
+        f"Removed {removed} files ({freed / 1024 ** 2:.2f} MB) from the cache of computer {computer.label}"
+    )
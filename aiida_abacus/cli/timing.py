@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""Command to aggregate the stage timings recorded in the extras of the processes."""
+import click
+
+from aiida.cmdline.params import arguments, options
+from aiida.cmdline.utils import decorators, echo
+
+
+@click.command("profile")
+@arguments.PROCESS(required=False)
+@options.GROUP(
+    help="Aggregate the processes of this group and their descendants."
+)
+@decorators.with_dbenv()
+def cmd_profile(process, group):
+    """Aggregate the stage timings of PROCESS and its descendants, or of a group.
+
+    Timings are only recorded when the environment variable `AIIDA_ABACUS_TIMING` was set for the daemon.
+    """
+    from aiida import orm
+
+    from aiida_abacus.cli.utils.processes import get_process_tree_pks
+    from aiida_abacus.utils import timing
+
+    if (process is None) == (group is None):
+        echo.echo_critical("Give either a PROCESS or a group.")
+
+    pks = get_process_tree_pks(
+        [process] if process is not None else group.nodes
+    )
+    if not pks:
+        echo.echo_critical("No processes found.")
+
+    query = orm.QueryBuilder()
+    query.append(
+        orm.ProcessNode,
+        filters={"id": {"in": list(pks)}},
+        project=[f"extras.{timing.TIMING_EXTRA}"],
+    )
+    timings = [extra for (extra,) in query.iterall() if extra]
+    if not timings:
+        echo.echo_critical(
+            f"None of the {len(pks)} processes has timings: set `{timing.TIMING_ENVIRONMENT_VARIABLE}` before "
+            "`verdi daemon start`."
+        )
+
+    stages, categories = timing.aggregate_timings(timings)
+    echo.echo(
+        f"Timed processes: {len(timings)} of {len(pks)}\n\n"
+        f"{'stage':24s} {'category':10s} {'count':>7s} {'total (s)':>12s} {'mean (s)':>10s} {'max (s)':>10s}"
+    )
+    for stage, (count, total, maximum) in sorted(
+        stages.items(), key=lambda item: -item[1][1]
+    ):
+        category = timing.STAGE_CATEGORIES.get(stage, "-")
+        echo.echo(
+            f"{stage:24s} {category:10s} {count:7d} {total:12.2f} {total / count:10.3f} {maximum:10.2f}"
+        )
+
+    overall = sum(categories.values()) or 1.0
+    echo.echo(f"\n{'category':10s} {'total (s)':>12s} {'share':>7s}")
+    for category, total in categories.items():
+        echo.echo(f"{category:10s} {total:12.2f} {total / overall:7.1%}")
@@ -1,5 +1,11 @@
 # -*- coding: utf-8 -*-
 """Module with launch utitlies for the CLI."""
+
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 from aiida import orm
 from aiida.common.exceptions import NotExistent
 import click
@@ -7,12 +13,18 @@ import click
 from .display import echo_process_results
 
 
+def get_or_create_group(group_name):
+    """Return the group with the given label, creating it if it does not exist yet."""
+    group, _ = orm.Group.objects.get_or_create(label=group_name)
+    return group
+
+
 def add_to_group(node, group_name):
     if group_name is not None:
         try:
             g = orm.Group.get(label=group_name)
             group_statistics = "that already contains {} nodes".format(
-                len(g.nodes)
+                g.count()
             )
         except NotExistent:
             g = orm.Group(label=group_name)
@@ -55,3 +67,175 @@ def launch_process(process, daemon, **inputs):
         _, node = launch.run_get_node(process, **inputs)
         echo_process_results(node)
     add_to_group(node, process_name)
+    return node
+
+
+def _read_atoms(filename):
+    """Read a structure file with ASE, in a worker process of the pool."""
+    from ase.io import read
+
+    return filename, read(filename)
+
+
+def read_structures(source, processes=None):
+    """Read the structures of a directory, a glob pattern or an ASE database.
+
+    Structure files are parsed in parallel in a pool of worker processes. Nothing is stored in the database.
+
+    :param source: a directory, a glob pattern or the path of an ASE database (`.db`)
+    :param processes: number of worker processes, defaults to the number of CPUs
+    :returns: list of tuples of a label and an unstored `StructureData`
+    """
+    if os.path.isfile(source) and source.endswith(".db"):
+        from ase.db import connect
+
+        return [
+            (f"{source}@{row.id}", orm.StructureData(ase=row.toatoms()))
+            for row in connect(source).select()
+        ]
+
+    if os.path.isdir(source):
+        filenames = [
+            os.path.join(source, filename)
+            for filename in sorted(os.listdir(source))
+            if os.path.isfile(os.path.join(source, filename))
+        ]
+    else:
+        filenames = sorted(glob.glob(source))
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return [
+            (filename, orm.StructureData(ase=atoms))
+            for filename, atoms in executor.map(
+                _read_atoms, filenames, chunksize=16
+            )
+        ]
+
+
+def skip_relaxed_structures(structures):
+    """Remove the structures that were already relaxed successfully, or that repeat an earlier structure of the list.
+
+    Structures are compared by their fingerprints, see `aiida_abacus.utils.fingerprint`. The stored fingerprints of
+    the formulas of the list are loaded with one query, and the relax workchains of the duplicates with another.
+
+    :param structures: list of tuples of a label and a `StructureData`
+    :returns: tuple of the list of the remaining structures, the list of their fingerprints and a mapping of the
+        labels of the skipped structures that were already relaxed onto the node of their relax workchain
+    """
+    from aiida_abacus.utils.fingerprint import (
+        FingerprintIndex,
+        get_completed_relaxations,
+        get_structure_fingerprint,
+    )
+
+    fingerprints = [
+        get_structure_fingerprint(structure) for _, structure in structures
+    ]
+    index = FingerprintIndex.load(
+        formulas=[fingerprint["formula"] for fingerprint in fingerprints]
+    )
+    duplicates = [index.find_all(fingerprint) for fingerprint in fingerprints]
+    completed = get_completed_relaxations(
+        {pk for pks in duplicates for pk in pks}
+    )
+
+    remaining = []
+    remaining_fingerprints = []
+    relaxed = {}
+    batch = FingerprintIndex()
+    for (label, structure), fingerprint, pks in zip(
+        structures, fingerprints, duplicates
+    ):
+        workchains = [completed[pk] for pk in pks if pk in completed]
+        if workchains:
+            relaxed[label] = workchains[-1]
+            click.echo(
+                f"Skipped {label}: already relaxed by {workchains[-1].process_label}<{workchains[-1].pk}>"
+            )
+            continue
+        position = batch.find(fingerprint)
+        if position is not None:
+            click.echo(
+                f"Skipped {label}: duplicate of {remaining[position][0]}"
+            )
+            continue
+        batch.add(len(remaining), fingerprint)
+        remaining.append((label, structure))
+        remaining_fingerprints.append(fingerprint)
+    return remaining, remaining_fingerprints, relaxed
+
+
+def count_active(pks):
+    """Return how many of the processes with the given pks have not terminated yet, with a single query."""
+    if not pks:
+        return 0
+    qb = orm.QueryBuilder()
+    qb.append(
+        orm.ProcessNode,
+        filters={
+            "id": {"in": pks},
+            "attributes.process_state": {
+                "in": ["created", "waiting", "running"]
+            },
+        },
+        project="id",
+    )
+    return qb.count()
+
+
+def submit_batch(
+    process,
+    structures,
+    inputs,
+    group_name=None,
+    max_rate=None,
+    max_active=None,
+    poll_interval=5.0,
+):
+    """Submit one process per structure to the daemon, sharing all other inputs.
+
+    :param process: the process class
+    :param structures: list of tuples of a label and a `StructureData`
+    :param inputs: the inputs shared by all processes, without the `structure`
+    :param group_name: label of the group to which the processes are added with a single call at the end, also if
+        the batch is interrupted, so that the group holds all submitted processes
+    :param max_rate: maximum number of submissions per second
+    :param max_active: maximum number of submitted processes that are not terminated yet
+    :param poll_interval: seconds to wait before checking again how many processes are still active
+    :returns: list of the submitted process nodes
+    """
+    from aiida.engine import launch
+
+    nodes = []
+    group = get_or_create_group(group_name) if group_name is not None else None
+    min_interval = 1.0 / max_rate if max_rate else 0.0
+    last_submission = 0.0
+    start = time.perf_counter()
+
+    try:
+        for label, structure in structures:
+            if max_active:
+                while count_active([node.pk for node in nodes]) >= max_active:
+                    time.sleep(poll_interval)
+
+            wait = last_submission + min_interval - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            last_submission = time.perf_counter()
+
+            node = launch.submit(process, structure=structure, **inputs)
+            click.echo(f"Submitted {process.__name__}<{node.pk}> for {label}")
+            nodes.append(node)
+    finally:
+        if group is not None and nodes:
+            group.add_nodes(nodes)
+            click.echo(f"Added {len(nodes)} nodes to the group {group_name}")
+
+    elapsed = time.perf_counter() - start
+    if nodes:
+        click.echo(
+            f"Submitted {len(nodes)} processes in {elapsed:.1f} s "
+            f"({len(nodes) / max(elapsed, 1e-9):.2f} submissions/s)"
+        )
+
+    return nodes
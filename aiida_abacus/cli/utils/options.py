@@ -1,8 +1,6 @@
 # -*- coding: utf-8 -*-
 """Pre-defined overridable options for commonly used command line interface parameters."""
 from aiida import orm
-from aiida_abacus.utils import read_structure
-from ase.atoms import default
 import click
 
 from aiida.cmdline.params import types
@@ -21,6 +19,8 @@ class StructureParamType(click.ParamType):
             if isinstance(value, orm.StructureData):
                 return value
             else:
+                from aiida_abacus.utils import read_structure
+
                 return read_structure(value)
         except Exception:
             self.fail(
@@ -129,14 +129,23 @@ DAEMON = OverridableOption(
     help="Submit the process to the daemon instead of running it locally.",
 )
 
-# AUTOMATIC_PARALLELIZATION = OverridableOption(
-#     "-a",
-#     "--automatic-parallelization",
-#     is_flag=True,
-#     default=False,
-#     show_default=True,
-#     help="Enable the automatic parallelization option of the workchain.",
-# )
+AUTOMATIC_PARALLELIZATION = OverridableOption(
+    "-a",
+    "--automatic-parallelization",
+    is_flag=True,
+    default=False,
+    show_default=True,
+    help="Estimate the resources of every calculation from its size. The number of machines and processes per machine "
+    "become upper limits.",
+)
+
+MAX_THREADS_PER_MPIPROC = OverridableOption(
+    "--max-threads-per-mpiproc",
+    type=click.INT,
+    default=1,
+    show_default=True,
+    help="The maximum number of OpenMP threads per MPI process with automatic parallelization.",
+)
 
 CLEAN_WORKDIR = OverridableOption(
     "-x",
@@ -241,3 +250,49 @@ RUN_RELAX = OverridableOption(
     is_flag=True,
     help="Whether to run relax before scf.",
 )
+GROUP_NAME = OverridableOption(
+    "-G",
+    "--group-name",
+    default="RealxWorkChain",
+    show_default=True,
+    help="Label of the group to which all submitted processes are added.",
+)
+PROCESSES = OverridableOption(
+    "-j",
+    "--processes",
+    type=click.INT,
+    default=None,
+    help="Number of worker processes used to parse the structure files. Defaults to the number of CPUs.",
+)
+MAX_RATE = OverridableOption(
+    "--max-rate",
+    type=click.FLOAT,
+    default=None,
+    help="Maximum number of submissions per second.",
+)
+MAX_ACTIVE = OverridableOption(
+    "--max-active",
+    type=click.INT,
+    default=None,
+    help="Maximum number of submitted processes that are not terminated yet. Submission waits for free slots.",
+)
+BATCH_WORKCHAIN = OverridableOption(
+    "-B",
+    "--batch-workchain",
+    is_flag=True,
+    default=False,
+    help="Submit a single `abacus.relax.batch` workchain for all structures instead of one workchain each.",
+)
+MAX_CONCURRENT = OverridableOption(
+    "--max-concurrent",
+    type=click.INT,
+    default=10,
+    show_default=True,
+    help="The maximum number of calculations running at the same time in the `abacus.relax.batch` workchain.",
+)
+DEDUPLICATE = OverridableOption(
+    "--deduplicate/--no-deduplicate",
+    default=True,
+    show_default=True,
+    help="Skip the structures that are duplicates, within numerical noise, of structures relaxed successfully before.",
+)
@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+"""Utility functions to select the processes that the report commands aggregate."""
+from aiida import orm
+
+
+def get_process_tree_pks(roots):
+    """Return the pks of the process nodes among `roots` and of all the processes they called, at any depth."""
+    pks = set()
+    for root in roots:
+        if isinstance(root, orm.ProcessNode):
+            pks.add(root.pk)
+            pks.update(node.pk for node in root.called_descendants)
+    return pks
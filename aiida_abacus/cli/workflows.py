@@ -1,10 +1,14 @@
+import click
+
 from . import cmd_launch
 from aiida import orm
 from aiida.cmdline.utils import decorators
 from aiida.cmdline.params import options as options_core
 from aiida.plugins import WorkflowFactory
+from aiida_abacus.data.parameters import AbacusParameters
 from .utils import options
 from .utils import launch
+from .utils.display import echo_process_results
 
 
 @cmd_launch.command("relax")
@@ -16,8 +20,11 @@ from .utils import launch
 @options_core.CODE()
 @options.MAX_NUM_MACHINES()
 @options.NUM_MPIPROCS_PER_MACHINE()
+@options.AUTOMATIC_PARALLELIZATION()
+@options.MAX_THREADS_PER_MPIPROC()
 @options.DAEMON()
 @options.CLEAN_WORKDIR()
+@options.DEDUPLICATE()
 @decorators.with_dbenv()
 def launch_relax(
     structure,
@@ -28,39 +35,198 @@ def launch_relax(
     code,
     max_num_machines,
     num_mpiprocs_per_machine,
+    automatic_parallelization,
+    max_threads_per_mpiproc,
     daemon,
     clean_workdir,
+    deduplicate,
+):
+    """Launch a relax workchain for a single structure."""
+    from aiida_abacus.utils.fingerprint import store_fingerprint
+
+    fingerprint = None
+    if deduplicate:
+        label = structure.get_formula()
+        remaining, fingerprints, relaxed = launch.skip_relaxed_structures(
+            [(label, structure)]
+        )
+        if not remaining:
+            if label in relaxed:
+                echo_process_results(relaxed[label])
+            return
+        (fingerprint,) = fingerprints
+
+    node = launch.launch_process(
+        WorkflowFactory("abacus.relax"),
+        daemon,
+        structure=structure,
+        **get_relax_inputs(
+            parameters_name,
+            parameters,
+            pseudo_family,
+            system_2d,
+            code,
+            max_num_machines,
+            num_mpiprocs_per_machine,
+            automatic_parallelization,
+            max_threads_per_mpiproc,
+            clean_workdir,
+        ),
+    )
+    store_fingerprint(node.inputs.structure, fingerprint)
+
+
+@cmd_launch.command("relax-batch")
+@click.argument("SOURCE", type=click.STRING)
+@options.PARAMETERS_NAME()
+@options.PARAMETERS()
+@options.PSEUDO_FAMILY()
+@options.SYSTEM_2D()
+@options_core.CODE()
+@options.MAX_NUM_MACHINES()
+@options.NUM_MPIPROCS_PER_MACHINE()
+@options.AUTOMATIC_PARALLELIZATION()
+@options.MAX_THREADS_PER_MPIPROC()
+@options.CLEAN_WORKDIR()
+@options.GROUP_NAME()
+@options.PROCESSES()
+@options.MAX_RATE()
+@options.MAX_ACTIVE()
+@options.BATCH_WORKCHAIN()
+@options.MAX_CONCURRENT()
+@options.DEDUPLICATE()
+@decorators.with_dbenv()
+def launch_relax_batch(
+    source,
+    parameters_name,
+    parameters,
+    pseudo_family,
+    system_2d,
+    code,
+    max_num_machines,
+    num_mpiprocs_per_machine,
+    automatic_parallelization,
+    max_threads_per_mpiproc,
+    clean_workdir,
+    group_name,
+    processes,
+    max_rate,
+    max_active,
+    batch_workchain,
+    max_concurrent,
+    deduplicate,
 ):
+    """Submit one relax workchain for every structure in SOURCE to the daemon.
+
+    SOURCE is a directory, a glob pattern (quote it) or an ASE database file. With --batch-workchain a single
+    `abacus.relax.batch` workchain relaxes all structures instead.
+    """
+    from aiida_abacus.utils.fingerprint import store_fingerprint
+
+    structures = launch.read_structures(source, processes=processes)
+    click.echo(f"Read {len(structures)} structures from {source}")
+    fingerprints = [None] * len(structures)
+    if deduplicate:
+        structures, fingerprints, _ = launch.skip_relaxed_structures(
+            structures
+        )
+    if not structures:
+        return
+
+    inputs = get_relax_inputs(
+        parameters_name,
+        parameters,
+        pseudo_family,
+        system_2d,
+        code,
+        max_num_machines,
+        num_mpiprocs_per_machine,
+        automatic_parallelization,
+        max_threads_per_mpiproc,
+        clean_workdir,
+    )
+    if batch_workchain:
+        inputs["structures"] = {
+            f"structure_{index}": structure
+            for index, (_, structure) in enumerate(structures)
+        }
+        inputs["max_concurrent"] = orm.Int(max_concurrent)
+        node = launch.launch_process(
+            WorkflowFactory("abacus.relax.batch"), True, **inputs
+        )
+        if group_name is not None:
+            launch.get_or_create_group(group_name).add_nodes(node)
+            click.echo(f"Added the node to the group {group_name}")
+    else:
+        # Store the shared inputs once instead of once per submission
+        for key, value in inputs.items():
+            if isinstance(value, orm.Data):
+                value.store()
+
+        launch.submit_batch(
+            WorkflowFactory("abacus.relax"),
+            structures,
+            inputs,
+            group_name=group_name,
+            max_rate=max_rate,
+            max_active=max_active,
+        )
+
+    # The structures were stored by the submission, later launches find them in the index
+    for (_, structure), fingerprint in zip(structures, fingerprints):
+        store_fingerprint(structure, fingerprint)
+
+
+def get_relax_inputs(
+    parameters_name,
+    parameters,
+    pseudo_family,
+    system_2d,
+    code,
+    max_num_machines,
+    num_mpiprocs_per_machine,
+    automatic_parallelization,
+    max_threads_per_mpiproc,
+    clean_workdir,
+):
+    """Return the inputs of the relax workchain for the given command line options, except the structure."""
     parameters_dict = {}
     for t in parameters:
         parameters_dict[t[0]] = t[1]
 
-    launch.launch_process(
-        WorkflowFactory("abacus.relax"),
-        daemon,
-        **{
-            "structure": structure,
-            "parameters_name": orm.Str(parameters_name),
-            "parameters": orm.Dict(dict=parameters_dict),
-            "pseudo_family": orm.Str(pseudo_family),
-            "system_2d": orm.Bool(system_2d),
-            "clean_workdir": orm.Bool(clean_workdir),
-            "base": {
-                "code": code,
-                "metadata": {
-                    "options": {
-                        "resources": {
-                            "num_machines": int(max_num_machines),
-                            "num_mpiprocs_per_machine": int(
-                                num_mpiprocs_per_machine
-                            ),
-                        },
-                        "withmpi": True,
+    # Fail early on an unknown name, this also warms up the lookup cache
+    AbacusParameters.resolve_many([parameters_name])
+
+    inputs = {
+        "parameters_name": orm.Str(parameters_name),
+        "parameters": orm.Dict(dict=parameters_dict),
+        "pseudo_family": orm.Str(pseudo_family),
+        "system_2d": orm.Bool(system_2d),
+        "clean_workdir": orm.Bool(clean_workdir),
+        "base": {
+            "code": code,
+            "metadata": {
+                "options": {
+                    "resources": {
+                        "num_machines": int(max_num_machines),
+                        "num_mpiprocs_per_machine": int(
+                            num_mpiprocs_per_machine
+                        ),
                     },
+                    "withmpi": True,
                 },
             },
-            "metadata": {
-                "description": "Relax job submission with the aiida_abacus plugin",
-            },
-        }
-    )
+        },
+        "metadata": {
+            "description": "Relax job submission with the aiida_abacus plugin",
+        },
+    }
+    if automatic_parallelization:
+        inputs["automatic_parallelization"] = orm.Dict(
+            dict={
+                "max_num_machines": int(max_num_machines),
+                "max_mpiprocs_per_machine": int(num_mpiprocs_per_machine),
+                "max_threads_per_mpiproc": int(max_threads_per_mpiproc),
+            }
+        )
+    return inputs
@@ -7,11 +7,20 @@ Register data types via the "aiida.data" entry point in setup.json.
 
 # You can directly use or subclass aiida.orm.data.Data
 # or any other data type listed under 'verdi data'
+import copy
+
 from aiida.orm import Dict
-from aiida.common.exceptions import UniquenessError, NotExistent
+from aiida.common.exceptions import (
+    MultipleObjectsError,
+    UniquenessError,
+    NotExistent,
+)
 
 from aiida.orm.querybuilder import QueryBuilder
 
+# Process-local cache of resolved parameters: name -> (pk, mtime, attributes)
+_CACHE = {}
+
 
 class AbacusParameters(Dict):
     """
@@ -51,11 +60,14 @@ class AbacusParameters(Dict):
         :returns: validated dictionary
         """
 
+        # The cache cannot tell whether the node was deleted or renamed since, so the database decides
         qb = QueryBuilder()
-        count = qb.append(
-            AbacusParameters, filters={"extras.name": name}
-        ).count()
-        if count > 0:
+        qb.append(
+            AbacusParameters, filters={"extras.name": name}, project="id"
+        )
+        if qb.limit(1).first() is None:
+            _CACHE.pop(name, None)
+        else:
             raise UniquenessError(
                 "Name {} parameters already exists.".format(name)
             )
@@ -63,6 +75,81 @@ class AbacusParameters(Dict):
         # TODO: validate keys
         return parameters_dict
 
+    @classmethod
+    def resolve(cls, name):
+        """Return the pk and a copy of the attributes of the parameters with the given name.
+
+        :param name: the name of the parameters, stored in the `name` extra
+        :returns: tuple of pk and attributes dictionary
+        :raises NotExistent: if no parameters with that name exist
+        :raises MultipleObjectsError: if more than one parameters have that name
+        """
+        return cls.resolve_many([name])[name]
+
+    @classmethod
+    def resolve_many(cls, names):
+        """Resolve many parameters by name with at most two queries.
+
+        Resolved parameters are cached in the current process. A cached entry is reused as long as its node still
+        has the same name and modification time, which is checked with a single query on the primary keys of all
+        cached entries. The remaining names are then fetched together with a single query.
+
+        :param names: iterable of names of parameters, stored in the `name` extra
+        :returns: dictionary mapping each name onto a tuple of pk and a copy of the attributes
+        :raises NotExistent: if no parameters exist for one of the names
+        :raises MultipleObjectsError: if more than one parameters share one of the names
+        """
+        names = set(names)
+
+        cached = {name: _CACHE[name] for name in names if name in _CACHE}
+        if cached:
+            qb = QueryBuilder()
+            qb.append(
+                cls,
+                filters={"id": {"in": [pk for pk, _, _ in cached.values()]}},
+                project=["id", "mtime", "extras.name"],
+            )
+            # Changing the extras does not update the modification time, so the name is compared as well
+            current = {pk: (mtime, label) for pk, mtime, label in qb.all()}
+            for name, (pk, mtime, _) in cached.items():
+                if current.get(pk) != (mtime, name):
+                    _CACHE.pop(name, None)
+
+        missing = [name for name in names if name not in _CACHE]
+        if missing:
+            qb = QueryBuilder()
+            qb.append(
+                cls,
+                filters={"extras.name": {"in": missing}},
+                project=["extras.name", "id", "mtime", "attributes"],
+            )
+            matches = {}
+            for name, pk, mtime, attributes in qb.iterall():
+                matches.setdefault(name, []).append((pk, mtime, attributes))
+
+            for name in missing:
+                found = matches.get(name, [])
+                if len(found) != 1:
+                    exception = (
+                        NotExistent if not found else MultipleObjectsError
+                    )
+                    raise exception(
+                        "Invalid name {} of AbacusParameters Data. Matched {}.".format(
+                            name, len(found)
+                        )
+                    )
+                _CACHE[name] = found[0]
+
+        return {
+            name: (_CACHE[name][0], copy.deepcopy(_CACHE[name][2]))
+            for name in names
+        }
+
+    @staticmethod
+    def clear_cache():
+        """Empty the process-local cache used by `resolve_many`."""
+        _CACHE.clear()
+
     def cmdline_params(self, file1_name, file2_name):
         """Synthesize command line parameters.
 
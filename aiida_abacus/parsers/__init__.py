@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+"""
+Parsers provided by aiida_abacus.
+
+Register parsers via the "aiida.parsers" entry point in setup.json.
+"""
@@ -0,0 +1,270 @@
+import fnmatch
+import os
+
+import numpy as np
+
+from aiida import orm
+from aiida.common import exceptions
+from aiida.engine import ExitCode
+from aiida.parsers.parser import Parser
+from aiida_abacus.calculations.stru import (
+    get_site_arrays,
+    get_site_symbols,
+    group_sites_by_kind,
+)
+from aiida_abacus.parsers.parse_raw import (
+    ReducedRunningLog,
+    detect_out_of_memory,
+    load_reduced_outputs,
+    parse_md_dump,
+    parse_running_log,
+    parse_stdout,
+)
+from aiida_abacus.parsers.retrieved import RetrievedFiles
+from aiida_abacus.utils import timing
+
+
+class BaseParser(Parser):
+    """
+    Parser for the outputs of a `BaseCalculation`.
+
+    The stdout and the `running_*.log` file are read line by line, so the memory usage does not depend on the
+    size of the files. Output files are read from the retrieved folder, the temporary retrieved folder or the
+    archive written by the job script, see `BaseCalculation.get_retrieve_lists`.
+    """
+
+    _RELAX_CALCULATIONS = ["relax", "cell-relax", "md"]
+
+    def parse(self, **kwargs):
+        """
+        Parse outputs, store results in database.
+
+        :returns: an exit code, if parsing fails (or nothing if parsing succeeds)
+        """
+        try:
+            retrieved = self.retrieved
+        except exceptions.NotExistent:
+            return self.exit_codes.ERROR_NO_RETRIEVED_FOLDER
+
+        with RetrievedFiles(
+            retrieved,
+            kwargs.get("retrieved_temporary_folder"),
+            self.node.process_class._RETRIEVE_ARCHIVE,
+        ) as files, timing.timed_stage(self.node, "parse"):
+            self.files = files
+            self.wall_time_seconds = None
+            exit_code = self.parse_files()
+
+        if timing.is_enabled():
+            timing.record_stages(
+                self.node,
+                timing.get_job_stages(self.node, self.wall_time_seconds),
+            )
+        return exit_code
+
+    def parse_files(self):
+        """Parse the output files, available in `self.files`.
+
+        :returns: an exit code, if parsing fails (or nothing if parsing succeeds)
+        """
+        retrieved = self.retrieved
+        # The job script exited before ABACUS ran, since a pseudo linked from the cache failed its check
+        if (
+            self.node.process_class._PSEUDO_CACHE_MISSING_FILE
+            in retrieved.list_object_names()
+        ):
+            return self.exit_codes.ERROR_PSEUDO_CACHE_MISSING
+        filename_stdout = self.node.get_option("output_filename")
+        if not self.files.exists(filename_stdout):
+            return self.exit_codes.ERROR_OUTPUT_STDOUT_MISSING
+
+        with self.files.open(filename_stdout) as handle:
+            parsed_stdout = parse_stdout(handle)
+
+        log_parser = self.get_reduced_outputs()
+        if log_parser is None:
+            filename_log = self.get_log_filename()
+            if filename_log is None:
+                return self.exit_codes.ERROR_OUTPUT_LOG_MISSING
+
+            self.logger.info(f"Parsing '{filename_log}'")
+            with self.files.open(filename_log) as handle:
+                log_parser = parse_running_log(handle)
+
+        parameters = dict(log_parser.parsed)
+        parameters["warnings"] = parsed_stdout.pop("warnings")
+        for key, value in parsed_stdout.items():
+            parameters.setdefault(key, value)
+        self.wall_time_seconds = parameters.get("wall_time_seconds")
+        parameters["job_done"] = (
+            log_parser.parsed["job_done"] or parsed_stdout["job_done"]
+        )
+        # The job script asked ABACUS to stop before the walltime and it ended after an ionic step of an unfinished
+        # relaxation or dynamics: a success that the completed ionic steps can be continued from. If ABACUS did not
+        # end in time, the job was killed at the walltime and the output is incomplete.
+        parameters["stopped_restartable"] = (
+            self.node.process_class._STOPPED_FILE
+            in retrieved.list_object_names()
+            and parameters["job_done"]
+            and self.get_calculation() in self._RELAX_CALCULATIONS
+            and parameters.get("ionic_converged") is not True
+        )
+        forces = log_parser.get_trajectory().get("forces")
+        if forces is not None and len(forces):
+            # The largest atomic force of the last ionic step, in eV/Angstrom
+            parameters["max_force"] = float(
+                np.linalg.norm(forces[-1], axis=1).max()
+            )
+        self.out("output_parameters", orm.Dict(dict=parameters))
+        if log_parser.timing:
+            self.out("output_timing", orm.Dict(dict=log_parser.timing))
+
+        if self.get_calculation() in self._RELAX_CALCULATIONS:
+            self.out_structure_and_trajectory(log_parser)
+
+        if parameters["stopped_restartable"]:
+            self.logger.warning(
+                "ABACUS was stopped before the walltime of the job, the calculation can be continued"
+            )
+            return ExitCode(0)
+
+        if not parameters["job_done"]:
+            if parameters["out_of_memory"] or self.is_out_of_memory():
+                return self.exit_codes.ERROR_OUT_OF_MEMORY
+            return self.exit_codes.ERROR_OUTPUT_STDOUT_INCOMPLETE
+
+        if parameters.get("scf_converged") is False:
+            return self.exit_codes.ERROR_ELECTRONIC_CONVERGENCE_NOT_REACHED
+
+        if parameters.get("ionic_converged") is False:
+            return self.exit_codes.ERROR_IONIC_CONVERGENCE_NOT_REACHED
+
+        return ExitCode(0)
+
+    def is_out_of_memory(self):
+        """Return whether the scheduler stderr reports that the job ran out of memory."""
+        filename = self.node.get_option("scheduler_stderr")
+        if not filename or filename not in self.retrieved.list_object_names():
+            return False
+        with self.retrieved.open(filename, "r") as handle:
+            return detect_out_of_memory(handle)
+
+    def get_calculation(self):
+        """Return the value of the `calculation` input parameter."""
+        return self.node.inputs.parameters.get_dict().get("calculation", "scf")
+
+    def get_reduced_outputs(self):
+        """Return the outputs reduced on the remote by the job script, or None if they were not retrieved.
+
+        :returns: a `ReducedRunningLog`, which can be used in place of the `RunningLogParser` of the raw log
+        """
+        process_class = self.node.process_class
+        filename_summary = process_class._REDUCED_SUMMARY
+        filename_arrays = process_class._REDUCED_ARRAYS
+        if not self.files.exists(filename_summary) or not self.files.exists(
+            filename_arrays
+        ):
+            return None
+
+        self.logger.info(f"Parsing the reduced outputs '{filename_summary}'")
+        with self.files.open(filename_summary) as summary, self.files.open(
+            filename_arrays, "rb"
+        ) as arrays:
+            return load_reduced_outputs(summary, arrays)
+
+    def get_log_filename(self):
+        """Return the path of the `running_*.log` file in the retrieved folder, or None if it was not retrieved."""
+        folder = self.node.process_class._OUTPUT_SUBFOLDER
+        filenames = self.files.listdir(folder)
+
+        preferred = f"running_{self.get_calculation()}.log"
+        if preferred in filenames:
+            return os.path.join(folder, preferred)
+
+        for filename in fnmatch.filter(sorted(filenames), "running_*.log"):
+            return os.path.join(folder, filename)
+        return None
+
+    def get_site_order(self):
+        """Return the permutation that maps the atoms of the output files to the sites of the input structure."""
+        site_kind_names, _ = get_site_arrays(self.node.inputs.structure)
+        return group_sites_by_kind(site_kind_names)[2]
+
+    def get_md_trajectory(self, log_parser, log_arrays):
+        """Return the arrays of the dumped molecular dynamics steps, with the energies taken from the log file."""
+        if isinstance(log_parser, ReducedRunningLog):
+            arrays = log_parser.get_md_trajectory() or {}
+        else:
+            filename = os.path.join(
+                self.node.process_class._OUTPUT_SUBFOLDER, "MD_dump"
+            )
+            try:
+                with self.files.open(filename) as handle:
+                    arrays = parse_md_dump(handle).get_arrays()
+            except (FileNotFoundError, OSError):
+                return log_arrays
+
+        if "positions" not in arrays:
+            return log_arrays
+
+        stepids = arrays["stepids"].astype(int)
+        energies = log_arrays.get("energies")
+        if energies is not None and stepids.max(initial=0) < len(energies):
+            arrays["energies"] = energies[stepids]
+        return arrays
+
+    def out_structure_and_trajectory(self, log_parser):
+        """Attach the final structure and the trajectory of the ionic steps, in the site order of the input.
+
+        All quantities of the ionic steps are stored in a single `TrajectoryData` as contiguous float64 arrays with
+        the steps along the first axis: `positions`, `cells`, `forces`, `stress` and `energies`. The symbols of the
+        trajectory are the chemical symbols of the sites, their kind names are kept in the `kind_names` attribute.
+        """
+        structure = self.node.inputs.structure
+        if log_parser.number_of_atoms != len(structure.sites):
+            self.logger.warning(
+                "number of atoms in the output does not match the input structure"
+            )
+            return
+
+        order = self.get_site_order()
+        site_kind_names, _ = get_site_arrays(structure)
+
+        arrays = log_parser.get_trajectory()
+        final = log_parser.get_final_structure()
+        if self.get_calculation() == "md":
+            arrays = self.get_md_trajectory(log_parser, arrays)
+            if "positions" in arrays and "cells" in arrays:
+                final = arrays["cells"][-1], arrays["positions"][-1]
+
+        if final is not None:
+            cell, positions = final
+            output_structure = structure.clone()
+            output_structure.reset_cell(cell.tolist())
+            sorted_positions = positions.copy()
+            sorted_positions[order] = positions
+            output_structure.reset_sites_positions(sorted_positions.tolist())
+            self.out("output_structure", output_structure)
+
+        if "positions" not in arrays or "cells" not in arrays:
+            return
+
+        # Map the atoms back onto the sites of the input structure
+        for name in ("positions", "forces"):
+            if name in arrays:
+                array = np.empty_like(arrays[name])
+                array[:, order] = arrays[name]
+                arrays[name] = array
+
+        stepids = arrays.pop("stepids", None)
+        trajectory = orm.TrajectoryData()
+        trajectory.set_trajectory(
+            symbols=get_site_symbols(structure, site_kind_names).tolist(),
+            positions=arrays.pop("positions"),
+            cells=arrays.pop("cells"),
+            stepids=None if stepids is None else stepids.astype(int),
+        )
+        for name, array in arrays.items():
+            trajectory.set_array(name, array)
+        trajectory.set_attribute("kind_names", site_kind_names.tolist())
+        self.out("output_trajectory", trajectory)
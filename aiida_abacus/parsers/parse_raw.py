@@ -0,0 +1,611 @@
+"""Line-by-line parsers for the raw output files of ABACUS.
+
+The files are consumed in a single pass over the lines of an open handle, so that memory usage does not grow with
+the size of the file: only scalar quantities and the arrays of the current ionic step are kept around.
+This module only depends on the standard library and numpy: it is also copied to the working directory and run by
+the job script to reduce the output files to a compact summary before they are retrieved, see `reduce_outputs`.
+"""
+
+import fnmatch
+import json
+import os
+import sys
+
+import numpy as np
+
+BOHR_TO_ANGSTROM = 0.52917721067
+RY_TO_EV = 13.605693009
+
+# Messages of the C++ runtime, MPI launchers and schedulers when a process runs out of memory
+_OUT_OF_MEMORY_MARKERS = (
+    "bad_alloc",
+    "out of memory",
+    "out-of-memory",
+    "oom-kill",
+    "oom_kill",
+    "exceeded memory",
+    "memory limit",
+)
+
+# Maximum number of decoration and header lines between a block title and its first numerical row
+_MAX_BLOCK_HEADER_LINES = 6
+
+
+def parse_time_string(string):
+    """Convert a duration like ``0 h 1 mins 25 secs`` or ``18`` into seconds.
+
+    :param string: the part of the line after the colon
+    :returns: the duration in seconds as a float, or None if the string could not be parsed
+    """
+    factors = {"h": 3600.0, "mins": 60.0, "min": 60.0, "secs": 1.0, "s": 1.0}
+    tokens = string.replace("+", " ").split()
+    try:
+        if len(tokens) == 1:
+            return float(tokens[0])
+        return sum(
+            float(value) * factors[unit]
+            for value, unit in zip(tokens[::2], tokens[1::2])
+        )
+    except (KeyError, ValueError):
+        return None
+
+
+def _parse_floats(tokens):
+    """Return the tokens converted to floats, or None if any of them is not a number."""
+    try:
+        return [float(token) for token in tokens]
+    except ValueError:
+        return None
+
+
+def _value_after(line, separator="="):
+    """Return the stripped text after the first `separator` of the line."""
+    return line.split(separator, 1)[1].strip()
+
+
+def is_out_of_memory_message(line):
+    """Return whether the line reports that a process ran out of memory."""
+    lowered = line.lower()
+    return any(marker in lowered for marker in _OUT_OF_MEMORY_MARKERS)
+
+
+def detect_out_of_memory(handle):
+    """Return whether any line of the file, e.g. the scheduler stderr, reports that a process ran out of memory."""
+    return any(is_out_of_memory_message(line) for line in handle)
+
+
+def parse_stdout(handle):
+    """Parse the standard output of ABACUS.
+
+    :param handle: an open text handle of the stdout file
+    :returns: dictionary with the parsed quantities
+    """
+    parsed = {
+        "job_done": False,
+        "number_of_scf_iterations_stdout": 0,
+        "out_of_memory": False,
+        "warnings": [],
+    }
+    in_scf_table = False
+
+    for line in handle:
+        stripped = line.strip()
+        if not stripped:
+            in_scf_table = False
+            continue
+
+        tokens = stripped.split()
+
+        if in_scf_table:
+            values = _parse_floats(tokens[1:])
+            if values:
+                parsed["number_of_scf_iterations_stdout"] += 1
+                parsed["scf_iteration_time_seconds"] = values[-1]
+                continue
+            in_scf_table = False
+
+        if tokens[0] == "ITER":
+            in_scf_table = True
+        elif stripped.startswith("Version"):
+            parsed["code_version"] = stripped.split()[-1]
+        elif stripped.upper().startswith("TOTAL  TIME"):
+            parsed["wall_time_seconds"] = parse_time_string(
+                _value_after(stripped, ":")
+            )
+            parsed["job_done"] = True
+        elif stripped.startswith("SEE INFORMATION IN"):
+            parsed["job_done"] = True
+        elif is_out_of_memory_message(stripped):
+            parsed["out_of_memory"] = True
+        elif "NOTICE" in stripped or "WARNING_QUIT" in stripped:
+            # Only keep the first few messages to stay bounded on noisy outputs
+            if len(parsed["warnings"]) < 10:
+                parsed["warnings"].append(stripped.strip("! "))
+
+    return parsed
+
+
+class TrajectoryBuffer:
+    """Growable contiguous float64 arrays that hold one row per frame of a trajectory.
+
+    The arrays are over-allocated and doubled in size when full, so that appending a frame is amortized constant
+    time and no per-frame python objects are kept around. Quantities that are not set for a frame are left as NaN.
+    """
+
+    _INITIAL_CAPACITY = 16
+
+    def __init__(self):
+        self.number_of_frames = 0
+        self._capacity = self._INITIAL_CAPACITY
+        self._arrays = {}
+        self._counts = {}
+
+    def new_frame(self, **values):
+        """Append a frame and set the given quantities on it."""
+        if self.number_of_frames == self._capacity:
+            self._capacity *= 2
+            for name, array in self._arrays.items():
+                grown = np.full((self._capacity,) + array.shape[1:], np.nan)
+                grown[: self.number_of_frames] = array[: self.number_of_frames]
+                self._arrays[name] = grown
+        self.number_of_frames += 1
+        for name, value in values.items():
+            self.set(name, value)
+
+    def set(self, name, value):
+        """Set a quantity on the last frame, ignoring values whose shape does not match the previous frames."""
+        if value is None or not self.number_of_frames:
+            return
+        value = np.asarray(value, dtype=np.float64)
+        array = self._arrays.get(name)
+        if array is None:
+            array = np.full((self._capacity,) + value.shape, np.nan)
+            self._arrays[name] = array
+            self._counts[name] = 0
+        elif array.shape[1:] != value.shape:
+            return
+        index = self.number_of_frames - 1
+        if np.isnan(array[index]).all():
+            self._counts[name] += 1
+        array[index] = value
+
+    def get_arrays(self):
+        """Return the quantities that were set on every frame, as contiguous float64 arrays."""
+        return {
+            name: np.ascontiguousarray(array[: self.number_of_frames])
+            for name, array in self._arrays.items()
+            if self._counts[name] == self.number_of_frames
+        }
+
+
+class RunningLogParser:
+    """Single-pass state machine over the lines of an ABACUS `running_*.log` file.
+
+    Every line is dispatched either to the handler of the block that is currently being read (coordinates, lattice
+    vectors, forces, stress) or checked against a small set of plain string markers. A new frame of the trajectory is
+    started by every ``final etot is`` line and collects the positions and cell that were used for that electronic
+    minimization together with the forces and stress printed after it.
+    """
+
+    def __init__(self):
+        self.parsed = {
+            "job_done": False,
+            "number_of_ionic_steps": 0,
+            "total_number_of_scf_iterations": 0,
+        }
+        self.frames = TrajectoryBuffer()
+        self.timing = {}
+
+        self._lattice_constant = 1.0
+        self._cell = None
+        self._positions = None
+        self._block = None
+        self._in_timing_table = False
+        self._block_rows = []
+        self._block_scale = 1.0
+        self._block_direct = False
+        self._block_skipped = 0
+        self._scf_iterations = 0
+        self._kohn_sham_energy = None
+
+    @property
+    def number_of_atoms(self):
+        return self.parsed.get("number_of_atoms")
+
+    def feed(self, line):
+        """Process a single line of the file."""
+        if self._block is not None:
+            self._feed_block(line)
+            return
+
+        stripped = line.strip()
+        if not stripped:
+            return
+
+        if self._in_timing_table:
+            self._feed_timing_row(stripped)
+            return
+
+        if "ELEC" in stripped and "ALGORITHM" in stripped:
+            self._scf_iterations += 1
+        elif stripped.startswith("E_KohnSham"):
+            self._kohn_sham_energy = float(stripped.split()[-1])
+        elif stripped.startswith("E_Fermi"):
+            self._parse_fermi_energy(stripped)
+        elif stripped.startswith("final etot is"):
+            self._start_frame(float(stripped.split()[-2]))
+        elif stripped.startswith("charge density convergence is achieved"):
+            self.parsed["scf_converged"] = True
+        elif "convergence has not been achieved" in stripped.lower():
+            # No final energy is printed: use the last Kohn-Sham energy
+            self.parsed["scf_converged"] = False
+            self._start_frame(self._kohn_sham_energy)
+        elif stripped.startswith("|CLASS_NAME") and "TIME(Sec)" in stripped:
+            self._in_timing_table = True
+        elif stripped.startswith("TOTAL-FORCE (eV/Angstrom)"):
+            self._open_block("forces")
+        elif stripped.startswith("TOTAL-STRESS (KBAR)"):
+            self._open_block("stress")
+        elif stripped.startswith("CARTESIAN COORDINATES"):
+            self._open_block(
+                "positions", scale=self._coordinates_unit(stripped)
+            )
+        elif stripped.startswith("DIRECT COORDINATES"):
+            self._open_block("positions", direct=True)
+        elif stripped.startswith("Lattice vectors:"):
+            scale = self._lattice_constant * BOHR_TO_ANGSTROM
+            self._open_block("cell", scale=scale)
+        elif stripped.startswith("!FINAL_ETOT_IS"):
+            self.parsed["energy"] = float(stripped.split()[1])
+        elif stripped.startswith("Ion relaxation is converged"):
+            self.parsed["ionic_converged"] = True
+        elif stripped.startswith("Ion relaxation is not converged"):
+            self.parsed["ionic_converged"] = False
+        elif stripped.startswith("Lattice relaxation is converged"):
+            self.parsed["cell_converged"] = True
+        elif stripped.startswith("Lattice relaxation is not converged"):
+            self.parsed["cell_converged"] = False
+        elif "=" in stripped:
+            self._parse_key_value(stripped)
+        elif stripped.startswith("Version"):
+            self.parsed["code_version"] = stripped.split()[-1]
+        elif stripped.startswith("Total  Time"):
+            self.parsed["wall_time_seconds"] = parse_time_string(
+                _value_after(stripped, ":")
+            )
+            self.parsed["job_done"] = True
+
+    def _parse_key_value(self, stripped):
+        """Parse the ``key = value`` lines of the header that are of interest."""
+        key, value = (part.strip() for part in stripped.split("=", 1))
+
+        if key == "TOTAL ATOM NUMBER":
+            self.parsed["number_of_atoms"] = int(value)
+        elif key == "ntype" and "number_of_species" not in self.parsed:
+            self.parsed["number_of_species"] = int(value)
+        elif key == "nspin" and "number_of_spin_components" not in self.parsed:
+            self.parsed["number_of_spin_components"] = int(value)
+        elif key == "lattice constant (Bohr)":
+            self._lattice_constant = float(value)
+        elif key == "Volume (A^3)":
+            self.parsed["volume"] = float(value)
+        elif key == "NBANDS":
+            self.parsed["number_of_bands"] = int(value)
+        elif key == "occupied bands":
+            self.parsed["number_of_occupied_bands"] = float(value)
+        elif key.startswith("total electron number of element"):
+            self.parsed["number_of_electrons"] = self.parsed.get(
+                "number_of_electrons", 0.0
+            ) + float(value)
+        elif key == "nkstot_ibz":
+            self.parsed["number_of_k_points"] = int(value)
+        elif key == "nkstot" and "number_of_k_points" not in self.parsed:
+            self.parsed["number_of_k_points"] = int(value)
+        elif key == "energy cutoff for wavefunc (unit:Ry)":
+            self.parsed["wfc_cutoff"] = float(value) * RY_TO_EV
+
+    def _feed_timing_row(self, stripped):
+        """Parse a row of the timing table printed at the end of the run, which ends with a line of dashes.
+
+        Rows are ``CLASS NAME TIME(Sec) CALLS AVG PER%``, except the first one, which has no class and holds the total
+        time of the run. The routines are kept in `timing` by class and name, which cannot contain dots in a `Dict`.
+        """
+        if stripped.startswith("---"):
+            self._in_timing_table = False
+            return
+        tokens = stripped.replace("%", " ").split()
+        values = _parse_floats(tokens[-4:])
+        if len(tokens) < 5 or values is None:
+            return
+        seconds, calls, _, percent = values
+        names = [token.replace(".", "_") for token in tokens[:-4]]
+        if len(names) == 1 and names[0] == "total":
+            self.timing["total_seconds"] = seconds
+        elif len(names) == 2:
+            class_name, name = names
+            self.timing.setdefault("routines", {}).setdefault(class_name, {})[
+                name
+            ] = {
+                "seconds": seconds,
+                "calls": int(calls),
+                "percent": percent,
+            }
+
+    def _parse_fermi_energy(self, stripped):
+        """Keep the Fermi energy in eV of the last electronic iteration, per spin channel if printed separately."""
+        tokens = stripped.split()
+        key = tokens[0].replace("E_Fermi", "fermi_energy")
+        self.parsed[key] = float(tokens[-1])
+
+    @staticmethod
+    def _coordinates_unit(stripped):
+        """Return the unit in Angstrom of a ``CARTESIAN COORDINATES ( UNIT = 10 Bohr ).`` header."""
+        try:
+            return float(_value_after(stripped).split()[0]) * BOHR_TO_ANGSTROM
+        except (IndexError, ValueError):
+            return BOHR_TO_ANGSTROM
+
+    def _open_block(self, name, scale=1.0, direct=False):
+        if name in ("positions", "forces") and not self.number_of_atoms:
+            return
+        self._block = name
+        self._block_skipped = 0
+        self._block_rows = []
+        self._block_scale = scale
+        self._block_direct = direct
+
+    def _block_size(self):
+        if self._block in ("cell", "stress"):
+            return 3
+        return self.number_of_atoms
+
+    def _feed_block(self, line):
+        """Collect the numerical rows of the current block, skipping decorations and column headers."""
+        tokens = line.split()
+        # Rows of atomic blocks start with a label, rows of 3x3 blocks are purely numerical
+        columns = tokens if self._block in ("cell", "stress") else tokens[1:4]
+        values = _parse_floats(columns) if len(columns) == 3 else None
+
+        if values is None:
+            self._block_skipped += 1
+            if (
+                self._block_rows
+                or self._block_skipped > _MAX_BLOCK_HEADER_LINES
+            ):
+                # The block ended before the expected number of rows: drop it
+                self._block = None
+            return
+
+        self._block_rows.append(values)
+        if len(self._block_rows) == self._block_size():
+            self._close_block()
+
+    def _close_block(self):
+        array = np.array(self._block_rows, dtype=np.float64)
+        name = self._block
+        self._block = None
+        self._block_rows = []
+
+        if name == "cell":
+            self._cell = array * self._block_scale
+        elif name == "positions":
+            if self._block_direct:
+                if self._cell is None:
+                    return
+                array = array @ self._cell
+            else:
+                array = array * self._block_scale
+            self._positions = array
+        elif name in ("forces", "stress"):
+            self.frames.set(name, array)
+
+    def _start_frame(self, energy):
+        """Start a new frame of the trajectory for the ionic step whose electronic minimization just ended."""
+        self.parsed["number_of_ionic_steps"] += 1
+        self.parsed["total_number_of_scf_iterations"] += self._scf_iterations
+        self.parsed["number_of_scf_iterations"] = self._scf_iterations
+        self.parsed["energy"] = energy
+        self._scf_iterations = 0
+
+        self.frames.new_frame(
+            energies=energy, positions=self._positions, cells=self._cell
+        )
+
+    def get_final_structure(self):
+        """Return the cell and positions in Angstrom after the last ionic step, or None if they were not printed."""
+        if self._cell is None or self._positions is None:
+            return None
+        return self._cell, self._positions
+
+    def get_trajectory(self):
+        """Return the arrays of the trajectory that were printed for every frame, with the frames along the first axis.
+
+        Energies are in eV, positions and cells in Angstrom, forces in eV/Angstrom and stress in kbar.
+        """
+        return self.frames.get_arrays()
+
+
+def parse_md_dump(handle):
+    """Parse the `MD_dump` file written by ABACUS during molecular dynamics.
+
+    Each dumped step contains the cell, optionally the virial, and the positions and forces of all atoms.
+
+    :param handle: an open text handle of the `MD_dump` file
+    :returns: a `TrajectoryBuffer` with the `stepids`, `cells`, `positions`, `forces` and, if printed, `stress` of
+        every dumped step
+    """
+    frames = TrajectoryBuffer()
+    scale = BOHR_TO_ANGSTROM
+    # Positions are in the unit given in the header of the atoms, or in units of the lattice constant
+    position_scale = None
+    block, rows = None, []
+
+    def close(block, rows):
+        array = np.array(rows, dtype=np.float64)
+        if block == "cells":
+            frames.set("cells", array * scale)
+        elif block == "stress":
+            frames.set("stress", array)
+        else:
+            frames.set(
+                "positions",
+                array[:, :3]
+                * (scale if position_scale is None else position_scale),
+            )
+            frames.set("forces", array[:, 3:6])
+
+    for line in handle:
+        tokens = line.split()
+        if not tokens:
+            continue
+
+        if tokens[0] == "MDSTEP:":
+            if rows:
+                close(block, rows)
+            block, rows = None, []
+            frames.new_frame(stepids=float(tokens[1]))
+        elif tokens[0] == "LATTICE_CONSTANT:":
+            unit = 1.0 if "Angstrom" in tokens else BOHR_TO_ANGSTROM
+            scale = float(tokens[1]) * unit
+        elif tokens[0] in ("LATTICE_VECTORS", "VIRIAL", "INDEX"):
+            if rows:
+                close(block, rows)
+            if tokens[0] == "INDEX" and "POSITION" in tokens:
+                unit = tokens[tokens.index("POSITION") + 1 :][:1]
+                position_scale = {
+                    "(Angstrom)": 1.0,
+                    "(Bohr)": BOHR_TO_ANGSTROM,
+                }.get(unit[0] if unit else None)
+            block = {"LATTICE_VECTORS": "cells", "VIRIAL": "stress"}.get(
+                tokens[0], "atoms"
+            )
+            rows = []
+        elif block == "atoms":
+            rows.append(_parse_floats(tokens[2:8]))
+        elif block is not None:
+            rows.append(_parse_floats(tokens[:3]))
+
+    if rows:
+        close(block, rows)
+    return frames
+
+
+def parse_running_log(handle):
+    """Parse a `running_*.log` file of ABACUS.
+
+    :param handle: an open text handle of the log file
+    :returns: the `RunningLogParser` after all lines have been consumed
+    """
+    parser = RunningLogParser()
+    for line in handle:
+        parser.feed(line)
+    return parser
+
+
+def reduce_outputs(folder, summary_path, arrays_path, calculation="scf"):
+    """Reduce the `running_*.log` and `MD_dump` files of an output folder to a JSON summary and NumPy arrays.
+
+    The summary contains the scalar quantities parsed from the log, the arrays file the trajectory of the ionic
+    steps, the final structure and the dumped molecular dynamics steps. Both are read back with
+    `ReducedRunningLog`.
+
+    :param folder: the output folder of ABACUS
+    :param summary_path: the path of the JSON summary to write
+    :param arrays_path: the path of the `.npz` file to write
+    :param calculation: the `calculation` parameter, which selects the log file if there are several
+    :returns: the filename of the reduced log, or None if there is no log file
+    """
+    filenames = sorted(fnmatch.filter(os.listdir(folder), "running_*.log"))
+    preferred = f"running_{calculation}.log"
+    if preferred in filenames:
+        filenames.insert(0, preferred)
+    if not filenames:
+        return None
+
+    with open(os.path.join(folder, filenames[0]), encoding="utf8") as handle:
+        log_parser = parse_running_log(handle)
+
+    arrays = {
+        f"log_{name}": array
+        for name, array in log_parser.get_trajectory().items()
+    }
+    final = log_parser.get_final_structure()
+    if final is not None:
+        arrays["final_cell"], arrays["final_positions"] = final
+    filename_dump = os.path.join(folder, "MD_dump")
+    if os.path.isfile(filename_dump):
+        with open(filename_dump, encoding="utf8") as handle:
+            for name, array in parse_md_dump(handle).get_arrays().items():
+                arrays[f"md_{name}"] = array
+
+    with open(arrays_path, "wb") as handle:
+        np.savez_compressed(handle, **arrays)
+    with open(summary_path, "w", encoding="utf8") as handle:
+        json.dump(
+            {
+                "log_filename": filenames[0],
+                "parsed": log_parser.parsed,
+                "timing": log_parser.timing,
+            },
+            handle,
+        )
+    return filenames[0]
+
+
+class ReducedRunningLog:
+    """The outputs reduced by `reduce_outputs`, with the interface of `RunningLogParser`.
+
+    :param summary: the dictionary of the JSON summary
+    :param arrays: mapping of the names onto the arrays of the `.npz` file
+    """
+
+    def __init__(self, summary, arrays):
+        self.log_filename = summary["log_filename"]
+        self.parsed = summary["parsed"]
+        self.timing = summary.get("timing", {})
+        self._arrays = dict(arrays)
+
+    @property
+    def number_of_atoms(self):
+        return self.parsed.get("number_of_atoms")
+
+    def _get_arrays(self, prefix):
+        return {
+            name[len(prefix) :]: array
+            for name, array in self._arrays.items()
+            if name.startswith(prefix)
+        }
+
+    def get_final_structure(self):
+        """Return the cell and positions in Angstrom after the last ionic step, or None if they were not printed."""
+        if "final_cell" not in self._arrays:
+            return None
+        return self._arrays["final_cell"], self._arrays["final_positions"]
+
+    def get_trajectory(self):
+        """Return the arrays of the trajectory parsed from the log, see `RunningLogParser.get_trajectory`."""
+        return self._get_arrays("log_")
+
+    def get_md_trajectory(self):
+        """Return the arrays of the dumped molecular dynamics steps, see `parse_md_dump`, or None without dump."""
+        return self._get_arrays("md_") or None
+
+
+def load_reduced_outputs(summary_handle, arrays_handle):
+    """Load the outputs reduced by `reduce_outputs`.
+
+    :param summary_handle: an open text handle of the JSON summary
+    :param arrays_handle: an open binary handle of the `.npz` file
+    :returns: a `ReducedRunningLog`
+    """
+    summary = json.load(summary_handle)
+    with np.load(arrays_handle, allow_pickle=False) as arrays:
+        return ReducedRunningLog(
+            summary, {name: arrays[name] for name in arrays.files}
+        )
+
+
+if __name__ == "__main__":
+    # Run by the job script: python aiida_reduce.py FOLDER SUMMARY ARRAYS [CALCULATION]
+    if reduce_outputs(*sys.argv[1:5]) is None:
+        sys.exit(f"No running_*.log file in {sys.argv[1]}")
@@ -0,0 +1,110 @@
+"""Uniform read access to the output files of a `BaseCalculation`, wherever the retrieve profile put them."""
+
+import io
+import os
+import posixpath
+import tarfile
+
+
+class RetrievedFiles:
+    """The output files of a calculation, looked up by their path relative to the working directory.
+
+    A file is looked up in the retrieved folder, the temporary retrieved folder and the archive written by the job
+    script, in this order. Use as a context manager, the archive is kept open until the end of the block.
+
+    :param retrieved: the retrieved `FolderData`
+    :param temporary_folder: the path of the temporary retrieved folder, or None
+    :param archive_prefix: the filename of the archive, without the compression suffix
+    """
+
+    def __init__(self, retrieved, temporary_folder=None, archive_prefix=None):
+        self._retrieved = retrieved
+        self._temporary_folder = temporary_folder
+        self._archive_prefix = archive_prefix
+        self._handle = None
+        self._archive = None
+        self._members = {}
+
+    def __enter__(self):
+        self._open_archive()
+        return self
+
+    def __exit__(self, *args):
+        if self._archive is not None:
+            self._archive.close()
+            self._handle.close()
+        self._archive = self._handle = None
+        self._members = {}
+
+    def _open_archive(self):
+        """Open the archive in the retrieved or temporary folder, if any, and index its regular files."""
+        if not self._archive_prefix:
+            return
+        for name in self._retrieved.list_object_names():
+            if name.startswith(self._archive_prefix):
+                self._handle = self._retrieved.open(name, "rb")
+                break
+        else:
+            folder = self._temporary_folder
+            names = os.listdir(folder) if folder else []
+            for name in sorted(names):
+                if name.startswith(self._archive_prefix):
+                    self._handle = open(os.path.join(folder, name), "rb")
+                    break
+        if self._handle is None:
+            return
+        self._archive = tarfile.open(fileobj=self._handle, mode="r:*")
+        self._members = {
+            posixpath.normpath(member.name): member
+            for member in self._archive.getmembers()
+            if member.isfile()
+        }
+
+    def _retrieved_names(self, folder):
+        try:
+            return self._retrieved.list_object_names(folder or None)
+        except (FileNotFoundError, OSError):
+            return []
+
+    def _temporary_path(self, path):
+        if not self._temporary_folder:
+            return None
+        return os.path.join(self._temporary_folder, path)
+
+    def listdir(self, folder=""):
+        """Return the sorted names of the files and folders in a folder of the working directory."""
+        names = set(self._retrieved_names(folder))
+        temporary = self._temporary_path(folder)
+        if temporary and os.path.isdir(temporary):
+            names.update(os.listdir(temporary))
+        prefix = posixpath.normpath(folder) + "/" if folder else ""
+        for member in self._members:
+            if member.startswith(prefix):
+                names.add(member[len(prefix) :].split("/", 1)[0])
+        return sorted(names)
+
+    def exists(self, path):
+        """Return whether a file was retrieved, in any of the locations."""
+        folder, name = posixpath.split(path)
+        return name in self.listdir(folder)
+
+    def open(self, path, mode="r"):
+        """Open a file in text mode, or in binary mode with `mode="rb"`.
+
+        :raises FileNotFoundError: if the file was not retrieved
+        """
+        folder, name = posixpath.split(path)
+        if name in self._retrieved_names(folder):
+            return self._retrieved.open(path, mode)
+        temporary = self._temporary_path(path)
+        if temporary and os.path.isfile(temporary):
+            if mode == "rb":
+                return open(temporary, mode)
+            return open(temporary, mode, encoding="utf8")
+        member = self._members.get(posixpath.normpath(path))
+        if member is not None:
+            handle = self._archive.extractfile(member)
+            if mode == "rb":
+                return handle
+            return io.TextIOWrapper(handle, encoding="utf8")
+        raise FileNotFoundError(f"{path} was not retrieved")
@@ -1,14 +1,88 @@
 from aiida import orm
-from ase.io import read as aseread
 
 
-def read_structure(structure_file, store=False):
-    structure = orm.StructureData(ase=aseread(structure_file))
+def read_structure(structure_file, store=False, deduplicate=False):
+    """Read a structure file with ASE.
+
+    :param store: whether to store the structure, together with its fingerprint
+    :param deduplicate: if True, return the stored structure with the same fingerprint, if there is one, instead of a
+        new node, see `aiida_abacus.utils.fingerprint`
+    """
+    from ase.io import read as aseread
+
+    from aiida_abacus.utils.fingerprint import (
+        FingerprintIndex,
+        get_fingerprint,
+        store_fingerprint,
+    )
+
+    atoms = aseread(structure_file)
+    if deduplicate:
+        fingerprint = get_fingerprint(atoms)
+        pk = FingerprintIndex.load(formulas=[fingerprint["formula"]]).find(
+            fingerprint
+        )
+        if pk is not None:
+            print(
+                "Structure {} is a duplicate of the stored structure with pk {}.".format(
+                    fingerprint["formula"], pk
+                )
+            )
+            return orm.load_node(pk)
+
+    structure = orm.StructureData(ase=atoms)
     if store is True:
         structure.store()
+        store_fingerprint(structure, fingerprint if deduplicate else None)
     print(
         "Structure {} read and stored with pk {}.".format(
             structure.get_formula(), structure.pk
         )
     )
     return structure
+
+
+def load_array(node, name, steps=None):
+    """Load an array of a stored `ArrayData`, such as a `TrajectoryData`, or only some of its steps.
+
+    The array is read from the stream of the repository file, so single steps of long trajectories can be analysed
+    without loading the whole array in memory, whichever repository backend stores the file.
+
+    :param node: a stored `ArrayData` node
+    :param name: the name of the array, e.g. `positions` or `forces`
+    :param steps: an index or a slice of the first axis, only these rows are read, or None for the whole array
+    :returns: a numpy array
+    """
+    import numpy
+
+    if steps is None:
+        return node.get_array(name)
+
+    with node.open(f"{name}.npy", mode="rb") as handle:
+        version = numpy.lib.format.read_magic(handle)
+        if version == (1, 0):
+            header = numpy.lib.format.read_array_header_1_0(handle)
+        else:
+            header = numpy.lib.format.read_array_header_2_0(handle)
+        shape, fortran_order, dtype = header
+        if fortran_order or not shape:
+            return node.get_array(name)[steps]
+
+        if isinstance(steps, slice):
+            start, stop, stride = steps.indices(shape[0])
+        else:
+            start = range(shape[0])[steps]
+            stop, stride = start + 1, 1
+        if stride < 0:
+            return node.get_array(name)[steps]
+
+        row_size = int(numpy.prod(shape[1:], dtype=int)) * dtype.itemsize
+        count = max(stop - start, 0)
+        if handle.seekable():
+            handle.seek(start * row_size, 1)
+        else:
+            handle.read(start * row_size)
+        array = numpy.frombuffer(handle.read(count * row_size), dtype=dtype)
+        array = array.reshape((count,) + tuple(shape[1:]))[::stride].copy()
+
+    return array if isinstance(steps, slice) else array[0]
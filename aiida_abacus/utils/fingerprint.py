@@ -0,0 +1,250 @@
+"""Fingerprints of structures, to find the structures that were already stored or relaxed within numerical noise.
+
+The fingerprint of a structure is stored in the `abacus_fingerprint` extra of its `StructureData` node. It contains:
+
+* `formula`: the chemical formula, which is compared exactly
+* `cell`: the sorted lengths of the Minkowski-reduced cell vectors in Angstrom and the volume per atom, which do not
+  depend on the choice of the cell vectors of a lattice
+* `histogram`: the histogram of the interatomic distances up to `CUTOFF`, per atom and broadened by a Gaussian, which
+  does not depend on the order of the sites or on the origin
+
+`FingerprintIndex` loads the fingerprints of many nodes with a single query and keeps them in arrays grouped by
+formula, so that a lookup only compares the structures with the same formula, in vectorized form.
+"""
+
+import numpy as np
+
+FINGERPRINT_EXTRA = "abacus_fingerprint"
+CUTOFF = 5.0
+BIN_WIDTH = 0.1
+BROADENING = 0.1
+# Relative tolerance on the cell and largest difference of the histograms, relative to the largest value
+CELL_TOLERANCE = 1e-3
+HISTOGRAM_TOLERANCE = 0.05
+
+
+def get_fingerprint(atoms):
+    """Return the fingerprint of a structure.
+
+    :param atoms: an `ase.Atoms`
+    :returns: a dictionary with the `formula`, `cell` and `histogram`, which can be stored in the extras of a node
+    """
+    from ase.geometry import minkowski_reduce
+    from ase.neighborlist import neighbor_list
+
+    pbc = atoms.get_pbc()
+    cell = np.array(atoms.get_cell())
+    if pbc.any():
+        cell, _ = minkowski_reduce(cell, pbc=pbc)
+    lengths = np.sort(np.linalg.norm(cell, axis=1))
+    volume = abs(np.linalg.det(cell)) if pbc.all() else 0.0
+
+    distances = neighbor_list("d", atoms, CUTOFF)
+    number_of_bins = int(round(CUTOFF / BIN_WIDTH))
+    counts, _ = np.histogram(
+        distances, bins=number_of_bins, range=(0.0, number_of_bins * BIN_WIDTH)
+    )
+    # Broaden the counts of the bins by a Gaussian, cut at four standard deviations
+    sigma = BROADENING / BIN_WIDTH
+    offsets = np.arange(-int(np.ceil(4 * sigma)), int(np.ceil(4 * sigma)) + 1)
+    kernel = np.exp(-((offsets / sigma) ** 2) / 2)
+    histogram = np.convolve(counts, kernel, mode="same") / max(len(atoms), 1)
+
+    return {
+        "formula": atoms.get_chemical_formula(mode="hill"),
+        "cell": [float(value) for value in lengths]
+        + [volume / max(len(atoms), 1)],
+        "histogram": [round(float(value), 4) for value in histogram],
+    }
+
+
+def get_structure_fingerprint(structure):
+    """Return the fingerprint of a `StructureData`, from its extras if it is stored and already has one."""
+    if structure.is_stored:
+        fingerprint = structure.get_extra(FINGERPRINT_EXTRA, None)
+        if fingerprint is not None:
+            return fingerprint
+    return get_fingerprint(structure.get_ase())
+
+
+def store_fingerprint(structure, fingerprint=None):
+    """Store the fingerprint of a stored `StructureData` in its extras, so that the indexes find the structure.
+
+    :param fingerprint: the fingerprint, if it was already computed
+    :returns: the fingerprint
+    """
+    if fingerprint is None:
+        fingerprint = get_structure_fingerprint(structure)
+    structure.set_extra(FINGERPRINT_EXTRA, fingerprint)
+    return fingerprint
+
+
+class FingerprintIndex:
+    """In-memory index of the fingerprints of structure nodes.
+
+    :param entries: iterable of tuples of a node pk and its fingerprint
+    """
+
+    def __init__(self, entries=()):
+        self._entries = {}
+        self._arrays = {}
+        for pk, fingerprint in entries:
+            self.add(pk, fingerprint)
+
+    def __len__(self):
+        return sum(len(pks) for pks, _, _ in self._entries.values())
+
+    @classmethod
+    def load(cls, group=None, formulas=None):
+        """Load the fingerprints of the stored structures with a single query.
+
+        :param group: if given, only the structures in this group
+        :param formulas: if given, only the structures with these formulas, e.g. to look up a few structures
+        """
+        from aiida import orm
+
+        filters = {"extras": {"has_key": FINGERPRINT_EXTRA}}
+        if formulas is not None:
+            filters[f"extras.{FINGERPRINT_EXTRA}.formula"] = {
+                "in": sorted(set(formulas))
+            }
+        query = orm.QueryBuilder()
+        if group is not None:
+            query.append(orm.Group, filters={"id": group.pk}, tag="group")
+            query.append(
+                orm.StructureData,
+                with_group="group",
+                filters=filters,
+                project=["id", f"extras.{FINGERPRINT_EXTRA}"],
+            )
+        else:
+            query.append(
+                orm.StructureData,
+                filters=filters,
+                project=["id", f"extras.{FINGERPRINT_EXTRA}"],
+            )
+        return cls(query.iterall())
+
+    def add(self, pk, fingerprint):
+        """Add the fingerprint of a node to the index."""
+        pks, cells, histograms = self._entries.setdefault(
+            fingerprint["formula"], ([], [], [])
+        )
+        pks.append(pk)
+        cells.append(fingerprint["cell"])
+        histograms.append(fingerprint["histogram"])
+        self._arrays.pop(fingerprint["formula"], None)
+
+    def _get_arrays(self, formula):
+        """Return the pks, cells and histograms of a formula as arrays, converted once after every change."""
+        if formula not in self._arrays:
+            pks, cells, histograms = self._entries[formula]
+            self._arrays[formula] = (
+                np.array(pks),
+                np.array(cells),
+                np.array(histograms),
+            )
+        return self._arrays[formula]
+
+    def find_all(self, fingerprint):
+        """Return the pks of all indexed nodes whose structure is a duplicate of the given fingerprint."""
+        if fingerprint["formula"] not in self._entries:
+            return []
+        pks, cells, histograms = self._get_arrays(fingerprint["formula"])
+        cell = np.array(fingerprint["cell"])
+        histogram = np.array(fingerprint["histogram"])
+        matches = np.all(
+            np.abs(cells - cell) <= CELL_TOLERANCE * np.maximum(cell, 1.0),
+            axis=1,
+        )
+        scale = max(histogram.max(initial=0.0), 1e-8)
+        matches &= (
+            np.abs(histograms - histogram).max(axis=1, initial=0.0)
+            <= HISTOGRAM_TOLERANCE * scale
+        )
+        return pks[matches].tolist()
+
+    def find(self, fingerprint):
+        """Return the pk of the first indexed duplicate of the given fingerprint, or None."""
+        pks = self.find_all(fingerprint)
+        return pks[0] if pks else None
+
+
+def get_completed_relaxations(structure_pks):
+    """Return the relax workchains that relaxed any of the given structures, with two queries.
+
+    A structure was relaxed by a `RealxWorkChain` that finished successfully, or by a `RelaxBatchWorkChain` that has
+    the relaxed structure of its `structures__<key>` input in its `output_structures__<key>` output, even if other
+    structures of the batch failed.
+
+    :returns: mapping of the structure pks onto the node of the most recent relax workchain
+    """
+    from aiida import orm
+
+    if not structure_pks:
+        return {}
+    query = orm.QueryBuilder()
+    query.append(
+        orm.StructureData,
+        filters={"id": {"in": list(structure_pks)}},
+        project="id",
+        tag="structure",
+    )
+    query.append(
+        orm.WorkChainNode,
+        with_incoming="structure",
+        edge_filters={
+            "or": [
+                {"label": "structure"},
+                {"label": {"like": "structures__%"}},
+            ]
+        },
+        edge_project="label",
+        filters={
+            "or": [
+                {
+                    "process_type": "aiida.workflows:abacus.relax",
+                    "attributes.exit_status": 0,
+                },
+                {
+                    "process_type": "aiida.workflows:abacus.relax.batch",
+                    "attributes.process_state": "finished",
+                },
+            ]
+        },
+        project="*",
+        tag="workchain",
+    )
+    # The projections of the nodes come before those of the links
+    rows = query.all()
+
+    batches = {
+        node.pk for _, node, label in rows if label.startswith("structures__")
+    }
+    outputs = set()
+    if batches:
+        query = orm.QueryBuilder()
+        query.append(
+            orm.WorkChainNode,
+            filters={"id": {"in": list(batches)}},
+            project="id",
+            tag="workchain",
+        )
+        query.append(
+            orm.StructureData,
+            with_incoming="workchain",
+            edge_filters={"label": {"like": "output_structures__%"}},
+            edge_project="label",
+        )
+        outputs = set(map(tuple, query.iterall()))
+
+    completed = []
+    for pk, node, label in rows:
+        if label.startswith("structures__"):
+            key = label[len("structures__") :]
+            if (node.pk, f"output_structures__{key}") not in outputs:
+                continue
+        completed.append((node.ctime, pk, node))
+    return {
+        pk: node for _, pk, node in sorted(completed, key=lambda row: row[0])
+    }
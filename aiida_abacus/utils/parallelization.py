@@ -0,0 +1,145 @@
+"""Automatic parallelization of `BaseCalculation` inputs within the limits of a computer."""
+
+import re
+
+from aiida_abacus.calculations.parallel import plan_parallelization
+
+# The limits that can be given in the `automatic_parallelization` input of the work chains
+AUTOMATIC_PARALLELIZATION_KEYS = (
+    "max_num_machines",
+    "max_mpiprocs_per_machine",
+    "max_threads_per_mpiproc",
+    "max_memory_per_machine_mb",
+)
+
+_Z_VALENCE_REGEX = re.compile(
+    r'z_valence\s*=\s*"\s*([-+0-9.eEdD]+)\s*"|([-+0-9.eEdD]+)\s+Z valence'
+)
+
+
+def validate_automatic_parallelization(value, _):
+    """Validate the `automatic_parallelization` input of a work chain."""
+    if value is None:
+        return None
+    unknown = set(value.get_dict()) - set(AUTOMATIC_PARALLELIZATION_KEYS)
+    if unknown:
+        return f"Unknown keys in `automatic_parallelization`: {', '.join(sorted(unknown))}."
+    return None
+
+
+def get_z_valence(pseudo):
+    """Return the number of valence electrons of a pseudopotential.
+
+    The `aiida-pseudo` classes provide it as a property, for the legacy `UpfData` it is read from the file header.
+    """
+    z_valence = getattr(pseudo, "z_valence", None)
+    if z_valence is not None:
+        return float(z_valence)
+    with pseudo.open(mode="r") as handle:
+        match = _Z_VALENCE_REGEX.search(handle.read(20000))
+    if match is None:
+        raise ValueError(
+            f"Could not find the valence of pseudo {pseudo.filename}."
+        )
+    return float((match.group(1) or match.group(2)).replace("D", "E"))
+
+
+def get_number_of_electrons(structure, pseudos):
+    """Return the number of valence electrons of a structure with the given pseudos, mapped on the kind names."""
+    z_valence = {
+        kind_name: get_z_valence(pseudo)
+        for kind_name, pseudo in pseudos.items()
+    }
+    return sum(z_valence[site.kind_name] for site in structure.sites)
+
+
+def get_parallelization(
+    structure, parameters, kpoints, pseudos, computer, limits
+):
+    """Estimate the parallelization layout of a calculation.
+
+    :param structure: the `StructureData`
+    :param parameters: dictionary of the ABACUS parameters, must contain `ecutwfc`
+    :param kpoints: the `KpointsData` with a mesh
+    :param pseudos: mapping of kind names onto pseudopotentials
+    :param computer: the `Computer`, whose default number of processes per machine is the number of cores
+    :param limits: dictionary with the keys of `AUTOMATIC_PARALLELIZATION_KEYS`
+    :returns: the layout returned by `plan_parallelization`
+    """
+    mesh, _ = kpoints.get_kpoints_mesh()
+    number_of_kpoints = mesh[0] * mesh[1] * mesh[2]
+    # Time-reversal symmetry halves the irreducible k-points, further symmetry reduction is not known in advance
+    number_of_kpoints = max(1, (number_of_kpoints + 1) // 2)
+
+    mpiprocs_per_machine = limits.get(
+        "max_mpiprocs_per_machine",
+        computer.get_default_mpiprocs_per_machine(),
+    )
+    if not mpiprocs_per_machine:
+        raise ValueError(
+            f"Computer {computer.label} has no default number of processes per machine: "
+            "set `max_mpiprocs_per_machine` in `automatic_parallelization`."
+        )
+
+    return plan_parallelization(
+        volume=structure.get_cell_volume(),
+        ecutwfc=float(parameters["ecutwfc"]),
+        number_of_electrons=get_number_of_electrons(structure, pseudos),
+        number_of_kpoints=number_of_kpoints,
+        max_num_machines=limits.get("max_num_machines", 1),
+        mpiprocs_per_machine=mpiprocs_per_machine,
+        max_threads_per_mpiproc=limits.get("max_threads_per_mpiproc", 1),
+        max_memory_per_machine_mb=limits.get("max_memory_per_machine_mb"),
+        number_of_spin_components=int(parameters.get("nspin", 1)),
+    )
+
+
+def apply_parallelization(inputs, parameters, layout):
+    """Set a parallelization layout on the inputs of a `BaseCalculation`.
+
+    :param inputs: the inputs namespace, its `metadata.options` are updated in place
+    :param parameters: dictionary of the ABACUS parameters, `kpar` and `bndpar` are set in place unless given
+    :param layout: the layout returned by `get_parallelization`
+    """
+    options = inputs["metadata"].setdefault("options", {})
+    options["resources"] = {
+        "num_machines": layout["num_machines"],
+        "num_mpiprocs_per_machine": layout["num_mpiprocs_per_machine"],
+    }
+    if layout["num_threads_per_mpiproc"] > 1:
+        options["resources"]["num_cores_per_mpiproc"] = layout[
+            "num_threads_per_mpiproc"
+        ]
+    environment_variables = dict(options.get("environment_variables", {}))
+    environment_variables["OMP_NUM_THREADS"] = str(
+        layout["num_threads_per_mpiproc"]
+    )
+    options["environment_variables"] = environment_variables
+
+    if layout["kpar"] > 1:
+        parameters.setdefault("kpar", layout["kpar"])
+    if layout["bndpar"] > 1:
+        parameters.setdefault("bndpar", layout["bndpar"])
+
+
+def get_layout(options, parameters):
+    """Return the parallelization layout that a `BaseCalculation` runs with, the inverse of `apply_parallelization`.
+
+    :param options: the `metadata.options` of the calculation
+    :param parameters: dictionary of the ABACUS parameters
+    :returns: dictionary with the keys of the layout returned by `plan_parallelization`
+    """
+    resources = options.get("resources", {})
+    environment_variables = options.get("environment_variables") or {}
+    num_threads_per_mpiproc = environment_variables.get(
+        "OMP_NUM_THREADS", resources.get("num_cores_per_mpiproc", 1)
+    )
+    return {
+        "num_machines": int(resources.get("num_machines", 1)),
+        "num_mpiprocs_per_machine": int(
+            resources.get("num_mpiprocs_per_machine", 1)
+        ),
+        "num_threads_per_mpiproc": int(num_threads_per_mpiproc),
+        "kpar": int(parameters.get("kpar", 1)),
+        "bndpar": int(parameters.get("bndpar", 1)),
+    }
@@ -0,0 +1,111 @@
+"""Reduction of structures to their Niggli-reduced primitive cell with `spglib`, and the mapping of results back.
+
+The original cell is a supercell of the primitive one: `cell = matrix @ primitive_cell`, with the cell vectors as rows
+and an integer `matrix`. The site `i` of the original structure is the site `mapping[i]` of the primitive structure,
+translated by the lattice vector `translations[i] @ primitive_cell`. Any structure in the primitive setting, e.g.
+relaxed, is mapped back by repeating it with the same matrix, mapping and translations, which describes the same
+crystal as long as the symmetry that made the cell primitive is kept.
+
+Settings given per kind, like `INITIAL_MAGNETIC`, apply to the primitive structure as well, since its sites keep their
+kinds. Settings given per site, like `FIXED_COORDS`, cannot be mapped onto it: equivalent sites of the original
+structure may have different values, so structures with such settings are not reduced.
+"""
+
+import numpy as np
+
+# Largest deviation from an integer of the transformation matrix
+INTEGER_TOLERANCE = 1e-3
+# Settings of the `BaseCalculation` with one value per site of the structure
+PER_SITE_SETTINGS = ("FIXED_COORDS",)
+
+
+def get_per_site_settings(settings):
+    """Return the names of the settings that are given per site, which prevent the reduction to the primitive cell.
+
+    :param settings: dictionary of the settings of the `BaseCalculation`
+    """
+    return [key for key in PER_SITE_SETTINGS if settings.get(key) is not None]
+
+
+def get_primitive_transformation(cell, positions, numbers, symprec=1e-3):
+    """Return the Niggli-reduced primitive cell of a structure and the transformation to the original cell.
+
+    :param cell: the cell vectors as rows, in Angstrom
+    :param positions: the cartesian positions of the sites, in Angstrom
+    :param numbers: integers that distinguish the sites, e.g. the index of their kind, so that sites of different
+        kinds with the same element are not considered equivalent
+    :param symprec: the tolerance of the symmetry search of `spglib`, in Angstrom
+    :returns: tuple of the primitive cell, the cartesian positions and numbers of its sites, the integer
+        transformation matrix, the mapping of the original sites onto the primitive sites and their integer lattice
+        translations
+    :raises ValueError: if `spglib` does not find the symmetry, or the primitive cell is not a sublattice of the
+        original cell with the same orientation
+    """
+    import spglib
+
+    cell = np.asarray(cell, dtype=float)
+    positions = np.asarray(positions, dtype=float)
+    scaled = positions @ np.linalg.inv(cell)
+    standardized = spglib.standardize_cell(
+        (cell, scaled, list(numbers)),
+        to_primitive=True,
+        no_idealize=True,
+        symprec=symprec,
+    )
+    if standardized is None:
+        raise ValueError("spglib did not find the symmetry of the structure")
+    standardized_cell, standardized_scaled, primitive_numbers = standardized
+    primitive_cell = np.asarray(spglib.niggli_reduce(standardized_cell))
+    primitive_scaled = (
+        np.asarray(standardized_scaled)
+        @ np.asarray(standardized_cell)
+        @ np.linalg.inv(primitive_cell)
+    ) % 1.0
+    primitive_numbers = np.asarray(primitive_numbers)
+
+    matrix = cell @ np.linalg.inv(primitive_cell)
+    if np.abs(matrix - np.round(matrix)).max() > INTEGER_TOLERANCE:
+        raise ValueError(
+            "the primitive cell is not a sublattice of the original cell"
+        )
+    matrix = np.round(matrix).astype(int)
+
+    # The lattice translation from every primitive site to every original site is integer for the equivalent site
+    difference = (scaled @ matrix)[:, None, :] - primitive_scaled[None, :, :]
+    translations = np.round(difference)
+    distances = np.linalg.norm(
+        (difference - translations) @ primitive_cell, axis=2
+    )
+    distances[np.asarray(numbers)[:, None] != primitive_numbers] = np.inf
+    mapping = distances.argmin(axis=1)
+    sites = np.arange(len(mapping))
+    if (distances[sites, mapping] > 2 * symprec).any():
+        raise ValueError(
+            "the sites of the structure could not be mapped onto the primitive cell"
+        )
+
+    return (
+        primitive_cell,
+        primitive_scaled @ primitive_cell,
+        primitive_numbers,
+        matrix,
+        mapping,
+        translations[sites, mapping].astype(int),
+    )
+
+
+def map_to_original(
+    primitive_cell, primitive_positions, matrix, mapping, translations
+):
+    """Map a cell and positions in the primitive setting back onto the original setting.
+
+    :param primitive_cell: the cell vectors of the primitive structure as rows, in Angstrom
+    :param primitive_positions: the cartesian positions of the primitive sites, in Angstrom
+    :returns: tuple of the cell and the cartesian positions of the original sites
+    """
+    primitive_cell = np.asarray(primitive_cell, dtype=float)
+    positions = (
+        np.asarray(primitive_positions, dtype=float)[mapping]
+        + translations @ primitive_cell
+    )
+    return matrix @ primitive_cell, positions
@@ -0,0 +1,192 @@
+"""Content-addressed cache of pseudopotential files on a remote computer.
+
+Every pseudo is uploaded once per computer to ``<directory>/<md5>`` by `aiida-abacus pseudo-cache stage` and
+calculations that enable the cache link the files into their working directory instead of uploading them again.
+
+Only the cache directory is recorded, in the `abacus_pseudo_cache` property of the computer, and only by
+`aiida-abacus pseudo-cache setup`: the content of the directory is the index of the staged files. Calculations never
+open a transport to the cache, their job script checks the linked files before ABACUS runs, see `get_check_script`.
+"""
+
+import hashlib
+import os
+import shlex
+import tempfile
+import uuid
+
+from aiida import orm
+
+CACHE_PROPERTY = "abacus_pseudo_cache"
+
+
+def get_pseudo_md5(pseudo):
+    """Return the MD5 checksum of the content of a pseudopotential node.
+
+    Both the legacy `UpfData` and the `aiida-pseudo` classes store it in the `md5` attribute, the content is only
+    hashed for nodes that do not have it.
+    """
+    md5 = pseudo.get_attribute("md5", None)
+    if md5 is None:
+        with pseudo.open(mode="rb") as handle:
+            md5 = hashlib.md5(handle.read()).hexdigest()
+    return md5
+
+
+def get_cache(computer):
+    """Return the cache record of a computer.
+
+    :returns: dictionary with the remote `directory`, or None if the cache was not set up for this computer
+    """
+    return computer.get_property(CACHE_PROPERTY, None)
+
+
+def set_cache(computer, directory):
+    """Store the cache record of a computer."""
+    computer.set_property(CACHE_PROPERTY, {"directory": directory})
+
+
+def get_cached_path(cache, md5):
+    """Return the remote path of the file with the given checksum."""
+    return os.path.join(cache["directory"], md5)
+
+
+def get_transport(computer):
+    """Return an unopened transport to the computer for the default user."""
+    authinfo = computer.get_authinfo(orm.User.objects.get_default())
+    return authinfo.get_transport()
+
+
+def stage_pseudos(computer, pseudos):
+    """Upload the pseudos whose files are not in the cache directory of the computer, through a single transport.
+
+    The directory is listed once. Files are uploaded under a temporary name and renamed, so that a calculation never
+    links a partial file and concurrent stagings of the same pseudo write the same content.
+
+    :param computer: the `Computer` with a configured cache
+    :param pseudos: iterable of pseudopotential nodes
+    :returns: list of the MD5 checksums that were uploaded
+    :raises ValueError: if the cache is not set up for the computer
+    """
+    cache = get_cache(computer)
+    if cache is None:
+        raise ValueError(
+            f"The pseudo cache is not set up for computer {computer.label}."
+        )
+    pseudos = {get_pseudo_md5(pseudo): pseudo for pseudo in pseudos}
+
+    with get_transport(computer) as transport:
+        transport.makedirs(cache["directory"], ignore_existing=True)
+        staged = set(transport.listdir(cache["directory"]))
+        uploaded = []
+        with tempfile.TemporaryDirectory() as dirpath:
+            for md5, pseudo in pseudos.items():
+                if md5 in staged:
+                    continue
+                uploaded.append(md5)
+                remote_path = get_cached_path(cache, md5)
+                local_path = os.path.join(dirpath, md5)
+                with pseudo.open(mode="rb") as source, open(
+                    local_path, "wb"
+                ) as target:
+                    target.write(source.read())
+                partial_path = f"{remote_path}.{uuid.uuid4().hex}.tmp"
+                transport.put(local_path, partial_path)
+                transport.rename(partial_path, remote_path)
+
+    return uploaded
+
+
+def get_check_script(links, missing_file, copy=False):
+    """Return the job script lines that check the pseudos linked from the cache before ABACUS runs.
+
+    The content of every link is compared with its MD5 checksum, so that a file that was purged from the cache, or
+    altered, is not read by ABACUS. The paths of the failing links are written to `missing_file` and the job exits,
+    the calculation then has to be run again with the pseudos uploaded.
+
+    :param links: list of tuples of the MD5 checksum and the path of the link relative to the working directory
+    :param missing_file: name of the file the failing links are written to
+    :param copy: if True, the checked links are replaced by a copy of the cached file
+    :returns: the lines of the script as a string
+    """
+    missing_file = shlex.quote(missing_file)
+    lines = []
+    for md5, path in links:
+        path = shlex.quote(path)
+        found = f"cp -L {path} {path}.copy && mv -f {path}.copy {path}"
+        if not copy:
+            found = ":"
+        lines.extend(
+            [
+                f'if [ "$({{ md5sum < {path}; }} 2> /dev/null | cut -c 1-32)" = {md5} ]; then',
+                f"    {found}",
+                "else",
+                f"    echo {path} >> {missing_file}",
+                "fi",
+            ]
+        )
+    lines.append(f"if [ -e {missing_file} ]; then exit 1; fi")
+    return "\n".join(lines)
+
+
+def get_cache_size(computer):
+    """Return the number of files and the total size in bytes of the cache directory of the computer."""
+    cache = get_cache(computer)
+    if cache is None:
+        raise ValueError(
+            f"The pseudo cache is not set up for computer {computer.label}."
+        )
+    number_of_files = 0
+    size = 0
+    with get_transport(computer) as transport:
+        if not transport.isdir(cache["directory"]):
+            return 0, 0
+        for filename in transport.listdir(cache["directory"]):
+            path = os.path.join(cache["directory"], filename)
+            if transport.isfile(path):
+                number_of_files += 1
+                size += transport.get_attribute(path).st_size
+    return number_of_files, size
+
+
+def prune_cache(computer, keep=None):
+    """Remove files from the cache directory of the computer.
+
+    :param computer: the `Computer` with a configured cache
+    :param keep: the MD5 checksums of the files to keep, all other files are removed. If None, the files of all
+        pseudopotentials stored in the database are kept and only orphaned or partially uploaded files are removed.
+    :returns: tuple of the number of removed files and the number of bytes freed
+    """
+    cache = get_cache(computer)
+    if cache is None:
+        raise ValueError(
+            f"The pseudo cache is not set up for computer {computer.label}."
+        )
+    if keep is None:
+        keep = get_stored_pseudo_md5s()
+    keep = set(keep)
+
+    removed = 0
+    freed = 0
+    with get_transport(computer) as transport:
+        if transport.isdir(cache["directory"]):
+            for filename in transport.listdir(cache["directory"]):
+                path = os.path.join(cache["directory"], filename)
+                if filename in keep or not transport.isfile(path):
+                    continue
+                freed += transport.get_attribute(path).st_size
+                transport.remove(path)
+                removed += 1
+
+    return removed, freed
+
+
+def get_stored_pseudo_md5s():
+    """Return the MD5 checksums of all pseudopotentials in the database, with a single query."""
+    from aiida.plugins import DataFactory
+
+    qb = orm.QueryBuilder()
+    qb.append(
+        (DataFactory("upf"), DataFactory("pseudo.upf")),
+        project="attributes.md5",
+    )
+    return {md5 for md5, in qb.iterall() if md5 is not None}
@@ -0,0 +1,118 @@
+"""Process-local cache of the pseudopotential families used by the work chains.
+
+`get_pseudos_from_structure` of AiiDA loads the family group and all of its nodes for every work chain. Here the map
+of a family onto the pk, UUID and MD5 checksum of the pseudo of every element is loaded with a single query, and
+reused by all work chains that run in the same process as long as the members of the group do not change. This is
+checked with one query of the pk and modification time of the members, whose signature is the hash of the sorted pks
+and the latest modification time. The work chains report the hits and misses of the cache.
+"""
+
+import hashlib
+
+from aiida import orm
+from aiida.common.exceptions import MultipleObjectsError, NotExistent
+
+# Process-local cache of the families: label -> (signature, {element: [(pk, uuid, md5), ...]})
+_CACHE = {}
+_STATISTICS = {"hits": 0, "misses": 0}
+
+
+def _get_family_query(family, project):
+    """Return the query of the members of the family with the given label."""
+    from aiida.orm.nodes.data.upf import UPFGROUP_TYPE
+
+    query = orm.QueryBuilder()
+    query.append(
+        orm.Group,
+        filters={"label": family, "type_string": UPFGROUP_TYPE},
+        tag="family",
+    )
+    query.append(orm.UpfData, with_group="family", project=project)
+    return query
+
+
+def _hash_members(rows):
+    """Return the hash of the `(pk, mtime)` rows of the members of a family, independent of their order."""
+    if not rows:
+        return None
+    pks = sorted(pk for pk, _ in rows)
+    latest = max(mtime for _, mtime in rows)
+    return hashlib.sha256(
+        f"{','.join(map(str, pks))}|{latest.isoformat()}".encode()
+    ).hexdigest()
+
+
+def _get_signature(family):
+    """Return the signature of the members of a family, which changes when a member is added, removed or modified."""
+    return _hash_members(_get_family_query(family, ["id", "mtime"]).all())
+
+
+def get_family_map(family):
+    """Return the map of a family onto the pseudos of its elements, from the cache if the group did not change.
+
+    :param family: the label of the `UpfData` family
+    :returns: dictionary mapping each element onto a tuple of the `(pk, uuid, md5)` tuples of its pseudos, which has a
+        single item unless the family is ambiguous
+    :raises NotExistent: if the family does not exist or is empty
+    """
+    cached = _CACHE.get(family)
+    if cached is not None and _get_signature(family) == cached[0]:
+        _STATISTICS["hits"] += 1
+        return {element: tuple(rows) for element, rows in cached[1].items()}
+
+    _STATISTICS["misses"] += 1
+    _CACHE.pop(family, None)
+    query = _get_family_query(
+        family, ["id", "mtime", "uuid", "attributes.element", "attributes.md5"]
+    )
+    elements = {}
+    members = []
+    for pk, mtime, uuid, element, md5 in query.iterall():
+        elements.setdefault(element, []).append((pk, uuid, md5))
+        members.append((pk, mtime))
+    if not elements:
+        raise NotExistent(f"No UPF family named {family} found.")
+
+    _CACHE[family] = (_hash_members(members), elements)
+    return {element: tuple(rows) for element, rows in elements.items()}
+
+
+def get_pseudos_from_family(structure, family):
+    """Return the pseudos of the kinds of a structure from a family, like `get_pseudos_from_structure` of AiiDA.
+
+    :returns: dictionary mapping each kind name onto its `UpfData` node
+    :raises NotExistent: if the family has no pseudo for the element of a kind
+    :raises MultipleObjectsError: if the family has more than one pseudo for the element of a kind
+    """
+    elements = get_family_map(family)
+    pseudos = {}
+    for kind in structure.kinds:
+        rows = elements.get(kind.symbol, ())
+        if not rows:
+            raise NotExistent(
+                f"No UPF for element {kind.symbol} found in family {family}."
+            )
+        if len(rows) > 1:
+            raise MultipleObjectsError(
+                f"More than one UPF for element {kind.symbol} found in family {family}."
+            )
+        pseudos[kind.name] = orm.load_node(rows[0][0])
+    return pseudos
+
+
+def get_cache_statistics():
+    """Return the number of cache hits and misses of `get_family_map` in the current process."""
+    return dict(_STATISTICS)
+
+
+def format_cache_statistics():
+    """Return the cache statistics as a sentence for the report of a work chain."""
+    return "pseudo family cache of this worker: {hits} hits, {misses} misses".format(
+        **_STATISTICS
+    )
+
+
+def clear_cache():
+    """Empty the process-local cache of the families and reset its statistics."""
+    _CACHE.clear()
+    _STATISTICS.update(hits=0, misses=0)
@@ -0,0 +1,155 @@
+"""Opt-in timing of the stages of the calculations and work chains, recorded in the extras of their nodes.
+
+Timing is enabled by the `AIIDA_ABACUS_TIMING` environment variable, which has to be set for the daemon, i.e. before
+`verdi daemon start`. The wall-clock durations in seconds are accumulated per stage in the `abacus_timing` extra of
+the process node, and the end of every stage as a UNIX timestamp in the `abacus_timing_timestamps` extra. The
+stages of a calculation job that run in the engine, from the upload to the retrieval, are derived from the node by
+the parser with `get_job_stages`. Use `aiida-abacus profile` to aggregate the timings over a process tree or a group.
+"""
+
+import contextlib
+import functools
+import os
+import time
+
+TIMING_EXTRA = "abacus_timing"
+TIMESTAMPS_EXTRA = "abacus_timing_timestamps"
+TIMING_ENVIRONMENT_VARIABLE = "AIIDA_ABACUS_TIMING"
+
+# The resource that bounds every stage. Stages that contain other stages, like `setup`, are not counted in the totals
+STAGE_CATEGORIES = {
+    "parameters": "database",
+    "primitive": "database",
+    "kpoints": "database",
+    "pseudos": "database",
+    "submit": "database",
+    "inspect": "database",
+    "prepare_for_submission": "database",
+    "parse": "database",
+    "upload": "transport",
+    "retrieve": "transport",
+    "queue": "cluster",
+    "execution": "cluster",
+}
+
+
+def is_enabled():
+    """Return whether timing is enabled in this interpreter."""
+    value = os.environ.get(TIMING_ENVIRONMENT_VARIABLE, "")
+    return value.lower() not in ("", "0", "false", "no")
+
+
+def record_stages(node, durations, timestamp=None):
+    """Add durations to the timing extra of a node, which must be stored.
+
+    :param node: the process node
+    :param durations: mapping of stage names onto seconds, added to the durations already recorded
+    :param timestamp: if given, the UNIX time at which the stages ended
+    """
+    if not node.is_stored or not durations:
+        return
+    timing = node.get_extra(TIMING_EXTRA, {})
+    for stage, seconds in durations.items():
+        timing[stage] = timing.get(stage, 0.0) + seconds
+    node.set_extra(TIMING_EXTRA, timing)
+    if timestamp is not None:
+        timestamps = node.get_extra(TIMESTAMPS_EXTRA, {})
+        timestamps.update(dict.fromkeys(durations, timestamp))
+        node.set_extra(TIMESTAMPS_EXTRA, timestamps)
+
+
+@contextlib.contextmanager
+def timed_stage(node, stage):
+    """Context manager that records the duration of the block as a stage of the node, if timing is enabled."""
+    if not is_enabled():
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stages(
+            node, {stage: time.perf_counter() - start}, timestamp=time.time()
+        )
+
+
+def timed(stage):
+    """Decorator of the methods of a process that records their duration as a stage of the process node."""
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with timed_stage(self.node, stage):
+                return method(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def get_job_stages(node, execution_seconds=None):
+    """Derive the durations of the stages of a calculation job that run in the engine, while it is being parsed.
+
+    * `upload`: from the end of `prepare_for_submission` to the creation of the remote folder
+    * `execution`: the given wall time of the code, or the one reported by the scheduler
+    * `queue`: the wait reported by the scheduler, otherwise the time from the upload to the last scheduler check
+      minus the execution, which includes the submission and the polling interval
+    * `retrieve`: from the last scheduler check, which found the job done, to the creation of the retrieved folder
+
+    :param node: the `CalcJobNode`
+    :param execution_seconds: the wall time of the code, if known
+    :returns: mapping of stage names onto seconds, for the stages that could be derived
+    """
+    stages = {}
+    prepared = node.get_extra(TIMESTAMPS_EXTRA, {}).get(
+        "prepare_for_submission"
+    )
+    remote_folder = node.get_outgoing(
+        link_label_filter="remote_folder"
+    ).first()
+    uploaded = None
+    if remote_folder is not None:
+        uploaded = remote_folder.node.ctime.timestamp()
+        if prepared is not None:
+            stages["upload"] = max(0.0, uploaded - prepared)
+
+    job_info = node.get_last_job_info()
+    if execution_seconds is None and job_info is not None:
+        execution_seconds = getattr(job_info, "wallclock_time_seconds", None)
+    if execution_seconds is not None:
+        stages["execution"] = float(execution_seconds)
+
+    submitted = getattr(job_info, "submission_time", None)
+    dispatched = getattr(job_info, "dispatch_time", None)
+    last_check = node.get_scheduler_lastchecktime()
+    if submitted is not None and dispatched is not None:
+        stages["queue"] = max(0.0, (dispatched - submitted).total_seconds())
+    elif None not in (uploaded, last_check, execution_seconds):
+        stages["queue"] = max(
+            0.0, last_check.timestamp() - uploaded - execution_seconds
+        )
+
+    retrieved = node.get_outgoing(link_label_filter="retrieved").first()
+    if retrieved is not None and last_check is not None:
+        stages["retrieve"] = max(
+            0.0, retrieved.node.ctime.timestamp() - last_check.timestamp()
+        )
+    return stages
+
+
+def aggregate_timings(timings):
+    """Aggregate the timing extras of many nodes.
+
+    :param timings: iterable of the timing extras, i.e. mappings of stage names onto seconds
+    :returns: tuple of a mapping of every stage onto its count, total and maximum in seconds, and a mapping of every
+        category of `STAGE_CATEGORIES` onto its total in seconds
+    """
+    stages = {}
+    categories = dict.fromkeys(sorted(set(STAGE_CATEGORIES.values())), 0.0)
+    for timing in timings:
+        for stage, seconds in timing.items():
+            count, total, maximum = stages.get(stage, (0, 0.0, 0.0))
+            stages[stage] = (count + 1, total + seconds, max(maximum, seconds))
+            if stage in STAGE_CATEGORIES:
+                categories[STAGE_CATEGORIES[stage]] += seconds
+    return stages, categories
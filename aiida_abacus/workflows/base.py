@@ -0,0 +1,285 @@
+from aiida import orm
+from aiida.common import AttributeDict
+from aiida.engine import (
+    BaseRestartWorkChain,
+    ProcessHandlerReport,
+    process_handler,
+    while_,
+)
+from aiida.plugins.factories import CalculationFactory
+
+BaseCalculation = CalculationFactory("abacus.base")
+
+
+class BaseWorkChain(BaseRestartWorkChain):
+    """Workchain to run a `BaseCalculation` and restart it after transient failures.
+
+    Runs that were interrupted or did not converge are resumed from the last ionic step, SCF non-convergence is
+    handled by lowering `mixing_beta` and out-of-memory errors by spreading the calculation over more processes, up to
+    `max_num_machines` machines. Pseudos that are missing from the cache of the computer are uploaded instead.
+    """
+
+    _process_class = BaseCalculation
+
+    # Factor applied to `mixing_beta` after every SCF non-convergence, and its lower bound
+    _MIXING_BETA_DEFAULT = 0.7
+    _MIXING_BETA_FACTOR = 0.8
+    _MIXING_BETA_MINIMUM = 0.05
+    # Number of molecular dynamics steps of ABACUS if `md_nstep` is not set
+    _MD_NSTEP_DEFAULT = 10
+
+    @classmethod
+    def define(cls, spec):
+        """Define the process specification."""
+        super().define(spec)
+        spec.expose_inputs(
+            BaseCalculation,
+            namespace="abacus",
+            namespace_options={"help": "Inputs for the `BaseCalculation`."},
+        )
+        spec.input(
+            "max_num_machines",
+            valid_type=orm.Int,
+            required=False,
+            help="The maximum number of machines that out-of-memory errors are handled with, unlimited if not set.",
+        )
+        spec.outline(
+            cls.setup,
+            while_(cls.should_run_process)(
+                cls.run_process,
+                cls.inspect_process,
+            ),
+            cls.results,
+        )
+        spec.expose_outputs(BaseCalculation)
+        spec.exit_code(
+            300,
+            "ERROR_UNRECOVERABLE_FAILURE",
+            message="The calculation failed with an unrecoverable error.",
+        )
+
+    def setup(self):
+        """Prepare the inputs of the first calculation.
+
+        The parameters are kept as a plain dictionary, so that the handlers can change them between restarts. Molecular
+        dynamics write their restart files at every dumped step, so that a restart continues from the last step in the
+        trajectory.
+        """
+        super().setup()
+        self.ctx.inputs = AttributeDict(
+            self.exposed_inputs(BaseCalculation, "abacus")
+        )
+        parameters = self.ctx.inputs.parameters.get_dict()
+        self.ctx.inputs.parameters = parameters
+        if parameters.get("calculation") == "md":
+            self.ctx.md_nstep = int(
+                parameters.get("md_nstep", self._MD_NSTEP_DEFAULT)
+            )
+            parameters.setdefault(
+                "md_restartfreq", parameters.get("md_dumpfreq", 1)
+            )
+
+    def restart_from_last_step(self, node):
+        """Start the next calculation from the last ionic step of `node`, if it printed one.
+
+        The charge density is read from the `remote_folder` of `node`. Molecular dynamics continue from the MD restart
+        files of `node`, with the velocities of its last step, for the remaining steps.
+
+        :returns: whether the structure was updated
+        """
+        if "output_structure" not in node.outputs:
+            return False
+        self.ctx.inputs.structure = node.outputs.output_structure
+        if "remote_folder" in node.outputs:
+            self.ctx.inputs.parent_folder = node.outputs.remote_folder
+            self.ctx.inputs.parameters["init_chg"] = "file"
+            if self.ctx.inputs.parameters.get("calculation") == "md":
+                self.restart_md(node)
+        return True
+
+    def restart_md(self, node):
+        """Continue the molecular dynamics of `node` with `md_restart`, reducing `md_nstep` to the remaining steps.
+
+        ABACUS numbers the steps of a restarted run from the step it restarts from, so the last step in the trajectory
+        of `node` is the number of completed steps of the whole run.
+        """
+        if "output_trajectory" not in node.outputs:
+            return
+        trajectory = node.outputs.output_trajectory
+        try:
+            completed = int(trajectory.get_stepids()[-1])
+        except KeyError:
+            completed = trajectory.numsteps - 1
+
+        parameters = self.ctx.inputs.parameters
+        parameters["md_nstep"] = max(1, self.ctx.md_nstep - completed)
+        parameters["md_restart"] = 1
+
+    @process_handler(
+        priority=800,
+        exit_codes=[BaseCalculation.exit_codes.ERROR_PSEUDO_CACHE_MISSING],
+    )
+    def handle_pseudo_cache_missing(self, node):
+        """Run the calculation again with its pseudos uploaded, since their files in the cache failed the check.
+
+        The cache is left to `aiida-abacus pseudo-cache stage`, the work chain does not open a transport itself.
+        """
+        settings = self.ctx.inputs.settings.get_dict()
+        settings.pop("PSEUDO_CACHE", None)
+        self.ctx.inputs.settings = orm.Dict(dict=settings)
+        self.report_error_handled(
+            node, "uploading the pseudos with the calculation"
+        )
+        return ProcessHandlerReport(True)
+
+    @process_handler(priority=700)
+    def handle_stopped_restartable(self, node):
+        """Continue a calculation that ABACUS stopped before the walltime, if it completed an ionic step.
+
+        The calculation finished successfully, so the handler is called for every successful calculation and only acts
+        on those whose `output_parameters` report the stop.
+        """
+        if not node.is_finished_ok or "output_parameters" not in node.outputs:
+            return None
+        if not node.outputs.output_parameters.get_dict().get(
+            "stopped_restartable", False
+        ):
+            return None
+
+        if self.restart_from_last_step(node):
+            self.report(
+                f"{node.process_label}<{node.pk}> was stopped before the walltime, continuing from the last ionic "
+                "step"
+            )
+            return ProcessHandlerReport(True)
+
+        self.report(
+            f"{node.process_label}<{node.pk}> was stopped before the walltime without completing an ionic step, "
+            "cannot continue: increase the walltime"
+        )
+        return ProcessHandlerReport(
+            True, self.exit_codes.ERROR_UNRECOVERABLE_FAILURE
+        )
+
+    @process_handler(
+        priority=600,
+        exit_codes=[
+            BaseCalculation.exit_codes.ERROR_OUTPUT_STDOUT_INCOMPLETE,
+        ],
+    )
+    def handle_out_of_walltime(self, node):
+        """Resume an interrupted calculation, e.g. killed at the walltime, from its last ionic step."""
+        if self.restart_from_last_step(node):
+            self.report_error_handled(
+                node, "restarting from the last ionic step"
+            )
+            return ProcessHandlerReport(True)
+
+        self.report_error_handled(
+            node, "no ionic step was completed, cannot resume"
+        )
+        return ProcessHandlerReport(
+            True, self.exit_codes.ERROR_UNRECOVERABLE_FAILURE
+        )
+
+    @process_handler(
+        priority=500,
+        exit_codes=[BaseCalculation.exit_codes.ERROR_OUT_OF_MEMORY],
+    )
+    def handle_out_of_memory(self, node):
+        """Spread the memory over more processes.
+
+        Every k-point pool holds a copy of the wavefunctions of its k-points, so `kpar` is halved first. Once there is
+        a single pool the number of machines is doubled, up to `max_num_machines`. The next calculation records the
+        new layout in its `abacus_parallelization` extra.
+        """
+        parameters = self.ctx.inputs.parameters
+        kpar = int(parameters.get("kpar", 1))
+        if kpar > 1:
+            parameters["kpar"] = kpar // 2
+            action = f"reduced kpar to {parameters['kpar']}"
+        else:
+            options = self.ctx.inputs.metadata.options
+            resources = dict(options["resources"])
+            num_machines = resources.get("num_machines", 1)
+            max_num_machines = (
+                self.inputs.max_num_machines.value
+                if "max_num_machines" in self.inputs
+                else None
+            )
+            if (
+                max_num_machines is not None
+                and num_machines >= max_num_machines
+            ):
+                self.report_error_handled(
+                    node,
+                    f"already running on the maximum of {max_num_machines} machines, giving up",
+                )
+                return ProcessHandlerReport(
+                    True, self.exit_codes.ERROR_UNRECOVERABLE_FAILURE
+                )
+            resources["num_machines"] = 2 * num_machines
+            if max_num_machines is not None:
+                resources["num_machines"] = min(
+                    resources["num_machines"], max_num_machines
+                )
+            options["resources"] = resources
+            action = f"increased num_machines to {resources['num_machines']}"
+
+        self.restart_from_last_step(node)
+        self.report_error_handled(node, action)
+        return ProcessHandlerReport(True)
+
+    @process_handler(
+        priority=410,
+        exit_codes=[
+            BaseCalculation.exit_codes.ERROR_ELECTRONIC_CONVERGENCE_NOT_REACHED,
+        ],
+    )
+    def handle_electronic_convergence_not_reached(self, node):
+        """Reduce `mixing_beta` and restart from the last ionic step."""
+        parameters = self.ctx.inputs.parameters
+        mixing_beta = float(
+            parameters.get("mixing_beta", self._MIXING_BETA_DEFAULT)
+        )
+        if mixing_beta <= self._MIXING_BETA_MINIMUM:
+            self.report_error_handled(
+                node, f"mixing_beta is already at {mixing_beta}, giving up"
+            )
+            return ProcessHandlerReport(
+                True, self.exit_codes.ERROR_UNRECOVERABLE_FAILURE
+            )
+
+        parameters["mixing_beta"] = max(
+            self._MIXING_BETA_MINIMUM, mixing_beta * self._MIXING_BETA_FACTOR
+        )
+        self.restart_from_last_step(node)
+        self.report_error_handled(
+            node, f"reduced mixing_beta to {parameters['mixing_beta']:.3f}"
+        )
+        return ProcessHandlerReport(True)
+
+    @process_handler(
+        priority=400,
+        exit_codes=[
+            BaseCalculation.exit_codes.ERROR_IONIC_CONVERGENCE_NOT_REACHED,
+        ],
+    )
+    def handle_ionic_convergence_not_reached(self, node):
+        """Continue the relaxation from the last ionic step."""
+        if self.restart_from_last_step(node):
+            self.report_error_handled(
+                node, "restarting from the last ionic step"
+            )
+            return ProcessHandlerReport(True)
+        return ProcessHandlerReport(
+            True, self.exit_codes.ERROR_UNRECOVERABLE_FAILURE
+        )
+
+    def report_error_handled(self, calculation, action):
+        """Report an action taken for a calculation that has failed."""
+        self.report(
+            f"{calculation.process_label}<{calculation.pk}> failed with exit status "
+            f"{calculation.exit_status}: {calculation.exit_message}"
+        )
+        self.report(f"Action taken: {action}")
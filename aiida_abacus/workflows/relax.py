@@ -1,17 +1,34 @@
+import numpy as np
+
 from aiida.common import exceptions
 from aiida.common.exceptions import InputValidationError
-from aiida.plugins.factories import CalculationFactory
+from aiida.plugins.factories import CalculationFactory, WorkflowFactory
+from aiida_abacus.calculations.kmesh import VACUUM_THRESHOLD
 from aiida_abacus.data.parameters import AbacusParameters
 from aiida.engine import WorkChain, ToContext, if_, while_, append_
 from aiida.common import AttributeDict
 from aiida import orm
-from aiida.orm.querybuilder import QueryBuilder
-from aiida.orm.nodes.data.upf import get_pseudos_from_structure
 from aiida_abacus.calculations.functions import (
-    create_kpoints_from_distance,
+    get_dimensionality,
+    get_kpoints_from_distance,
+    map_structure_to_original,
+    map_trajectory_to_original,
+    reduce_to_primitive,
+)
+from aiida_abacus.utils import timing
+from aiida_abacus.utils.primitive import get_per_site_settings
+from aiida_abacus.utils.pseudo_family import (
+    format_cache_statistics,
+    get_pseudos_from_family,
+)
+from aiida_abacus.utils.parallelization import (
+    apply_parallelization,
+    get_parallelization,
+    validate_automatic_parallelization,
 )
 
 BaseCalculation = CalculationFactory("abacus.base")
+BaseWorkChain = WorkflowFactory("abacus.base")
 
 
 def validate_inputs(inputs, _):
@@ -29,6 +46,8 @@ class RealxWorkChain(WorkChain):
     """RealxWorkChain AI is creating summary for RealxWorkChain"""
 
     _DEFAULT_RELAX_SCHEMES = ["relax", "cell-relax"]
+    # Relative change of the cell beyond which the k-point mesh is generated again
+    _KPOINTS_CELL_TOLERANCE = 0.01
 
     @classmethod
     def define(cls, spec):
@@ -77,12 +96,55 @@ class RealxWorkChain(WorkChain):
             default=lambda: orm.Int(1),
             help="The maximum number of variable cell relax iterations in the meta convergence cycle.",
         )
+        spec.input(
+            "volume_convergence",
+            valid_type=orm.Float,
+            default=lambda: orm.Float(0.01),
+            help="The relative cell volume difference between two iterations below which the meta convergence cycle "
+            "is considered converged.",
+        )
+        spec.input(
+            "force_convergence",
+            valid_type=orm.Float,
+            default=lambda: orm.Float(0.05),
+            help="The largest atomic force, in eV/Å, of the relaxed structure below which the meta convergence cycle "
+            "is considered converged.",
+        )
         spec.input(
             "system_2d",
             valid_type=orm.Bool,
             default=lambda: orm.Bool(False),
             help="Set the mesh to [x, x, 1]",
         )
+        spec.input(
+            "vacuum_threshold",
+            valid_type=orm.Float,
+            default=lambda: orm.Float(VACUUM_THRESHOLD),
+            help="The widest gap in Å between atomic planes along a periodic direction. Directions with a wider "
+            "vacuum get a single k-point, 0 disables the detection.",
+        )
+        spec.input(
+            "reduce_to_primitive",
+            valid_type=orm.Bool,
+            default=lambda: orm.Bool(False),
+            help="Relax the Niggli-reduced primitive cell of the structure, found with spglib, instead of the "
+            "structure itself. The outputs are mapped back onto the cell and sites of the input structure.",
+        )
+        spec.input(
+            "symmetry_tolerance",
+            valid_type=orm.Float,
+            default=lambda: orm.Float(1e-3),
+            help="The tolerance in Å of the symmetry search of `reduce_to_primitive`.",
+        )
+        spec.input(
+            "automatic_parallelization",
+            valid_type=orm.Dict,
+            required=False,
+            validator=validate_automatic_parallelization,
+            help="Estimate the resources, OpenMP threads, `kpar` and `bndpar` of every calculation from its size, within "
+            "the given limits: `max_num_machines`, `max_mpiprocs_per_machine` (defaults to the computer setting), "
+            "`max_threads_per_mpiproc` and `max_memory_per_machine_mb`.",
+        )
         spec.input(
             "clean_workdir",
             valid_type=orm.Bool,
@@ -105,7 +167,7 @@ class RealxWorkChain(WorkChain):
         spec.exit_code(
             401,
             "ERROR_SUB_PROCESS_FAILED_RELAX",
-            message="the relax BaseCalculation sub process failed",
+            message="the relax BaseWorkChain sub process failed",
         )
         spec.exit_code(
             402,
@@ -118,19 +180,34 @@ class RealxWorkChain(WorkChain):
             required=False,
             help="The successfully relaxed structure.",
         )
+        spec.output(
+            "output_trajectory",
+            valid_type=orm.TrajectoryData,
+            required=False,
+            help="The trajectory of the ionic steps of the last relax calculation.",
+        )
+        spec.output(
+            "dimensionality",
+            valid_type=orm.Int,
+            required=False,
+            help="The number of periodic directions of the input structure that are not separated by vacuum: 3 for a "
+            "bulk, 2 for a slab, 1 for a wire and 0 for a molecule. Not set if the detection is disabled.",
+        )
+        spec.output(
+            "primitive_transformation",
+            valid_type=orm.ArrayData,
+            required=False,
+            help="With `reduce_to_primitive`, the `matrix`, `mapping` and `translations` from the relaxed primitive "
+            "cell to the input structure.",
+        )
 
+    @timing.timed("parameters")
     def get_abacus_paratamters(self):
         name = self.inputs.parameters_name.value
-        qb = QueryBuilder()
-        query_obj = qb.append(AbacusParameters, filters={"extras.name": name})
-        count = query_obj.count()
-        if count != 1:
-            raise ValueError(
-                "Invalid name {} of AbacusParameters Data. Matched {}.".format(
-                    name, count
-                )
-            )
-        self.ctx.parameters = query_obj.first()[0].attributes
+        try:
+            _, self.ctx.parameters = AbacusParameters.resolve(name)
+        except (exceptions.NotExistent, exceptions.MultipleObjectsError) as exc:
+            raise ValueError(str(exc))
         self.ctx.parameters.update(self.inputs.parameters.get_dict())
         self.ctx.parameters = AttributeDict(self.ctx.parameters)
 
@@ -151,35 +228,87 @@ class RealxWorkChain(WorkChain):
         if nbands_factor is not None:
             pass
 
+    @timing.timed("kpoints")
     def generate_kpoints_mesh(self):
-        kpoints_mesh_density = self.ctx.parameters.pop(
-            "kpoints_mesh_density", "0.2"
-        )
-        # TODO: supports offset
-        kpoints_mesh_offset = self.ctx.parameters.pop(
-            "kpoints_mesh_offset", None
-        )
-        kpoints = create_kpoints_from_distance(
-            **{
-                "structure": self.ctx.current_structure,
-                "distance": orm.Float(kpoints_mesh_density),
-                "force_parity": orm.Bool(False),
-                "system_2d": self.inputs.system_2d,
-                "metadata": {"call_link_label": "create_kpoints_from_distance"},
-            }
+        if "kpoints_distance" not in self.ctx:
+            self.ctx.kpoints_distance = float(
+                self.ctx.parameters.pop("kpoints_mesh_density", "0.2")
+            )
+            # TODO: supports offset
+            kpoints_mesh_offset = self.ctx.parameters.pop(
+                "kpoints_mesh_offset", None
+            )
+        # Structures with the same mesh share one `KpointsData` node instead of one calcfunction node each
+        (kpoints,) = get_kpoints_from_distance(
+            [self.ctx.current_structure],
+            self.ctx.kpoints_distance,
+            force_parity=False,
+            system_2d=self.inputs.system_2d.value,
+            vacuum_threshold=self.inputs.vacuum_threshold.value,
         )
         self.ctx.kpoints = kpoints
+        self.ctx.kpoints_cell = self.ctx.current_structure.cell
+
+    def should_generate_kpoints_mesh(self):
+        """Return whether the current cell differs from the one of the k-point mesh beyond the tolerance."""
+        previous = np.array(self.ctx.kpoints_cell)
+        current = np.array(self.ctx.current_structure.cell)
+        change = np.abs(current - previous).max() / np.abs(previous).max()
+        return change > self._KPOINTS_CELL_TOLERANCE
 
+    @timing.timed("setup")
     def setup(self):
         self.ctx.current_number_of_bands = None
+        self.ctx.restart_folder = None
         self.ctx.current_structure = self.inputs.structure
         self.ctx.current_cell_volume = None
         self.ctx.is_converged = False
         self.ctx.iteration = 0
+        if self.inputs.vacuum_threshold.value > 0:
+            self.ctx.dimensionality = get_dimensionality(
+                self.inputs.structure, self.inputs.vacuum_threshold
+            )
+            if self.ctx.dimensionality.value < 3:
+                self.report(
+                    f"detected a {self.ctx.dimensionality.value}D system, using a single k-point along the vacuum"
+                )
+        if self.inputs.reduce_to_primitive.value:
+            self.reduce_structure()
         self.get_abacus_paratamters()
         self.generate_kpoints_mesh()
         self.prepare_for_relax()
 
+    @timing.timed("primitive")
+    def reduce_structure(self):
+        """Relax the primitive cell of the input structure, if it is periodic and spglib finds its symmetry.
+
+        Structures with settings given per site are not reduced, see `aiida_abacus.utils.primitive`.
+        """
+        structure = self.inputs.structure
+        if not all(structure.pbc):
+            self.report("the structure is not periodic, it is not reduced")
+            return
+        per_site = get_per_site_settings(self.inputs.base.settings.get_dict())
+        if per_site:
+            self.report(
+                f"the structure is not reduced, the settings {', '.join(per_site)} are given per site"
+            )
+            return
+
+        results, node = reduce_to_primitive.run_get_node(
+            structure, self.inputs.symmetry_tolerance
+        )
+        if not node.is_finished_ok:
+            self.report(f"the structure is not reduced: {node.exit_message}")
+            return
+
+        self.ctx.transformation = results["transformation"]
+        self.ctx.current_structure = results["primitive_structure"]
+        self.report(
+            f"relaxing the primitive cell of {len(self.ctx.current_structure.sites)} sites instead of "
+            f"{len(structure.sites)} sites"
+        )
+
     def should_run_relax(self):
         return (
             not self.ctx.is_converged
@@ -198,68 +327,159 @@ class RealxWorkChain(WorkChain):
         self.ctx.relax_inputs.kpoints = self.ctx.kpoints
 
         if "pseudo_family" in self.inputs:
-            self.ctx.relax_inputs.pseudos = get_pseudos_from_structure(
-                self.ctx.current_structure, self.inputs.pseudo_family.value
-            )
+            with timing.timed_stage(self.node, "pseudos"):
+                self.ctx.relax_inputs.pseudos = get_pseudos_from_family(
+                    self.ctx.current_structure, self.inputs.pseudo_family.value
+                )
+            self.report(format_cache_statistics())
 
         self.ctx.relax_inputs.parameters = self.ctx.parameters
         self.ctx.relax_inputs.parameters.calculation = calculation
+        # Write the charge density, so that the next iteration can start from it
+        self.ctx.relax_inputs.parameters.setdefault("out_chg", 1)
         self.ctx.relax_inputs.structure = self.ctx.current_structure
 
+    @timing.timed("submit")
     def run_relax(self):
         self.ctx.iteration += 1
-        inputs = self.ctx.relax_inputs
+        if self.ctx.iteration > 1 and self.should_generate_kpoints_mesh():
+            self.generate_kpoints_mesh()
+            self.report(
+                "cell changed beyond the tolerance, generated a new k-point mesh"
+            )
+            self.ctx.relax_inputs.kpoints = self.ctx.kpoints
+
+        inputs = AttributeDict(self.ctx.relax_inputs)
+        inputs.parameters = dict(self.ctx.relax_inputs.parameters)
         inputs.structure = self.ctx.current_structure
         if self.ctx.current_number_of_bands is not None:
             inputs.parameters["nbnd"] = self.ctx.current_number_of_bands
-
-        # Set the `CALL` link label
-        inputs.metadata.call_link_label = f"iteration_{self.ctx.iteration:02d}"
+        if self.ctx.restart_folder is not None:
+            inputs.parent_folder = self.ctx.restart_folder
+
+        layout = None
+        limits = {}
+        if "automatic_parallelization" in self.inputs:
+            layout = get_parallelization(
+                inputs.structure,
+                inputs.parameters,
+                inputs.kpoints,
+                inputs.pseudos,
+                inputs.code.computer,
+                self.inputs.automatic_parallelization.get_dict(),
+            )
+            apply_parallelization(inputs, inputs.parameters, layout)
+            # Out-of-memory errors are not handled with more machines than the layout may use
+            limits["max_num_machines"] = orm.Int(
+                self.inputs.automatic_parallelization.get_dict().get(
+                    "max_num_machines", 1
+                )
+            )
 
         inputs.parameters = orm.Dict(dict=inputs.parameters)
 
-        running = self.submit(BaseCalculation, **inputs)
+        # Failed calculations are restarted by the `BaseWorkChain` instead of failing the whole relaxation
+        running = self.submit(
+            BaseWorkChain,
+            abacus=inputs,
+            **limits,
+            metadata={
+                # Set the `CALL` link label
+                "call_link_label": f"iteration_{self.ctx.iteration:02d}"
+            },
+        )
 
-        self.report(f"launching BaseCalculation<{running.pk}>")
+        self.report(f"launching BaseWorkChain<{running.pk}>")
+        if layout is not None:
+            self.report(
+                "parallelization: {num_machines} machines x {num_mpiprocs_per_machine} MPI x "
+                "{num_threads_per_mpiproc} OpenMP, kpar={kpar}, bndpar={bndpar}".format(**layout)
+            )
 
         return ToContext(workchains=append_(running))
 
+    @timing.timed("inspect")
     def inspect_relax(self):
-        """Inspect the results of the last `BaseCalculation`.
+        """Inspect the results of the last `BaseWorkChain`.
 
-        Compare the cell volume of the relaxed structure of the last completed workchain with the previous. If the
-        difference ratio is less than the volume convergence threshold we consider the cell relaxation converged.
+        Compare the cell volume of the relaxed structure of the last completed workchain with the one of its input
+        structure. If the difference ratio is less than the volume convergence threshold and the largest force is below
+        the force convergence threshold we consider the cell relaxation converged.
         """
         workchain = self.ctx.workchains[-1]
 
         if workchain.is_excepted or workchain.is_killed:
-            self.report("relax BaseCalculation was excepted or killed")
+            self.report("relax BaseWorkChain was excepted or killed")
             return self.exit_codes.ERROR_SUB_PROCESS_FAILED_RELAX
 
         if workchain.is_failed:
             self.report(
-                f"relax BaseCalculation failed with exit status {workchain.exit_status}"
+                f"relax BaseWorkChain failed with exit status {workchain.exit_status}"
+            )
+            return self.exit_codes.ERROR_SUB_PROCESS_FAILED_RELAX
+
+        try:
+            structure = workchain.outputs.output_structure
+        except exceptions.NotExistent:
+            self.report(
+                "`cell-relax` or `relax` BaseWorkChain finished successfully but without output structure"
             )
             return self.exit_codes.ERROR_SUB_PROCESS_FAILED_RELAX
 
-        # try:
-        #     structure = workchain.outputs.output_structure
-        # except exceptions.NotExistent:
-        #     self.report(
-        #         "`cell-relax` or `relax` BaseCalculation finished successfully but without output structure"
-        #     )
-        #     return self.exit_codes.ERROR_SUB_PROCESS_FAILED_RELAX
+        self.ctx.output_structure = structure
+        # Start the next iteration from the charge density and wavefunctions of this one
+        self.ctx.restart_folder = workchain.outputs.remote_folder
+        if "output_trajectory" in workchain.outputs:
+            self.ctx.output_trajectory = workchain.outputs.output_trajectory
+
+        output_parameters = workchain.outputs.output_parameters.get_dict()
+        prev_cell_volume = self.ctx.current_structure.get_cell_volume()
+        curr_cell_volume = structure.get_cell_volume()
+        volume_change = abs(prev_cell_volume - curr_cell_volume) / prev_cell_volume
+        max_force = output_parameters.get("max_force")
 
         # Set relaxed structure as input structure for next iteration
-        # self.ctx.current_structure = structure
-        # self.ctx.current_number_of_bands = (
-        #     workchain.outputs.output_parameters.get_dict()["number_of_bands"]
-        # )
+        self.ctx.current_structure = structure
+        self.ctx.current_cell_volume = curr_cell_volume
+        self.ctx.current_number_of_bands = output_parameters.get(
+            "number_of_bands"
+        )
+
+        volume_converged = volume_change < self.inputs.volume_convergence.value
+        force_converged = (
+            max_force is None or max_force < self.inputs.force_convergence.value
+        )
+        self.report(
+            f"iteration {self.ctx.iteration}: relative volume change {volume_change:.4e}, "
+            f"max force {max_force} eV/Angstrom"
+        )
+        if volume_converged and force_converged:
+            self.report("meta convergence reached")
+            self.ctx.is_converged = True
 
     def results(self):
         self.report(
             f"workchain completed after {self.ctx.iteration} iterations"
         )
+        if "dimensionality" in self.ctx:
+            self.out("dimensionality", self.ctx.dimensionality)
+        if "transformation" in self.ctx:
+            # Map the outputs of the primitive cell back onto the input structure
+            self.out("primitive_transformation", self.ctx.transformation)
+            for name, function in (
+                ("output_structure", map_structure_to_original),
+                ("output_trajectory", map_trajectory_to_original),
+            ):
+                if name in self.ctx:
+                    self.ctx[name] = function(
+                        self.ctx[name],
+                        self.ctx.transformation,
+                        self.inputs.structure,
+                    )
+        if "output_structure" in self.ctx:
+            self.out("output_structure", self.ctx.output_structure)
+        if "output_trajectory" in self.ctx:
+            self.out("output_trajectory", self.ctx.output_trajectory)
 
     def on_terminated(self):
         """Clean the working directories of all child calculations if `clean_workdir=True` in the inputs."""
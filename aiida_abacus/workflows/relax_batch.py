@@ -0,0 +1,368 @@
+from aiida import orm
+from aiida.common import AttributeDict, exceptions
+from aiida.engine import ToContext, WorkChain, append_, while_
+from aiida.plugins.factories import CalculationFactory, WorkflowFactory
+from aiida_abacus.calculations.functions import get_kpoints_from_distance
+from aiida_abacus.calculations.kmesh import VACUUM_THRESHOLD
+from aiida_abacus.data.parameters import AbacusParameters
+from aiida_abacus.utils import timing
+from aiida_abacus.utils.pseudo_family import (
+    format_cache_statistics,
+    get_pseudos_from_family,
+)
+from aiida_abacus.utils.parallelization import (
+    apply_parallelization,
+    get_parallelization,
+    validate_automatic_parallelization,
+)
+
+BaseCalculation = CalculationFactory("abacus.base")
+BaseWorkChain = WorkflowFactory("abacus.base")
+
+
+def validate_inputs(inputs, _):
+    if ("structures" in inputs) == ("structure_group" in inputs):
+        return "You have to specify either structures or structure_group."
+    if "pseudo_family" not in inputs and "pseudos" not in inputs["base"]:
+        return "You have to specifiy pseudo_family or pseudos."
+    if "pseudo_family" in inputs and "pseudos" in inputs["base"]:
+        return "You can only specifiy pseudo_family or pseudos."
+    return None
+
+
+class RelaxBatchWorkChain(WorkChain):
+    """Relax many structures with `BaseWorkChain`s, keeping at most `max_concurrent` of them running at once.
+
+    The parameters, pseudos and k-point meshes are resolved once and shared by all calculations, which are restarted
+    by their `BaseWorkChain` after transient failures. Every step waits for the oldest running work chain, then
+    collects all the ones that terminated in the meantime and submits new ones to fill the free slots, so thousands
+    of structures go through a single work chain without waiting for a whole batch to finish.
+    """
+
+    _DEFAULT_RELAX_SCHEMES = ["relax", "cell-relax"]
+
+    @classmethod
+    def define(cls, spec):
+        """Define the process specification."""
+        super().define(spec)
+        spec.expose_inputs(
+            BaseCalculation,
+            namespace="base",
+            exclude=(
+                "clean_workdir",
+                "structure",
+                "parent_folder",
+                "kpoints",
+                "parameters",
+            ),
+            namespace_options={
+                "help": "Inputs shared by the `BaseCalculation` of every structure."
+            },
+        )
+        spec.input_namespace(
+            "structures",
+            valid_type=orm.StructureData,
+            dynamic=True,
+            required=False,
+            help="The structures to relax, the keys are used as labels of the calculations and outputs.",
+        )
+        spec.input(
+            "structure_group",
+            valid_type=orm.Str,
+            required=False,
+            help="An alternative to `structures`: the label of a group whose `StructureData` nodes are relaxed.",
+        )
+        spec.input(
+            "parameters_name",
+            valid_type=orm.Str,
+            help="The name of Data AbacusParameters. Use `verdi data abacus list` to show available parameters.",
+        )
+        spec.input(
+            "parameters",
+            valid_type=orm.Dict,
+            default=lambda: orm.Dict(dict={}),
+            help="Override parameters in AbacusPatameters.",
+        )
+        spec.input(
+            "pseudo_family",
+            valid_type=orm.Str,
+            required=False,
+            help="The name of an existing pseudo potential family, used to select the pseudos of every structure.",
+        )
+        spec.input(
+            "system_2d",
+            valid_type=orm.Bool,
+            default=lambda: orm.Bool(False),
+            help="Set the mesh to [x, x, 1]",
+        )
+        spec.input(
+            "vacuum_threshold",
+            valid_type=orm.Float,
+            default=lambda: orm.Float(VACUUM_THRESHOLD),
+            help="The widest gap in Å between atomic planes along a periodic direction. Directions with a wider "
+            "vacuum get a single k-point, 0 disables the detection.",
+        )
+        spec.input(
+            "max_concurrent",
+            valid_type=orm.Int,
+            default=lambda: orm.Int(10),
+            help="The maximum number of calculations running at the same time.",
+        )
+        spec.input(
+            "automatic_parallelization",
+            valid_type=orm.Dict,
+            required=False,
+            validator=validate_automatic_parallelization,
+            help="Limits of the automatic parallelization, see `RealxWorkChain`.",
+        )
+        spec.input(
+            "clean_workdir",
+            valid_type=orm.Bool,
+            default=lambda: orm.Bool(False),
+            help="If `True`, work directories of all called calculation will be cleaned at the end of execution.",
+        )
+        spec.inputs.validator = validate_inputs
+        spec.outline(
+            cls.setup,
+            while_(cls.should_continue)(
+                cls.submit_workchains,
+                cls.inspect_workchains,
+            ),
+            cls.results,
+        )
+        spec.output_namespace(
+            "output_structures",
+            valid_type=orm.StructureData,
+            dynamic=True,
+            required=False,
+            help="The relaxed structures, with the keys of the input structures.",
+        )
+        spec.exit_code(
+            401,
+            "ERROR_SUB_PROCESS_FAILED_RELAX",
+            message="at least one of the relax BaseWorkChain sub processes failed",
+        )
+        spec.exit_code(
+            402,
+            "ERROR_NO_STRUCTURES",
+            message="there are no structures to relax",
+        )
+
+    def get_structures(self):
+        """Return the structures to relax as a dictionary of link-label-safe keys onto nodes."""
+        if "structures" in self.inputs:
+            return dict(self.inputs.structures)
+
+        group = orm.load_group(self.inputs.structure_group.value)
+        qb = orm.QueryBuilder()
+        qb.append(orm.Group, filters={"id": group.pk}, tag="group")
+        qb.append(orm.StructureData, with_group="group", project="*")
+        qb.order_by({orm.StructureData: "id"})
+        return {
+            f"structure_{structure.pk}": structure
+            for structure, in qb.iterall()
+        }
+
+    @timing.timed("setup")
+    def setup(self):
+        structures = self.get_structures()
+        if not structures:
+            return self.exit_codes.ERROR_NO_STRUCTURES
+
+        name = self.inputs.parameters_name.value
+        try:
+            _, parameters = AbacusParameters.resolve(name)
+        except (
+            exceptions.NotExistent,
+            exceptions.MultipleObjectsError,
+        ) as exc:
+            raise ValueError(str(exc))
+        parameters.update(self.inputs.parameters.get_dict())
+        kpoints_distance = float(parameters.pop("kpoints_mesh_density", "0.2"))
+        parameters.pop("kpoints_mesh_offset", None)
+        if parameters.get("calculation") not in self._DEFAULT_RELAX_SCHEMES:
+            parameters["calculation"] = "relax"
+        self.ctx.parameters = parameters
+        # A single stored node is shared by all calculations, unless automatic parallelization changes it
+        self.ctx.parameters_pk = orm.Dict(dict=parameters).store().pk
+
+        # All meshes are computed in one batch, structures with the same mesh share one `KpointsData`
+        keys = list(structures)
+        with timing.timed_stage(self.node, "kpoints"):
+            kpoints = get_kpoints_from_distance(
+                [structures[key] for key in keys],
+                kpoints_distance,
+                force_parity=False,
+                system_2d=self.inputs.system_2d.value,
+                vacuum_threshold=self.inputs.vacuum_threshold.value,
+            )
+
+        self.ctx.structures = {key: structures[key].pk for key in keys}
+        self.ctx.kpoints = {key: node.pk for key, node in zip(keys, kpoints)}
+        self.ctx.pseudos = {}
+        self.ctx.pending = keys
+        self.ctx.running = []
+        self.ctx.finished = {}
+        self.ctx.failed = []
+        self.report(
+            f"relaxing {len(keys)} structures with at most {self.inputs.max_concurrent.value} concurrent calculations"
+        )
+
+    def should_continue(self):
+        return bool(self.ctx.pending or self.ctx.running)
+
+    def get_pseudos(self, structure):
+        """Return the pseudos of a structure, selecting them from the family once per set of kinds."""
+        signature = ",".join(
+            sorted(f"{kind.name}:{kind.symbol}" for kind in structure.kinds)
+        )
+        if signature not in self.ctx.pseudos:
+            with timing.timed_stage(self.node, "pseudos"):
+                pseudos = get_pseudos_from_family(
+                    structure, self.inputs.pseudo_family.value
+                )
+            self.report(format_cache_statistics())
+            self.ctx.pseudos[signature] = {
+                kind_name: pseudo.pk for kind_name, pseudo in pseudos.items()
+            }
+        return {
+            kind_name: orm.load_node(pk)
+            for kind_name, pk in self.ctx.pseudos[signature].items()
+        }
+
+    def get_inputs(self, key):
+        """Return the inputs of the `BaseCalculation` of the structure with the given key.
+
+        :returns: tuple of the inputs and the parallelization layout, or None without automatic parallelization
+        """
+        inputs = AttributeDict(
+            self.exposed_inputs(BaseCalculation, namespace="base")
+        )
+        inputs.structure = orm.load_node(self.ctx.structures[key])
+        inputs.kpoints = orm.load_node(self.ctx.kpoints[key])
+        if "pseudo_family" in self.inputs:
+            inputs.pseudos = self.get_pseudos(inputs.structure)
+
+        layout = None
+        if "automatic_parallelization" in self.inputs:
+            parameters = dict(self.ctx.parameters)
+            layout = get_parallelization(
+                inputs.structure,
+                parameters,
+                inputs.kpoints,
+                inputs.pseudos,
+                inputs.code.computer,
+                self.inputs.automatic_parallelization.get_dict(),
+            )
+            apply_parallelization(inputs, parameters, layout)
+            inputs.parameters = orm.Dict(dict=parameters)
+        else:
+            inputs.parameters = orm.load_node(self.ctx.parameters_pk)
+        return inputs, layout
+
+    @timing.timed("submit")
+    def submit_workchains(self):
+        """Fill the free slots with new work chains and wait until the oldest running one terminates."""
+        while (
+            self.ctx.pending
+            and len(self.ctx.running) < self.inputs.max_concurrent.value
+        ):
+            key = self.ctx.pending.pop(0)
+            inputs, layout = self.get_inputs(key)
+            if layout is not None:
+                # Out-of-memory errors are not handled with more machines than the layout may use
+                limits = {
+                    "max_num_machines": orm.Int(
+                        self.inputs.automatic_parallelization.get_dict().get(
+                            "max_num_machines", 1
+                        )
+                    )
+                }
+            else:
+                limits = {}
+            running = self.submit(
+                BaseWorkChain,
+                abacus=inputs,
+                **limits,
+                metadata={"call_link_label": f"relax_{key}"},
+            )
+            self.ctx.running.append([key, running.pk])
+            self.report(f"launching BaseWorkChain<{running.pk}> for {key}")
+
+        # The oldest work chain is the one expected to terminate first, the others are collected with it
+        return ToContext(
+            workchains=append_(orm.load_node(self.ctx.running[0][1]))
+        )
+
+    @timing.timed("inspect")
+    def inspect_workchains(self):
+        """Collect all running work chains that terminated, with a single query."""
+        # The awaited work chain is collected by the query below, the context does not grow with every step
+        self.ctx.workchains = []
+
+        pks = [pk for _, pk in self.ctx.running]
+        qb = orm.QueryBuilder()
+        qb.append(
+            orm.WorkChainNode,
+            filters={
+                "id": {"in": pks},
+                "attributes.process_state": {
+                    "in": ["finished", "excepted", "killed"]
+                },
+            },
+            project="id",
+        )
+        terminated = {pk for pk, in qb.iterall()}
+
+        running = []
+        for key, pk in self.ctx.running:
+            if pk not in terminated:
+                running.append([key, pk])
+                continue
+            node = orm.load_node(pk)
+            if node.is_finished_ok and "output_structure" in node.outputs:
+                self.ctx.finished[key] = node.outputs.output_structure.pk
+            else:
+                self.ctx.failed.append(key)
+                self.report(
+                    f"BaseWorkChain<{pk}> for {key} failed with exit status {node.exit_status}"
+                )
+        self.ctx.running = running
+
+    def results(self):
+        self.report(
+            f"relaxed {len(self.ctx.finished)} structures, {len(self.ctx.failed)} failed"
+        )
+        if self.ctx.finished:
+            self.out(
+                "output_structures",
+                {
+                    key: orm.load_node(pk)
+                    for key, pk in self.ctx.finished.items()
+                },
+            )
+        if self.ctx.failed:
+            return self.exit_codes.ERROR_SUB_PROCESS_FAILED_RELAX
+
+    def on_terminated(self):
+        """Clean the working directories of all child calculations if `clean_workdir=True` in the inputs."""
+        super().on_terminated()
+
+        if self.inputs.clean_workdir.value is False:
+            self.report("remote folders will not be cleaned")
+            return
+
+        cleaned_calcs = []
+
+        for called_descendant in self.node.called_descendants:
+            if isinstance(called_descendant, orm.CalcJobNode):
+                try:
+                    called_descendant.outputs.remote_folder._clean()  # pylint: disable=protected-access
+                    cleaned_calcs.append(called_descendant.pk)
+                except (IOError, OSError, KeyError):
+                    pass
+
+        if cleaned_calcs:
+            self.report(
+                f"cleaned remote folders of calculations: {' '.join(map(str, cleaned_calcs))}"
+            )
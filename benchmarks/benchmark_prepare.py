@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""Benchmark the input generation of `BaseCalculation.prepare_for_submission` for growing structures.
+
+Run with ``python benchmarks/benchmark_prepare.py``. Every structure is prepared with a dry run
+(``metadata.dry_run``), which writes the input files to a sandbox folder without a scheduler or a remote computer.
+The time and the peak python memory of `write_STRU`, `write_KPT` and `write_INPUT` are reported separately.
+
+By default the benchmark runs in a temporary profile, created with the AiiDA test manager like the test fixtures,
+which needs PostgreSQL to be installed (``pip install -e .[testing]``). Use ``--profile`` to run in an existing
+profile instead: only a code, its computer and the pseudos are stored, under the label ``benchmark-prepare``.
+"""
+
+import argparse
+import collections
+import contextlib
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+LABEL = "benchmark-prepare"
+ELEMENTS = ["Si", "O", "Al", "Fe", "Mg", "Ca", "Na", "K", "Ti", "Zn"]
+METHODS = ("write_STRU", "write_KPT", "write_INPUT")
+UPF_TEMPLATE = """<UPF version="2.0.1">
+<PP_HEADER
+element="{element}"
+z_valence="4.0"
+/>
+</UPF>
+"""
+
+
+def get_timed_calculation():
+    """Return a subclass of `BaseCalculation` that records the time and memory of the input writers.
+
+    Timings are appended to `TimedCalculation.records` as ``(method, seconds, peak bytes)``. The memory is traced in
+    a separate call when `TimedCalculation.trace_memory` is True, so that tracing does not slow down the timings.
+    """
+    from aiida_abacus.calculations.base import BaseCalculation
+
+    def timed(name):
+        method = getattr(BaseCalculation, name)
+
+        def wrapper(self, *args, **kwargs):
+            peak = None
+            if self.trace_memory:
+                tracemalloc.start()
+                method(self, *args, **kwargs)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            start = time.perf_counter()
+            result = method(self, *args, **kwargs)
+            self.records.append((name, time.perf_counter() - start, peak))
+            return result
+
+        return wrapper
+
+    attributes = {name: timed(name) for name in METHODS}
+    attributes.update(records=[], trace_memory=False)
+    return type("TimedCalculation", (BaseCalculation,), attributes)
+
+
+def get_code():
+    """Return a code on a local computer with the direct scheduler, creating them the first time."""
+    from aiida import orm
+    from aiida.common import exceptions
+
+    try:
+        return orm.load_code(f"{LABEL}@{LABEL}")
+    except exceptions.NotExistent:
+        pass
+    try:
+        computer = orm.load_computer(LABEL)
+    except exceptions.NotExistent:
+        computer = orm.Computer(
+            label=LABEL,
+            hostname="localhost",
+            transport_type="local",
+            scheduler_type="direct",
+            workdir=tempfile.gettempdir(),
+        ).store()
+        computer.set_minimum_job_poll_interval(0.0)
+        computer.configure()
+    code = orm.Code(
+        input_plugin_name="abacus.base",
+        remote_computer_exec=(computer, "/bin/true"),
+    )
+    code.label = LABEL
+    return code.store()
+
+
+def get_pseudos(elements):
+    """Return stored `UpfData` nodes with a minimal header for the given elements."""
+    from aiida.orm.nodes.data.upf import UpfData
+
+    pseudos = {}
+    with tempfile.TemporaryDirectory() as folder:
+        for element in elements:
+            filepath = os.path.join(folder, f"{element}.upf")
+            with open(filepath, "w", encoding="utf8") as handle:
+                handle.write(UPF_TEMPLATE.format(element=element))
+            pseudos[element], _ = UpfData.get_or_create(filepath)
+    return pseudos
+
+
+def generate_inputs(num_sites, num_kinds, code, pseudos, seed=0):
+    """Return the inputs of a calculation on a random supercell with `num_sites` sites of `num_kinds` kinds.
+
+    Kinds are named ``<element><n>`` and cycle through the elements, every site has `FIXED_COORDS` and every kind an
+    `INITIAL_MAGNETIC` moment.
+    """
+    from aiida import orm
+
+    rng = np.random.default_rng(seed)
+    num_kinds = min(num_kinds, num_sites)
+    kinds = [
+        f"{ELEMENTS[i % len(ELEMENTS)]}{i // len(ELEMENTS) + 1}"
+        for i in range(num_kinds)
+    ]
+    length = max(5.0, (num_sites * 20.0) ** (1 / 3))
+
+    structure = orm.StructureData(cell=np.eye(3) * length)
+    for kind in kinds:
+        structure.append_kind(
+            orm.Kind(name=kind, symbols=kind.rstrip("0123456789"))
+        )
+    kind_indices = np.concatenate(
+        [
+            np.arange(num_kinds),
+            rng.integers(0, num_kinds, num_sites - num_kinds),
+        ]
+    )
+    for kind_index, position in zip(
+        kind_indices, rng.random((num_sites, 3)) * length
+    ):
+        structure.append_site(
+            orm.Site(kind_name=kinds[kind_index], position=position.tolist())
+        )
+
+    kpoints = orm.KpointsData()
+    kpoints.set_kpoints_mesh([2, 2, 2])
+    return {
+        "code": code,
+        "structure": structure,
+        "kpoints": kpoints,
+        "parameters": orm.Dict(
+            dict={"calculation": "scf", "ecutwfc": 50, "nspin": 2}
+        ),
+        "pseudos": {
+            kind: pseudos[kind.rstrip("0123456789")] for kind in kinds
+        },
+        "settings": orm.Dict(
+            dict={
+                "FIXED_COORDS": rng.integers(0, 2, (num_sites, 3)).tolist(),
+                "INITIAL_MAGNETIC": rng.random(num_kinds).round(1).tolist(),
+            }
+        ),
+        "metadata": {
+            "dry_run": True,
+            "store_provenance": False,
+            "options": {"resources": {"num_machines": 1}},
+        },
+    }
+
+
+@contextlib.contextmanager
+def benchmark_profile(profile):
+    """Load the given profile, or create a temporary one with the AiiDA test manager."""
+    if profile:
+        from aiida import load_profile
+
+        load_profile(profile)
+        yield
+        return
+
+    from aiida.manage.tests import test_manager
+
+    with test_manager():
+        yield
+
+
+def run_benchmark(sizes, num_kinds, repeat):
+    """Print the best time and the peak memory of the input writers for every structure size."""
+    from aiida.engine import run
+
+    calculation = get_timed_calculation()
+    code = get_code()
+    pseudos = get_pseudos(ELEMENTS)
+
+    header = " ".join(
+        f"{name + ' (ms)':>18s} {'(MB)':>7s}" for name in METHODS
+    )
+    print(f"{'atoms':>8s} {'kinds':>6s} {header} {'total (ms)':>11s}")
+    for num_sites in sizes:
+        inputs = generate_inputs(num_sites, num_kinds, code, pseudos)
+        calculation.records.clear()
+        for iteration in range(repeat):
+            calculation.trace_memory = iteration == 0
+            run(calculation, **inputs)
+
+        timings = collections.defaultdict(list)
+        memory = {}
+        for name, seconds, peak in calculation.records:
+            timings[name].append(seconds)
+            if peak is not None:
+                memory[name] = peak
+        columns = " ".join(
+            f"{min(timings[name]) * 1e3:18.3f} {memory[name] / 1024**2:7.2f}"
+            for name in METHODS
+        )
+        total = sum(min(timings[name]) for name in METHODS)
+        print(
+            f"{num_sites:8d} {len(inputs['pseudos']):6d} {columns} {total * 1e3:11.3f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[2, 100, 1000, 10000, 50000],
+        help="Number of atoms of the structures to benchmark.",
+    )
+    parser.add_argument(
+        "--kinds",
+        type=int,
+        default=20,
+        help="Number of kinds of the structures.",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--profile",
+        help="Run in this existing profile instead of a temporary one.",
+    )
+    args = parser.parse_args()
+
+    with benchmark_profile(
+        args.profile
+    ), tempfile.TemporaryDirectory() as folder:
+        # The dry runs write their sandbox folders in the working directory
+        cwd = os.getcwd()
+        os.chdir(folder)
+        try:
+            run_benchmark(args.sizes, args.kinds, args.repeat)
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""Benchmark the generation of the ATOMIC_POSITIONS card of the STRU file.
+
+Run with ``python benchmarks/benchmark_stru.py``. The cost per atom should stay flat as the supercell grows.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from aiida_abacus.calculations.stru import (
+    format_atomic_positions,
+    validate_fixed_coords,
+)
+
+KIND_NAMES = ["Si", "O", "Al", "Fe1", "Fe2"]
+
+
+def generate_supercell(num_sites, seed=0):
+    """Return random kind names, positions and fixed coordinates for a supercell with `num_sites` sites."""
+    rng = np.random.default_rng(seed)
+    site_kind_names = rng.choice(KIND_NAMES, size=num_sites)
+    positions = rng.random((num_sites, 3)) * 100.0
+    fixed_coords = rng.integers(0, 2, size=(num_sites, 3)).tolist()
+    return site_kind_names, positions, fixed_coords
+
+
+def time_call(function, repeat, *args):
+    """Return the best wall time out of `repeat` calls of `function`."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def write_positions(site_kind_names, positions, fixed_coords):
+    """Validate the settings and format the card, as done by `BaseCalculation.write_STRU`."""
+    mask = validate_fixed_coords(fixed_coords, len(site_kind_names))
+    magnetic = ["0.0"] * len(KIND_NAMES)
+    return format_atomic_positions(site_kind_names, positions, mask, magnetic)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[100, 1000, 5000, 20000, 50000],
+        help="Number of atoms of the supercells to benchmark.",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'atoms':>10s} {'time (ms)':>12s} {'per atom (us)':>15s}")
+    for num_sites in args.sizes:
+        arrays = generate_supercell(num_sites)
+        elapsed = time_call(write_positions, args.repeat, *arrays)
+        print(
+            f"{num_sites:10d} {elapsed * 1e3:12.3f} {elapsed / num_sites * 1e6:15.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""Tests of the canonical hashing policy of the `BaseCalculation` nodes."""
+
+import pytest
+
+from aiida_abacus.calculations.hashing import (
+    AbacusCalcJobNode,
+    get_canonical_parameters,
+    get_canonical_value,
+)
+
+PARAMETERS = {"calculation": "scf", "ecutwfc": 50, "scf_thr": 1e-8}
+
+
+def get_node_hash(computer, parameters, settings=None, options=None):
+    """Store a calculation node with the given inputs and options, and return its hash."""
+    from aiida import orm
+    from aiida.common.links import LinkType
+
+    node = AbacusCalcJobNode(computer=computer)
+    for name, value in (options or {}).items():
+        node.set_option(name, value)
+    node.add_incoming(
+        orm.Dict(dict=parameters).store(), LinkType.INPUT_CALC, "parameters"
+    )
+    if settings is not None:
+        node.add_incoming(
+            orm.Dict(dict=settings).store(), LinkType.INPUT_CALC, "settings"
+        )
+    node.store()
+    return node.get_hash()
+
+
+@pytest.mark.parametrize("value", (1, 1.0, "1", "1.0e0", " 1.000000000001 "))
+def test_canonical_value_numbers(value):
+    """Numbers are compared by value, whether they are given as integers, floats or strings."""
+    assert get_canonical_value(value) == 1
+    assert isinstance(get_canonical_value(value), int)
+
+
+def test_canonical_parameters():
+    """Keys are lower case and the parameters of the parallelization are dropped."""
+    assert get_canonical_parameters(
+        {"ECUTWFC": "50.0", "kpar": 4, "bndpar": 2, "basis_type": " pw"}
+    ) == {"ecutwfc": 50, "basis_type": "pw"}
+
+
+@pytest.mark.parametrize("value", (1, 1.0, "1", "1.0e0"))
+def test_hash_numbers(aiida_localhost, value):
+    """Parameters that only differ in the type of their numbers hash the same."""
+    assert get_node_hash(
+        aiida_localhost, dict(PARAMETERS, nspin=value)
+    ) == get_node_hash(aiida_localhost, dict(PARAMETERS, nspin=1))
+
+
+def test_hash_ignored(aiida_localhost):
+    """The parallelization, the options of the scheduler and the pseudo cache do not change the hash."""
+    reference = get_node_hash(
+        aiida_localhost,
+        PARAMETERS,
+        options={"resources": {"num_machines": 1}, "withmpi": False},
+    )
+    assert (
+        get_node_hash(
+            aiida_localhost,
+            dict(PARAMETERS, kpar=4, bndpar=2),
+            settings={"PSEUDO_CACHE": True},
+            options={
+                "resources": {"num_machines": 4},
+                "withmpi": True,
+                "prepend_text": "module load abacus",
+                "environment_variables": {"OMP_NUM_THREADS": "4"},
+            },
+        )
+        == reference
+    )
+    assert (
+        get_node_hash(aiida_localhost, dict(PARAMETERS, ecutwfc=60))
+        != reference
+    )
+
+
+def test_hash_missing_settings(aiida_localhost):
+    """A missing `settings` input is equivalent to an empty one, but not to other settings."""
+    reference = get_node_hash(aiida_localhost, PARAMETERS)
+    assert get_node_hash(aiida_localhost, PARAMETERS, settings={}) == reference
+    assert (
+        get_node_hash(
+            aiida_localhost,
+            PARAMETERS,
+            settings={"RETRIEVE_PROFILE": "minimal"},
+        )
+        != reference
+    )
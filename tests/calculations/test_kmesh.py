@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""Tests of the k-point meshes computed for stacks of cells and of the detection of vacuum."""
+
+import numpy as np
+import pytest
+
+from aiida_abacus.calculations import kmesh
+
+
+@pytest.fixture(autouse=True)
+def clear_mesh_cache():
+    """Start every test with an empty cache of meshes."""
+    kmesh.clear_cache()
+    yield
+    kmesh.clear_cache()
+
+
+def test_reciprocal_cells():
+    """The reciprocal vectors are orthogonal to the cell vectors, with the 2π factor."""
+    cells = np.array([np.eye(3) * 4.0, [[3, 0, 0], [1, 3, 0], [0, 1, 5]]])
+    np.testing.assert_allclose(
+        cells @ kmesh.reciprocal_cells(cells).transpose(0, 2, 1),
+        np.broadcast_to(2 * np.pi * np.eye(3), (2, 3, 3)),
+        atol=1e-12,
+    )
+
+
+def test_compute_kpoints_meshes():
+    """The number of k-points is the length of the reciprocal vectors over the distance, rounded up."""
+    cells = np.array([np.diag([4.0, 5.0, 10.0]), np.diag([6.0, 6.0, 6.0])])
+    meshes = kmesh.compute_kpoints_meshes(cells, 0.2)
+    expected = np.ceil(2 * np.pi / np.array([[4, 5, 10], [6, 6, 6]]) / 0.2)
+    np.testing.assert_array_equal(meshes, expected)
+
+    meshes = kmesh.compute_kpoints_meshes(cells, 0.2, force_parity=True)
+    assert (meshes % 2 == 0).all()
+
+    meshes = kmesh.compute_kpoints_meshes(cells, 0.2, system_2d=True)
+    np.testing.assert_array_equal(meshes[:, 2], [1, 1])
+
+
+def test_compute_kpoints_meshes_isotropic():
+    """Cells whose vectors all have the same length get an isotropic mesh, before the non-periodic directions."""
+    cell = np.array([[4.0, 0.0, 0.0], [2.0, 2 * np.sqrt(3), 0.0], [0, 0, 4.0]])
+    (mesh,) = kmesh.compute_kpoints_meshes([cell], 0.3)
+    assert len(set(mesh.tolist())) == 1
+
+    (mesh,) = kmesh.compute_kpoints_meshes(
+        [np.eye(3) * 20.0], 0.05, pbcs=[[True, True, False]]
+    )
+    np.testing.assert_array_equal(mesh, [7, 7, 1])
+
+
+def test_get_kpoints_meshes_cache():
+    """Cells that differ within the rounding share the cached mesh, which agrees with the direct computation."""
+    cell = np.diag([4.0, 5.0, 6.0])
+    cells = [cell, cell + 1e-9, np.diag([8.0, 5.0, 6.0])]
+    meshes = kmesh.get_kpoints_meshes(cells, 0.2)
+
+    assert meshes[0] == meshes[1]
+    assert meshes == [
+        tuple(mesh) for mesh in kmesh.compute_kpoints_meshes(cells, 0.2)
+    ]
+    assert len(kmesh._MESH_CACHE) == 2  # pylint: disable=protected-access
+
+    meshes = kmesh.get_kpoints_meshes([cell], 0.2, pbcs=[[True, False, True]])
+    assert meshes[0][1] == 1
+
+
+def test_periodic_directions_slab():
+    """A slab with 15 Å of vacuum along the third vector is detected as such with the default threshold."""
+    cell = np.diag([3.0, 3.0, 20.0])
+    positions = [[0.0, 0.0, 0.0], [1.5, 1.5, 2.5], [0.0, 0.0, 5.0]]
+    periodic = kmesh.get_periodic_directions(cell, positions)
+    np.testing.assert_array_equal(periodic, [True, True, False])
+
+
+@pytest.mark.parametrize("lattice_constant", (6.0, 9.0))
+def test_periodic_directions_open_bulk(lattice_constant):
+    """A bulk cell with one atomic plane per period and a spacing below the threshold is periodic."""
+    periodic = kmesh.get_periodic_directions(
+        np.eye(3) * lattice_constant, [[0.0, 0.0, 0.0]]
+    )
+    assert periodic.all()
+
+
+def test_periodic_directions_disabled():
+    """A threshold of zero, which disables the detection in the work chains, takes all directions as periodic."""
+    periodic = kmesh.get_periodic_directions(
+        np.eye(3) * 30.0, [[0.0, 0.0, 0.0]], vacuum_threshold=0.0
+    )
+    assert periodic.all()
+    assert not kmesh.get_periodic_directions(
+        np.eye(3) * 30.0, [[0.0, 0.0, 0.0]]
+    ).any()
+
+
+def test_periodic_directions_skewed_cell():
+    """The gap is measured along the normal of the lattice planes, not along the cell vector."""
+    cell = np.array([[3.0, 0.0, 0.0], [0.0, 3.0, 0.0], [12.0, 0.0, 12.0]])
+    positions = [[0.0, 0.0, 0.0], [1.5, 1.5, 1.0]]
+    # The third vector is 17 Å long, but the planes are only 12 Å apart, 11 Å of which is vacuum
+    np.testing.assert_array_equal(
+        kmesh.get_periodic_directions(cell, positions, vacuum_threshold=11.5),
+        [True, True, True],
+    )
+    np.testing.assert_array_equal(
+        kmesh.get_periodic_directions(cell, positions, vacuum_threshold=10.5),
+        [True, True, False],
+    )
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""Tests of the estimate of the parallelization layout."""
+
+import pytest
+
+from aiida_abacus.calculations.parallel import (
+    estimate_number_of_bands,
+    estimate_number_of_plane_waves,
+    plan_parallelization,
+)
+
+
+def test_estimates():
+    """The number of plane waves grows with the volume and the cutoff to the power 3/2."""
+    number_of_plane_waves = estimate_number_of_plane_waves(100.0, 50.0)
+    assert estimate_number_of_plane_waves(200.0, 50.0) == pytest.approx(
+        2 * number_of_plane_waves, abs=1
+    )
+    assert estimate_number_of_plane_waves(100.0, 200.0) == pytest.approx(
+        8 * number_of_plane_waves, abs=8
+    )
+    assert estimate_number_of_bands(8) == 8
+    assert estimate_number_of_bands(100) == 60
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    (
+        {"volume": 40.0, "number_of_electrons": 8, "number_of_kpoints": 1},
+        {"volume": 40.0, "number_of_electrons": 8, "number_of_kpoints": 100},
+        {"volume": 1200.0, "number_of_electrons": 400, "number_of_kpoints": 4},
+        {
+            "volume": 5000.0,
+            "number_of_electrons": 1500,
+            "number_of_kpoints": 9,
+        },
+    ),
+)
+@pytest.mark.parametrize(
+    "limits",
+    (
+        {"max_num_machines": 1, "mpiprocs_per_machine": 16},
+        {
+            "max_num_machines": 4,
+            "mpiprocs_per_machine": 32,
+            "max_threads_per_mpiproc": 4,
+        },
+    ),
+)
+def test_plan_parallelization_limits(kwargs, limits):
+    """The layout stays within the limits and the pools and band groups split the processes evenly."""
+    layout = plan_parallelization(ecutwfc=50.0, **kwargs, **limits)
+    processes = layout["num_machines"] * layout["num_mpiprocs_per_machine"]
+
+    assert 1 <= layout["num_machines"] <= limits["max_num_machines"]
+    assert (
+        1
+        <= layout["num_mpiprocs_per_machine"]
+        <= limits["mpiprocs_per_machine"]
+    )
+    assert layout["kpar"] <= max(1, kwargs["number_of_kpoints"])
+    assert processes % layout["kpar"] == 0
+    assert (processes // layout["kpar"]) % layout["bndpar"] == 0
+    assert (
+        layout["num_threads_per_mpiproc"] * layout["num_mpiprocs_per_machine"]
+        <= limits["mpiprocs_per_machine"]
+    )
+    assert layout["num_threads_per_mpiproc"] <= limits.get(
+        "max_threads_per_mpiproc", 1
+    )
+
+
+def test_plan_parallelization_small_cell():
+    """A small cell with a single k-point does not ask for the whole machine, the idle cores run threads."""
+    layout = plan_parallelization(
+        40.0,
+        50.0,
+        8,
+        1,
+        mpiprocs_per_machine=32,
+        max_threads_per_mpiproc=4,
+    )
+    assert layout["num_machines"] == 1
+    assert layout["num_mpiprocs_per_machine"] < 32
+    assert layout["kpar"] == 1
+    assert layout["num_threads_per_mpiproc"] == 4
+
+
+def test_plan_parallelization_kpoint_pools():
+    """Many k-points are distributed over pools, spin components count as k-points."""
+    layout = plan_parallelization(
+        300.0, 50.0, 100, 8, max_num_machines=2, mpiprocs_per_machine=32
+    )
+    spin_layout = plan_parallelization(
+        300.0,
+        50.0,
+        100,
+        8,
+        max_num_machines=2,
+        mpiprocs_per_machine=32,
+        number_of_spin_components=2,
+    )
+    assert layout["kpar"] > 1
+    assert spin_layout["kpar"] > layout["kpar"]
+
+
+def test_plan_parallelization_memory():
+    """A memory limit increases the number of processes per pool until the wavefunctions fit."""
+    arguments = (300.0, 50.0, 2000, 8)
+    limits = {"max_num_machines": 4, "mpiprocs_per_machine": 32}
+    layout = plan_parallelization(*arguments, **limits)
+    constrained = plan_parallelization(
+        *arguments, max_memory_per_machine_mb=2000, **limits
+    )
+
+    def procs_per_pool(layout):
+        processes = layout["num_machines"] * layout["num_mpiprocs_per_machine"]
+        return processes // layout["kpar"]
+
+    assert procs_per_pool(constrained) > procs_per_pool(layout)
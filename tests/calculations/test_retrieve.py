@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""Tests of the retrieve profiles and of the exclude patterns."""
+
+import pytest
+
+from aiida_abacus.calculations import retrieve
+
+
+def test_get_profile_patterns():
+    """The patterns of a profile are relative to the working directory, unknown profiles are rejected."""
+    assert retrieve.get_profile_patterns("minimal", "OUT.aiida") == [
+        "OUT.aiida/running_*.log",
+        "OUT.aiida/warning.log",
+    ]
+    with pytest.raises(ValueError):
+        retrieve.get_profile_patterns("everything", "OUT.aiida")
+
+
+@pytest.mark.parametrize(
+    "pattern", ("/etc/passwd", "OUT.aiida/../x", "a b", "$(rm -rf ~)")
+)
+def test_validate_patterns_invalid(pattern):
+    """Absolute paths, parent folders and characters that the shell would interpret are rejected."""
+    with pytest.raises(ValueError):
+        retrieve.validate_patterns([pattern], "RETRIEVE_INCLUDE")
+
+
+def test_validate_patterns():
+    """A single pattern is accepted as a string."""
+    assert retrieve.validate_patterns(
+        "OUT.aiida/*.cif", "RETRIEVE_INCLUDE"
+    ) == ["OUT.aiida/*.cif"]
+
+
+@pytest.mark.parametrize(
+    "pattern, exclude, expected",
+    (
+        ("OUT.aiida/running_*.log", ["OUT.aiida/running_md.log"], True),
+        ("OUT.aiida/running_*.log", ["*.log"], True),
+        ("OUT.aiida/running_*.log", ["OUT.aiida/*.cube"], False),
+        ("OUT.aiida/warning.log", ["OUT.aiida/warn?ng.log"], True),
+        ("OUT.aiida/warning.log", ["OUT.aiida/[wx]arning.log"], True),
+        ("OUT.aiida/warning.log", ["OUT.aiida/STRU*"], False),
+        ("OUT.aiida/*", ["*/SPIN1_CHG"], True),
+    ),
+)
+def test_may_be_excluded(pattern, exclude, expected):
+    """A pattern may be excluded if some path is matched by both the pattern and an exclude pattern."""
+    assert retrieve.may_be_excluded(pattern, exclude) is expected
+
+
+def test_get_retrieve_item():
+    """Files at the top level are retrieved by name, the others keep their path relative to the working folder."""
+    assert retrieve.get_retrieve_item("aiida.out") == "aiida.out"
+    assert retrieve.get_retrieve_item("*.out") == ("*.out", ".", 1)
+    assert retrieve.get_retrieve_item("OUT.aiida/STRU*") == (
+        "OUT.aiida/STRU*",
+        ".",
+        2,
+    )
+
+
+def test_get_archive_script():
+    """The excluded patterns are passed to tar, anchored and with `*` matching `/`."""
+    script = retrieve.get_archive_script(
+        ["OUT.aiida/*"], ["OUT.aiida/*CHG*"], "retrieved.tar.gz", True
+    )
+    assert "for f in OUT.aiida/*; do" in script
+    assert (
+        "tar -czf 'retrieved.tar.gz' --anchored --wildcards-match-slash "
+        "--exclude='OUT.aiida/*CHG*'" in script
+    )
+
+    script = retrieve.get_archive_script(
+        ["OUT.aiida/*"], [], "retrieved.tar", False
+    )
+    assert "tar -cf 'retrieved.tar' \"${ABACUS_RETRIEVE[@]}\"" in script
+    assert "--exclude" not in script
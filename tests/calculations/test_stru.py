@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""Tests of the helpers that write the lattice and ATOMIC_POSITIONS cards of the STRU file."""
+
+import numpy as np
+import pytest
+
+from aiida_abacus.calculations.stru import (
+    format_atomic_positions,
+    format_lattice,
+    get_site_arrays,
+    get_site_symbols,
+    group_sites_by_kind,
+    validate_fixed_coords,
+)
+
+
+def test_group_sites_by_kind():
+    """Kinds keep the order of their first appearance, not the alphabetical one, and the sites their order."""
+    site_kind_names = np.array(["O", "Fe2", "O", "Fe1", "Fe2", "O"])
+    kind_names, counts, order = group_sites_by_kind(site_kind_names)
+
+    assert kind_names == ["O", "Fe2", "Fe1"]
+    assert counts == [3, 2, 1]
+    np.testing.assert_array_equal(order, [0, 2, 5, 1, 4, 3])
+
+
+def test_validate_fixed_coords():
+    """The setting is converted to an integer mask, all atoms move if it is not given."""
+    np.testing.assert_array_equal(
+        validate_fixed_coords(None, 2), np.zeros((2, 3), dtype=int)
+    )
+    mask = validate_fixed_coords([[0, 0, 1], [True, False, False]], 2)
+    assert mask.dtype.kind == "i"
+    np.testing.assert_array_equal(mask, [[0, 0, 1], [1, 0, 0]])
+
+
+@pytest.mark.parametrize(
+    "fixed_coords, message",
+    (
+        ([[0, 0, 0]], "contains 2 sites"),
+        ([[0, 0, 0], [0, 0]], "fixed_coords(2) has not length three"),
+        ([[0, 0, 0], [0, 2, 0]], "fixed_coords(2) has non-(0, 1) elements"),
+    ),
+)
+def test_validate_fixed_coords_invalid(fixed_coords, message):
+    """Settings with the wrong shape or values other than 0 and 1 are rejected."""
+    with pytest.raises(ValueError) as excinfo:
+        validate_fixed_coords(fixed_coords, 2)
+    assert message in str(excinfo.value)
+
+
+def test_format_lattice():
+    """The lattice constant is one Angstrom in Bohr, so that the cell vectors are written in Angstrom."""
+    from aiida_abacus.parsers.parse_raw import BOHR_TO_ANGSTROM
+
+    cell = [[5.43, 0.0, 0.0], [0.0, 5.43, 0.0], [0.0, 0.0, 10.5]]
+    lines = format_lattice(cell).splitlines()
+
+    assert lines[0] == "LATTICE_CONSTANT"
+    assert float(lines[1]) * BOHR_TO_ANGSTROM == pytest.approx(1.0)
+    assert lines[2] == "LATTICE_VECTORS"
+    np.testing.assert_allclose(
+        [[float(value) for value in line.split()] for line in lines[3:]],
+        cell,
+    )
+
+
+def test_format_atomic_positions():
+    """The sites are written in blocks per kind, with their magnetization, number of atoms and fixed coordinates."""
+    site_kind_names = np.array(["Si", "O", "Si"])
+    positions = np.array([[0.0, 0.0, 0.0], [0.5, 0.5, 0.5], [1.0, 2.0, 3.0]])
+    fixed_coords = np.array([[0, 0, 0], [1, 1, 1], [0, 0, 1]])
+
+    card = format_atomic_positions(
+        site_kind_names, positions, fixed_coords, ["0.0", "1.0"]
+    )
+    lines = card.splitlines()
+
+    assert lines[:2] == ["ATOMIC_POSITIONS", "Cartesian"]
+    lines = lines[2:]
+    assert lines[:3] == ["Si", "0.0", "2"]
+    assert lines[5:8] == ["O", "1.0", "1"]
+    assert len(lines) == 9
+    values = [line.split() for line in lines[3:5] + lines[8:]]
+    np.testing.assert_allclose(
+        [[float(value) for value in row[:3]] for row in values],
+        positions[[0, 2, 1]],
+    )
+    assert [row[3:] for row in values] == [
+        ["0", "0", "0"],
+        ["0", "0", "1"],
+        ["1", "1", "1"],
+    ]
+
+
+def test_site_arrays_and_symbols():
+    """The kind names, positions and chemical symbols are read from the attributes of the structure."""
+    from aiida import orm
+
+    structure = orm.StructureData(cell=np.eye(3) * 4.0)
+    structure.append_atom(position=(0.0, 0.0, 0.0), symbols="Fe", name="Fe1")
+    structure.append_atom(position=(2.0, 2.0, 2.0), symbols="Fe", name="Fe2")
+    structure.append_atom(position=(0.0, 2.0, 2.0), symbols="O")
+
+    site_kind_names, positions = get_site_arrays(structure)
+
+    assert site_kind_names.tolist() == ["Fe1", "Fe2", "O"]
+    assert positions.shape == (3, 3)
+    np.testing.assert_allclose(positions[1], [2.0, 2.0, 2.0])
+    assert get_site_symbols(structure, site_kind_names).tolist() == [
+        "Fe",
+        "Fe",
+        "O",
+    ]
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""Tests that the command line interface starts without importing AiiDA, ASE or the subcommand modules.
+
+The `verdi data abacus` commands are loaded by `verdi`, which imports AiiDA anyway: for them only the imports that
+the plugin adds on top of `verdi data` are counted.
+"""
+
+import subprocess
+import sys
+
+import pytest
+
+# Cumulative import time in milliseconds of `aiida-abacus --help`, which only needs `click`
+STARTUP_BUDGET_MS = 300.0
+# Import time in milliseconds that `verdi data abacus list` adds to the modules loaded by `verdi data`
+DATA_BUDGET_MS = 100.0
+
+_MARKER = "aiida-abacus-startup"
+# The modules that `verdi` loads before it resolves the `abacus` subcommand of `verdi data`
+_VERDI_DATA = "import aiida.cmdline.commands.cmd_data"
+_DATA_LIST = (
+    "from aiida_abacus.cli.data import data_cli; "
+    "import aiida_abacus.data.parameters; "
+    "data_cli(['list', '--help'], prog_name='verdi data abacus')"
+)
+
+
+def get_imports(code, setup=None):
+    """Run `code` in a fresh interpreter with ``python -X importtime``.
+
+    :param setup: code that is run first, whose imports are not counted
+    :returns: tuple of the total import time in milliseconds and the set of imported modules
+    """
+    if setup is not None:
+        code = f"{setup}; import sys; sys.stderr.write('{_MARKER}\\n'); {code}"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+    lines = result.stderr.splitlines()
+    if setup is not None:
+        lines = lines[lines.index(_MARKER) + 1 :]
+    total = 0
+    modules = set()
+    for line in lines:
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_time, _, name = line[len("import time:") :].split("|")
+        total += int(self_time)
+        modules.add(name.strip())
+    return total / 1000.0, modules
+
+
+@pytest.mark.parametrize(
+    "args",
+    (["--help"], ["launch", "--help"]),
+)
+def test_help_is_lazy(args):
+    """The help of the groups lists the subcommands without importing them."""
+    _, modules = get_imports(
+        f"from aiida_abacus.cli import cmd_root; cmd_root({args!r})"
+    )
+    packages = {module.split(".")[0] for module in modules}
+    assert not packages & {"aiida", "ase", "sqlalchemy", "click_completion"}
+    assert not {
+        module for module in modules if module.startswith("aiida_abacus.cli.")
+    }
+
+
+def test_startup_time():
+    """The import time of `aiida-abacus --help` stays within its budget, the best of three runs counts."""
+    best = min(
+        get_imports(
+            "from aiida_abacus.cli import cmd_root; cmd_root(['--help'])"
+        )[0]
+        for _ in range(3)
+    )
+    assert best < STARTUP_BUDGET_MS
+
+
+def test_data_list_is_lazy():
+    """`verdi data abacus list` does not load ASE or the calculations and work chains of the plugin."""
+    _, modules = get_imports(_DATA_LIST, setup=_VERDI_DATA)
+    packages = {module.split(".")[0] for module in modules}
+    assert not packages & {"ase", "spglib", "click_completion"}
+    assert {
+        module for module in modules if module.startswith("aiida_abacus.")
+    } <= {
+        "aiida_abacus.cli",
+        "aiida_abacus.cli.data",
+        "aiida_abacus.data",
+        "aiida_abacus.data.parameters",
+    }
+
+
+def test_data_list_startup_time():
+    """The imports of `verdi data abacus list` stay within their budget, the best of three runs counts."""
+    best = min(get_imports(_DATA_LIST, setup=_VERDI_DATA)[0] for _ in range(3))
+    assert best < DATA_BUDGET_MS
+
+
+def test_invalid_profile():
+    """A profile name that is not configured is rejected by the option."""
+    from click.testing import CliRunner
+
+    from aiida_abacus.cli import cmd_root
+
+    result = CliRunner().invoke(
+        cmd_root, ["--profile", "not-a-profile", "launch", "--help"]
+    )
+    assert result.exit_code == 2
+    assert "is not one of the configured profiles" in result.output
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""Regression tests and benchmarks of the parsers of the ABACUS output files, on the corpus in `tests/output_files`.
+
+The benchmarks use the `benchmark` fixture of pytest-benchmark, run only them with ``pytest --benchmark-only``.
+"""
+
+import os
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from aiida_abacus.parsers.parse_raw import (
+    parse_md_dump,
+    parse_running_log,
+    parse_stdout,
+)
+
+from .. import TEST_DIR
+
+CORPUS = os.path.join(TEST_DIR, "output_files")
+
+# Reference values of every case: the energies of the ionic steps in eV, the largest force of the last step in
+# eV/Angstrom, the diagonal of the stress of the last step in kbar, if printed, and the timings in seconds
+REFERENCES = {
+    "scf": {
+        "energies": [-215.4983926],
+        "max_force": 0.0,
+        "stress": [-12.3, -12.3, -12.3],
+        "number_of_scf_iterations": 9,
+        "wall_time_seconds": 8.0,
+        "total_seconds": 8.2,
+        "run_seconds": 8.118,
+    },
+    "relax": {
+        "energies": [-861.75, -861.765, -861.7695, -861.77085],
+        "max_force": 0.01987461015969873,
+        "stress": None,
+        "number_of_scf_iterations": 6,
+        "wall_time_seconds": 37.0,
+        "total_seconds": 37.4,
+        "run_seconds": 37.026,
+    },
+    "cell-relax": {
+        "energies": [-215.39, -215.414, -215.4212],
+        "max_force": 0.0,
+        "stress": [-4.05, -4.05, -4.05],
+        "number_of_scf_iterations": 6,
+        "wall_time_seconds": 24.0,
+        "total_seconds": 24.9,
+        "run_seconds": 24.651,
+    },
+    "md": {
+        "energies": [
+            -861.62,
+            -861.619158529,
+            -861.6190907026,
+            -861.61985888,
+            -861.6207568025,
+            -861.6209589243,
+        ],
+        "max_force": 0.612002849360197,
+        "stress": None,
+        "number_of_scf_iterations": 7,
+        "wall_time_seconds": 52.0,
+        "total_seconds": 52.3,
+        "run_seconds": 51.777,
+    },
+    "nspin2": {
+        "energies": [-3406.7391226],
+        "max_force": 0.0,
+        "stress": None,
+        "number_of_scf_iterations": 14,
+        "wall_time_seconds": 41.0,
+        "total_seconds": 41.7,
+        "run_seconds": 41.283,
+    },
+}
+
+
+def get_log_path(case):
+    """Return the path of the `running_*.log` file of a case of the corpus."""
+    folder = os.path.join(CORPUS, case, "OUT.aiida")
+    (name,) = [
+        name for name in os.listdir(folder) if name.startswith("running_")
+    ]
+    return os.path.join(folder, name)
+
+
+def parse_log(path):
+    """Parse a `running_*.log` file and return the parser and its trajectory."""
+    with open(path, encoding="utf8") as handle:
+        parser = parse_running_log(handle)
+    return parser, parser.get_trajectory()
+
+
+def parse_dump(path):
+    """Parse an `MD_dump` file and return its arrays."""
+    with open(path, encoding="utf8") as handle:
+        return parse_md_dump(handle).get_arrays()
+
+
+def parse_stdout_file(path):
+    """Parse the stdout of ABACUS."""
+    with open(path, encoding="utf8") as handle:
+        return parse_stdout(handle)
+
+
+@pytest.fixture
+def scaled_log(tmp_path):
+    """Return a function that writes a log of about `size_mb` MB, by repeating the ionic steps of a case.
+
+    The header, up to the first ionic step, and the footer, from the timing table, are written once.
+    """
+
+    def write(case, size_mb):
+        with open(get_log_path(case), encoding="utf8") as handle:
+            lines = handle.readlines()
+        first = next(i for i, line in enumerate(lines) if "STEP OF" in line)
+        last = next(i for i, line in enumerate(lines) if "|CLASS_NAME" in line)
+        steps = "".join(lines[first:last])
+
+        path = tmp_path / os.path.basename(get_log_path(case))
+        with open(path, "w", encoding="utf8") as handle:
+            handle.writelines(lines[:first])
+            written = 0
+            while written < size_mb * 1024**2:
+                handle.write(steps)
+                written += len(steps)
+            handle.writelines(lines[last:])
+        return str(path), written // len(steps)
+
+    return write
+
+
+@pytest.mark.parametrize("case", sorted(REFERENCES))
+def test_running_log(case):
+    """The energies, forces, stress and timings of the logs do not change."""
+    reference = REFERENCES[case]
+    parser, trajectory = parse_log(get_log_path(case))
+
+    assert parser.parsed["job_done"]
+    assert (
+        parser.parsed["number_of_scf_iterations"]
+        == reference["number_of_scf_iterations"]
+    )
+    assert parser.parsed["energy"] == pytest.approx(reference["energies"][-1])
+    np.testing.assert_allclose(trajectory["energies"], reference["energies"])
+
+    number_of_steps = len(reference["energies"])
+    number_of_atoms = parser.parsed["number_of_atoms"]
+    for name in ("positions", "forces"):
+        assert trajectory[name].shape == (number_of_steps, number_of_atoms, 3)
+        assert trajectory[name].dtype == np.float64
+    assert trajectory["cells"].shape == (number_of_steps, 3, 3)
+    assert np.linalg.norm(trajectory["forces"][-1], axis=1).max() == (
+        pytest.approx(reference["max_force"])
+    )
+
+    if reference["stress"] is None:
+        assert "stress" not in trajectory
+    else:
+        assert trajectory["stress"].shape == (number_of_steps, 3, 3)
+        np.testing.assert_allclose(
+            trajectory["stress"][-1].diagonal(), reference["stress"]
+        )
+
+    assert parser.timing["total_seconds"] == pytest.approx(
+        reference["total_seconds"]
+    )
+    assert parser.timing["routines"]["Run_pw"]["plane_wave_line"][
+        "seconds"
+    ] == pytest.approx(reference["run_seconds"])
+
+
+@pytest.mark.parametrize("case", sorted(REFERENCES))
+def test_stdout(case):
+    """The stdout reports a completed job and its wall time."""
+    parsed = parse_stdout_file(os.path.join(CORPUS, case, "aiida.out"))
+    assert parsed["job_done"]
+    assert not parsed["out_of_memory"]
+    assert parsed["wall_time_seconds"] == REFERENCES[case]["wall_time_seconds"]
+
+
+def test_md_dump():
+    """The dumped steps are in Angstrom and agree with the first step of the log."""
+    arrays = parse_dump(os.path.join(CORPUS, "md", "OUT.aiida", "MD_dump"))
+    _, trajectory = parse_log(get_log_path("md"))
+
+    np.testing.assert_array_equal(arrays["stepids"], np.arange(6))
+    assert arrays["positions"].shape == trajectory["positions"].shape
+    np.testing.assert_allclose(
+        arrays["positions"][0], trajectory["positions"][0], atol=1e-8
+    )
+    np.testing.assert_allclose(
+        arrays["forces"][-1], trajectory["forces"][-1], atol=1e-6
+    )
+    np.testing.assert_allclose(
+        arrays["stress"][-1].diagonal(), [-3.2, -3.1, -3.3]
+    )
+
+
+@pytest.mark.parametrize("case", sorted(REFERENCES))
+def test_benchmark_running_log(benchmark, case):
+    """Benchmark the parsing of the logs of the corpus."""
+    _, trajectory = benchmark(parse_log, get_log_path(case))
+    assert len(trajectory["energies"]) == len(REFERENCES[case]["energies"])
+
+
+@pytest.mark.parametrize("case", sorted(REFERENCES))
+def test_benchmark_stdout(benchmark, case):
+    """Benchmark the parsing of the stdout of the corpus."""
+    parsed = benchmark(
+        parse_stdout_file, os.path.join(CORPUS, case, "aiida.out")
+    )
+    assert parsed["job_done"]
+
+
+def test_benchmark_md_dump(benchmark):
+    """Benchmark the parsing of the MD dump of the corpus."""
+    arrays = benchmark(
+        parse_dump, os.path.join(CORPUS, "md", "OUT.aiida", "MD_dump")
+    )
+    assert len(arrays["stepids"]) == 6
+
+
+@pytest.mark.parametrize("case", ["relax", "md"])
+def test_benchmark_scaled_log(benchmark, scaled_log, case):
+    """Benchmark the parsing of a log of a few MB, the number of parsed steps grows with the repeated steps."""
+    path, repeats = scaled_log(case, 2)
+    _, trajectory = benchmark.pedantic(parse_log, args=(path,), rounds=3)
+    assert len(trajectory["energies"]) == repeats * len(
+        REFERENCES[case]["energies"]
+    )
+    size_mb = os.path.getsize(path) / 1024**2
+    benchmark.extra_info["size_mb"] = size_mb
+    if benchmark.stats:
+        # Not set if the benchmarks are disabled
+        benchmark.extra_info["MB/s"] = size_mb / benchmark.stats.stats.mean
+
+
+@pytest.mark.parametrize("case", ["relax", "md"])
+def test_scaled_log_memory(scaled_log, case):
+    """The log is parsed line by line: the peak memory is a fraction of the size of the file, for the trajectory."""
+    path, _ = scaled_log(case, 4)
+    tracemalloc.start()
+    try:
+        parse_log(path)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert peak < 0.25 * os.path.getsize(path)
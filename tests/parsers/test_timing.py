@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""Tests of the parsing of the timing table printed at the end of the `running_*.log` files."""
+
+import io
+import os
+
+from aiida_abacus.parsers.parse_raw import (
+    load_reduced_outputs,
+    parse_running_log,
+    reduce_outputs,
+)
+
+from .. import TEST_DIR
+
+FOLDER = os.path.join(TEST_DIR, "output_files", "scf", "OUT.aiida")
+
+TIMING_TABLE = """\
+  |CLASS_NAME---------|NAME---------------|TIME(Sec)-----|CALLS----|AVG------|PER%-------
+                      total               12.500        9         1.39     100.00    %
+   Run_pw             plane_wave_line     12.000        1         12.00    96.00     %
+   ESolver_KS         before.all.runners  0.2500        1         0.25     2.00      %
+   Hamilt_PW          h_psi               8.0000        1544      0.01     64.00     %
+   Diago_CG           diag                                                           %
+ ----------------------------------------------------------------------------------------
+
+ CLASS_NAME---------|NAME---------------|MEMORY(MB)--------
+          Charge_Pulay                Rrho        0.1055
+"""
+
+
+def test_timing_table():
+    """The total and every routine are parsed by class and name, rows without values and the memory table are not."""
+    parser = parse_running_log(io.StringIO(TIMING_TABLE))
+
+    assert parser.timing == {
+        "total_seconds": 12.5,
+        "routines": {
+            "Run_pw": {
+                "plane_wave_line": {
+                    "seconds": 12.0,
+                    "calls": 1,
+                    "percent": 96.0,
+                }
+            },
+            # Dots are not allowed in the keys of a `Dict`
+            "ESolver_KS": {
+                "before_all_runners": {
+                    "seconds": 0.25,
+                    "calls": 1,
+                    "percent": 2.0,
+                }
+            },
+            "Hamilt_PW": {
+                "h_psi": {"seconds": 8.0, "calls": 1544, "percent": 64.0}
+            },
+        },
+    }
+
+
+def test_timing_table_missing():
+    """A log that ends before the timing table, e.g. of an interrupted run, has no timing."""
+    with open(
+        os.path.join(FOLDER, "running_scf.log"), encoding="utf8"
+    ) as handle:
+        lines = handle.readlines()
+    end = next(i for i, line in enumerate(lines) if "|CLASS_NAME" in line)
+
+    parser = parse_running_log(io.StringIO("".join(lines[:end])))
+    assert parser.timing == {}
+
+
+def test_timing_reduced(tmp_path):
+    """The timing table is kept in the summary of the outputs reduced on the remote."""
+    summary_path = tmp_path / "summary.json"
+    arrays_path = tmp_path / "arrays.npz"
+    reduce_outputs(FOLDER, summary_path, arrays_path)
+
+    with open(
+        os.path.join(FOLDER, "running_scf.log"), encoding="utf8"
+    ) as handle:
+        timing = parse_running_log(handle).timing
+    with open(summary_path, encoding="utf8") as summary, open(
+        arrays_path, "rb"
+    ) as arrays:
+        reduced = load_reduced_outputs(summary, arrays)
+
+    assert reduced.timing == timing
+    assert reduced.timing["routines"]["Hamilt_PW"]["h_psi"]["calls"] == 1544
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""Tests of the structure fingerprints and of the index that finds duplicates."""
+
+import numpy as np
+import pytest
+
+from aiida_abacus.utils.fingerprint import (
+    BIN_WIDTH,
+    CUTOFF,
+    FingerprintIndex,
+    get_fingerprint,
+)
+
+
+@pytest.fixture
+def silicon():
+    """Return the conventional cell of silicon as an `ase.Atoms`."""
+    from ase.build import bulk
+
+    return bulk("Si", "diamond", a=5.43, cubic=True)
+
+
+def test_fingerprint(silicon):
+    """The histogram has one bin per `BIN_WIDTH` and holds the number of neighbours per atom up to the cutoff."""
+    from ase.neighborlist import neighbor_list
+
+    fingerprint = get_fingerprint(silicon)
+
+    assert fingerprint["formula"] == "Si8"
+    assert len(fingerprint["histogram"]) == round(CUTOFF / BIN_WIDTH)
+    np.testing.assert_allclose(fingerprint["cell"][:3], [5.43] * 3)
+    assert fingerprint["cell"][3] == pytest.approx(5.43**3 / 8)
+    # The Gaussian kernel sums to sqrt(2π) σ in units of bins, away from the ends of the histogram
+    neighbours = len(neighbor_list("d", silicon, CUTOFF)) / len(silicon)
+    assert sum(fingerprint["histogram"]) == pytest.approx(
+        neighbours * np.sqrt(2 * np.pi), rel=1e-2
+    )
+
+
+def test_fingerprint_invariance(silicon):
+    """The fingerprint does not depend on the order of the sites, the origin or the choice of the cell vectors."""
+    fingerprint = get_fingerprint(silicon)
+
+    shuffled = silicon[np.random.RandomState(0).permutation(len(silicon))]
+    shuffled.translate([0.3, -0.2, 1.1])
+    shuffled.wrap()
+    assert get_fingerprint(shuffled) == fingerprint
+
+    sheared = silicon.copy()
+    cell = sheared.get_cell()[:]
+    sheared.set_cell(cell + [[0, 0, 0], [0, 0, 0], cell[0]], scale_atoms=False)
+    sheared.wrap()
+    other = get_fingerprint(sheared)
+    np.testing.assert_allclose(other["cell"], fingerprint["cell"])
+    np.testing.assert_allclose(
+        other["histogram"], fingerprint["histogram"], atol=1e-3
+    )
+
+
+def test_index_find(silicon):
+    """The index finds structures within numerical noise, but not strained ones or other formulas."""
+    from ase.build import bulk
+
+    noisy = silicon.copy()
+    noisy.positions += np.random.RandomState(1).normal(0, 1e-5, (8, 3))
+    strained = silicon.copy()
+    strained.set_cell(silicon.get_cell() * 1.02, scale_atoms=True)
+    germanium = bulk("Ge", "diamond", a=5.43, cubic=True)
+
+    index = FingerprintIndex(
+        [(1, get_fingerprint(silicon)), (2, get_fingerprint(germanium))]
+    )
+    assert len(index) == 2
+    assert index.find(get_fingerprint(noisy)) == 1
+    assert index.find(get_fingerprint(strained)) is None
+
+    index.add(3, get_fingerprint(strained))
+    assert index.find_all(get_fingerprint(noisy)) == [1]
+    assert index.find_all(get_fingerprint(strained)) == [3]
+    assert index.find(get_fingerprint(bulk("C", "diamond", a=3.57))) is None
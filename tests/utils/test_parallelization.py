@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""Tests of the automatic parallelization of the inputs of the calculations."""
+
+from aiida_abacus.utils.parallelization import (
+    apply_parallelization,
+    get_layout,
+    validate_automatic_parallelization,
+)
+
+LAYOUT = {
+    "num_machines": 2,
+    "num_mpiprocs_per_machine": 16,
+    "num_threads_per_mpiproc": 2,
+    "kpar": 4,
+    "bndpar": 1,
+}
+
+
+def test_validate_automatic_parallelization():
+    """Only the known limits are accepted."""
+    from aiida import orm
+
+    assert validate_automatic_parallelization(None, None) is None
+    assert (
+        validate_automatic_parallelization(
+            orm.Dict(dict={"max_num_machines": 2}), None
+        )
+        is None
+    )
+    message = validate_automatic_parallelization(
+        orm.Dict(dict={"max_num_machine": 2}), None
+    )
+    assert "max_num_machine" in message
+
+
+def test_apply_parallelization():
+    """The resources, threads and pools are set, without overriding the parameters that were given."""
+    inputs = {
+        "metadata": {
+            "options": {"environment_variables": {"OMP_STACKSIZE": "64M"}}
+        }
+    }
+    parameters = {"kpar": 2}
+    apply_parallelization(inputs, parameters, LAYOUT)
+
+    options = inputs["metadata"]["options"]
+    assert options["resources"] == {
+        "num_machines": 2,
+        "num_mpiprocs_per_machine": 16,
+        "num_cores_per_mpiproc": 2,
+    }
+    assert options["environment_variables"] == {
+        "OMP_STACKSIZE": "64M",
+        "OMP_NUM_THREADS": "2",
+    }
+    assert parameters == {"kpar": 2}
+
+
+def test_apply_parallelization_single_thread():
+    """A single thread does not ask for cores per process, and pools are only set when there is more than one."""
+    inputs = {"metadata": {}}
+    parameters = {}
+    apply_parallelization(
+        inputs, parameters, dict(LAYOUT, num_threads_per_mpiproc=1, kpar=1)
+    )
+
+    options = inputs["metadata"]["options"]
+    assert "num_cores_per_mpiproc" not in options["resources"]
+    assert options["environment_variables"] == {"OMP_NUM_THREADS": "1"}
+    assert parameters == {}
+
+    apply_parallelization(inputs, parameters, LAYOUT)
+    assert parameters == {"kpar": 4}
+
+
+def test_get_layout():
+    """The layout recorded on the calculation is read back from its options and parameters."""
+    inputs = {"metadata": {}}
+    parameters = {"bndpar": 2}
+    apply_parallelization(inputs, parameters, LAYOUT)
+    assert get_layout(inputs["metadata"]["options"], parameters) == dict(
+        LAYOUT, bndpar=2
+    )
+    assert get_layout({"resources": {"num_machines": 1}}, {}) == {
+        "num_machines": 1,
+        "num_mpiprocs_per_machine": 1,
+        "num_threads_per_mpiproc": 1,
+        "kpar": 1,
+        "bndpar": 1,
+    }
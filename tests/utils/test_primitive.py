@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""Tests of the reduction to the primitive cell and of the mapping back onto the original structure."""
+
+import types
+
+import numpy as np
+
+from aiida_abacus.utils.primitive import (
+    get_per_site_settings,
+    get_primitive_transformation,
+    map_to_original,
+)
+
+
+def get_rocksalt_supercell():
+    """Return the cell, positions and numbers of a 2x1x1 supercell of the conventional cell of rocksalt."""
+    from ase.build import bulk
+
+    atoms = bulk("NaCl", "rocksalt", a=5.64, cubic=True).repeat((2, 1, 1))
+    return (
+        atoms.get_cell()[:],
+        atoms.get_positions(),
+        atoms.get_atomic_numbers(),
+    )
+
+
+def test_primitive_transformation():
+    """The supercell is an integer multiple of the primitive cell, and every site is mapped onto a primitive site."""
+    cell, positions, numbers = get_rocksalt_supercell()
+    (
+        primitive_cell,
+        primitive_positions,
+        primitive_numbers,
+        matrix,
+        mapping,
+        translations,
+    ) = get_primitive_transformation(cell, positions, numbers)
+
+    assert sorted(primitive_numbers.tolist()) == [11, 17]
+    assert abs(round(np.linalg.det(matrix))) == len(numbers) // 2
+    np.testing.assert_allclose(matrix @ primitive_cell, cell, atol=1e-8)
+    np.testing.assert_array_equal(primitive_numbers[mapping], numbers)
+    np.testing.assert_allclose(
+        primitive_positions[mapping] + translations @ primitive_cell,
+        positions,
+        atol=1e-6,
+    )
+
+
+def test_round_trip_strained():
+    """A strained and displaced primitive structure maps onto the same strain and displacement of the original."""
+    cell, positions, numbers = get_rocksalt_supercell()
+    (
+        primitive_cell,
+        primitive_positions,
+        _,
+        matrix,
+        mapping,
+        translations,
+    ) = get_primitive_transformation(cell, positions, numbers)
+
+    strain = np.eye(3) + np.array(
+        [[0.01, 0.002, 0.0], [0.002, -0.01, 0.0], [0.0, 0.0, 0.02]]
+    )
+    shift = np.array([0.01, -0.02, 0.03])
+    mapped_cell, mapped_positions = map_to_original(
+        primitive_cell @ strain,
+        primitive_positions @ strain + shift,
+        matrix,
+        mapping,
+        translations,
+    )
+
+    np.testing.assert_allclose(mapped_cell, cell @ strain, atol=1e-8)
+    np.testing.assert_allclose(
+        mapped_positions, positions @ strain + shift, atol=1e-6
+    )
+
+
+def test_kinds_are_kept_apart():
+    """Sites of the same element with different numbers, e.g. kinds, are not made equivalent."""
+    cell, positions, numbers = get_rocksalt_supercell()
+    numbers = numbers.copy()
+    numbers[0] = 1
+    _, _, primitive_numbers, _, _, _ = get_primitive_transformation(
+        cell, positions, numbers
+    )
+    assert len(primitive_numbers) == len(numbers)
+
+
+def test_per_site_settings():
+    """Settings given per site prevent the reduction, those given per kind do not."""
+    assert get_per_site_settings({"INITIAL_MAGNETIC": [1.0, 0.0]}) == []
+    assert get_per_site_settings(
+        {"FIXED_COORDS": [[0, 0, 1]] * 16, "INITIAL_MAGNETIC": [1.0, 0.0]}
+    ) == ["FIXED_COORDS"]
+
+
+def test_reduce_structure_per_site_settings():
+    """The relax work chain reports that it keeps the input structure when it has settings per site."""
+    from aiida import orm
+    from aiida.common import AttributeDict
+
+    from aiida_abacus.workflows.relax import RelaxWorkChain
+
+    cell, positions, numbers = get_rocksalt_supercell()
+    structure = orm.StructureData(cell=cell.tolist())
+    for position, number in zip(positions, numbers):
+        structure.append_atom(
+            position=position.tolist(), symbols="Na" if number == 11 else "Cl"
+        )
+    settings = {"FIXED_COORDS": [[0, 0, 1]] * len(numbers)}
+    reports = []
+    workchain = types.SimpleNamespace(
+        inputs=AttributeDict(
+            structure=structure,
+            base=AttributeDict(settings=orm.Dict(dict=settings)),
+            symmetry_tolerance=orm.Float(1e-3),
+        ),
+        ctx=AttributeDict(current_structure=structure),
+        node=None,
+        report=reports.append,
+    )
+
+    RelaxWorkChain.reduce_structure(workchain)
+
+    assert "transformation" not in workchain.ctx
+    assert workchain.ctx.current_structure is structure
+    assert "FIXED_COORDS" in reports[0]
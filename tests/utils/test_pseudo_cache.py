@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""Tests of the job script lines that check the pseudos linked from the cache of the computer."""
+
+import hashlib
+import os
+import subprocess
+
+from aiida_abacus.utils.pseudo_cache import get_check_script
+
+CONTENT = b"<UPF version='2.0.1'>\n"
+MD5 = hashlib.md5(CONTENT).hexdigest()
+
+
+def run_check(tmp_path, links, copy=False):
+    """Run the check script followed by a marker command in `tmp_path` and return its exit status."""
+    script = get_check_script(links, "missing", copy) + "\ntouch ran"
+    return subprocess.run(["bash", "-c", script], cwd=tmp_path).returncode
+
+
+def link_pseudo(tmp_path, name, target):
+    """Link `pseudo/<name>` in `tmp_path` to the cached file `target`."""
+    os.makedirs(tmp_path / "pseudo", exist_ok=True)
+    os.symlink(tmp_path / "cache" / target, tmp_path / "pseudo" / name)
+
+
+def test_check_script(tmp_path):
+    """Links to the expected content pass, and are replaced by a copy of the cached file if asked."""
+    (tmp_path / "cache").mkdir()
+    (tmp_path / "cache" / MD5).write_bytes(CONTENT)
+    link_pseudo(tmp_path, "Si.upf", MD5)
+
+    assert run_check(tmp_path, [(MD5, "pseudo/Si.upf")]) == 0
+    assert (tmp_path / "pseudo" / "Si.upf").is_symlink()
+
+    assert run_check(tmp_path, [(MD5, "pseudo/Si.upf")], copy=True) == 0
+    assert not (tmp_path / "pseudo" / "Si.upf").is_symlink()
+    assert (tmp_path / "pseudo" / "Si.upf").read_bytes() == CONTENT
+    assert (tmp_path / "ran").exists()
+    assert not (tmp_path / "missing").exists()
+
+
+def test_check_script_missing(tmp_path):
+    """Missing and corrupted files are written to the missing file and the job exits before the next command."""
+    (tmp_path / "cache").mkdir()
+    (tmp_path / "cache" / "corrupted").write_bytes(b"truncated")
+    link_pseudo(tmp_path, "Si.upf", "purged")
+    link_pseudo(tmp_path, "O.upf", "corrupted")
+
+    links = [(MD5, "pseudo/Si.upf"), (MD5, "pseudo/O.upf")]
+    assert run_check(tmp_path, links) == 1
+    assert not (tmp_path / "ran").exists()
+    assert (tmp_path / "missing").read_text().split() == [
+        "pseudo/Si.upf",
+        "pseudo/O.upf",
+    ]
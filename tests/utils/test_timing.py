@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""Tests of the timing of the stages of the processes, recorded in the extras of their nodes."""
+
+import datetime
+import types
+from unittest import mock
+
+import pytest
+
+from aiida_abacus.utils import timing
+
+
+class ExtrasNode:
+    """Minimal stand-in of a stored process node, with its extras in a dictionary."""
+
+    is_stored = True
+
+    def __init__(self, extras=None):
+        self.extras = dict(extras or {})
+
+    def get_extra(self, key, default=None):
+        return self.extras.get(key, default)
+
+    def set_extra(self, key, value):
+        self.extras[key] = value
+
+
+def test_record_stages():
+    """The durations are added to those already recorded, and the timestamps of the stages are updated."""
+    node = ExtrasNode()
+    timing.record_stages(node, {"parse": 1.5, "submit": 0.5}, timestamp=10.0)
+    timing.record_stages(node, {"parse": 2.0}, timestamp=20.0)
+
+    assert node.extras[timing.TIMING_EXTRA] == {"parse": 3.5, "submit": 0.5}
+    assert node.extras[timing.TIMESTAMPS_EXTRA] == {
+        "parse": 20.0,
+        "submit": 10.0,
+    }
+
+    timing.record_stages(node, {})
+    assert node.extras[timing.TIMING_EXTRA] == {"parse": 3.5, "submit": 0.5}
+
+
+@pytest.mark.parametrize("value", ("", "0", "false", "No"))
+def test_timed_stage_disabled(monkeypatch, value):
+    """Nothing is recorded unless the environment variable enables the timing."""
+    if value:
+        monkeypatch.setenv(timing.TIMING_ENVIRONMENT_VARIABLE, value)
+    else:
+        monkeypatch.delenv(timing.TIMING_ENVIRONMENT_VARIABLE, raising=False)
+    node = mock.Mock(spec=ExtrasNode)
+
+    with timing.timed_stage(node, "parse"):
+        pass
+
+    assert not node.method_calls
+
+
+def test_timed_stage_enabled(monkeypatch):
+    """With the environment variable set, the duration and the end of the block are recorded."""
+    monkeypatch.setenv(timing.TIMING_ENVIRONMENT_VARIABLE, "1")
+    node = ExtrasNode()
+
+    with timing.timed_stage(node, "parse"):
+        pass
+
+    assert set(node.extras[timing.TIMING_EXTRA]) == {"parse"}
+    assert set(node.extras[timing.TIMESTAMPS_EXTRA]) == {"parse"}
+
+
+def test_get_job_stages():
+    """The upload, queue, execution and retrieval are derived from the timestamps of the node and of its outputs."""
+    start = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+    def output(seconds):
+        """Return the result of `get_outgoing().first()` for an output created `seconds` after the start."""
+        node = types.SimpleNamespace(
+            ctime=start + datetime.timedelta(seconds=seconds)
+        )
+        return types.SimpleNamespace(node=node)
+
+    outputs = {"remote_folder": output(5), "retrieved": output(130)}
+    node = ExtrasNode(
+        {
+            timing.TIMESTAMPS_EXTRA: {
+                "prepare_for_submission": start.timestamp()
+            }
+        }
+    )
+    node.get_outgoing = lambda link_label_filter: mock.Mock(
+        first=mock.Mock(return_value=outputs.get(link_label_filter))
+    )
+    node.get_last_job_info = mock.Mock(return_value=None)
+    node.get_scheduler_lastchecktime = mock.Mock(
+        return_value=start + datetime.timedelta(seconds=125)
+    )
+
+    assert timing.get_job_stages(node, execution_seconds=100) == {
+        "upload": 5.0,
+        "execution": 100.0,
+        "queue": 20.0,
+        "retrieve": 5.0,
+    }
+
+    # The scheduler reports the wait in the queue and the wall time
+    node.get_last_job_info.return_value = types.SimpleNamespace(
+        wallclock_time_seconds=90,
+        submission_time=start + datetime.timedelta(seconds=6),
+        dispatch_time=start + datetime.timedelta(seconds=36),
+    )
+    stages = timing.get_job_stages(node)
+    assert stages["execution"] == 90.0
+    assert stages["queue"] == 30.0